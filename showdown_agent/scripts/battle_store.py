@@ -0,0 +1,73 @@
+# Finished battles are dropped by play_match once they are counted. A BattleStore
+# keeps them on disk instead: one gzipped json line per battle with its result and
+# full protocol log, in a file per process so sharded workers never share one
+
+
+import atexit
+import gzip
+import json
+import os
+from typing import Any, Dict, Iterator
+
+from poke_env.battle.abstract_battle import AbstractBattle
+
+BATTLES_FOLDER = os.path.join(os.path.dirname(__file__), "results", "battles")
+
+BattleRecord = Dict[str, Any]
+
+
+def battle_record(battle: AbstractBattle) -> BattleRecord:
+    return {
+        "battle_tag": battle.battle_tag,
+        "player": battle.player_username,
+        "opponent": battle.opponent_username,
+        "won": battle.won,
+        "turns": battle.turn,
+        "log": [
+            "|".join(split_message)
+            for turn in sorted(battle.observations)
+            for split_message in battle.observations[turn].events
+        ],
+    }
+
+
+class BattleStore:
+    """Spill sink for play_match, appends every battle it gets to folder/battles-<pid>.jsonl.gz"""
+
+    def __init__(self, folder: str = BATTLES_FOLDER):
+        self.folder = folder
+        self.battles_file = os.path.join(folder, f"battles-{os.getpid()}.jsonl.gz")
+        self._file = None
+
+    def __call__(self, battle: AbstractBattle):
+        if self._file is None:
+            os.makedirs(self.folder, exist_ok=True)
+            self._file = gzip.open(self.battles_file, "at", encoding="utf-8")
+            atexit.register(self.close)
+        self._file.write(json.dumps(battle_record(battle), separators=(",", ":")))
+        self._file.write("\n")
+        # sync flush, a crash loses at most the battle being written
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_battles(folder: str = BATTLES_FOLDER) -> Iterator[BattleRecord]:
+    """Every stored battle, file by file"""
+    if not os.path.exists(folder):
+        return
+    for battles_file in sorted(os.listdir(folder)):
+        if not battles_file.endswith(".jsonl.gz"):
+            continue
+        with gzip.open(
+            os.path.join(folder, battles_file), "rt", encoding="utf-8"
+        ) as file:
+            try:
+                for line in file:
+                    yield json.loads(line)
+            except (EOFError, ValueError):
+                # a process that died mid write, the battles before are fine
+                continue
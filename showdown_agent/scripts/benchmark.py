@@ -0,0 +1,316 @@
+# Offline decision benchmark, no showdown server needed
+# python benchmark.py                     compare against results/benchmark_baseline.json
+# python benchmark.py --update-baseline   record a new baseline
+
+
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from poke_env import AccountConfiguration
+from poke_env.battle import Battle, Pokemon
+from poke_env.battle.side_condition import SideCondition
+from poke_env.battle.weather import Weather
+from poke_env.player.player import Player
+from poke_env.stats import compute_raw_stats
+from poke_env.teambuilder import ConstantTeambuilder
+from tabulate import tabulate
+
+from player_modules import load_player_module
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(__file__), "results", "benchmark_baseline.json"
+)
+
+STATS = ("hp", "atk", "def", "spa", "spd", "spe")
+
+WEATHERS = [None, Weather.SUNNYDAY, Weather.RAINDANCE]
+HAZARDS = [
+    {},
+    {SideCondition.STEALTH_ROCK: 1},
+    {SideCondition.STEALTH_ROCK: 1, SideCondition.TOXIC_SPIKES: 2},
+]
+
+
+def load_players() -> List[Player]:
+    player_folders = os.path.join(os.path.dirname(__file__), "players")
+
+    players = []
+    for module_name in sorted(os.listdir(player_folders)):
+        if module_name.endswith(".py"):
+            module_path = f"{player_folders}/{module_name}"
+
+            module = load_player_module(module_path)
+
+            if hasattr(module, "CustomAgent"):
+                agent_class = getattr(module, "CustomAgent")
+                players.append(
+                    agent_class(
+                        account_configuration=AccountConfiguration(
+                            module_name[:-3], None
+                        ),
+                        battle_format="gen9ubers",
+                        start_listening=False,
+                    )
+                )
+
+    return players
+
+
+def load_opponent_teams() -> Dict[str, str]:
+    teams_folder = os.path.join(os.path.dirname(__file__), "bots", "teams")
+
+    teams = {}
+    for team_file in sorted(os.listdir(teams_folder)):
+        if team_file.endswith(".txt"):
+            with open(
+                os.path.join(teams_folder, team_file), "r", encoding="utf-8"
+            ) as file:
+                teams[team_file[:-4]] = file.read()
+    return teams
+
+
+def build_battle(
+    tag: str, player: Player, opponent_team: str, rng: random.Random
+) -> Battle:
+    """A mid-game Battle as poke_env would hold it, built without a server"""
+    battle = Battle(tag, player.username, logging.getLogger("benchmark"), gen=9)
+    battle._player_role = "p1"
+
+    # our side: full information, as parsed from requests
+    for tb_mon in player._team.team:
+        mon = Pokemon(gen=9, teambuilder=tb_mon)
+        raw_stats = compute_raw_stats(
+            mon.species,
+            tb_mon.evs,
+            tb_mon.ivs,
+            tb_mon.level or 100,
+            (tb_mon.nature or "serious").lower(),
+            battle._data,
+        )
+        mon._stats = dict(zip(STATS, raw_stats))
+        mon._max_hp = mon.stats["hp"]
+        mon._current_hp = max(1, int(mon._max_hp * rng.uniform(0.1, 1.0)))
+        battle._team[f"p1: {mon.species}"] = mon
+
+    # their side: revealed moves only, hp as a percentage, stats and item unknown
+    for tb_mon in ConstantTeambuilder(opponent_team).team:
+        mon = Pokemon(gen=9, teambuilder=tb_mon)
+        mon._stats = {stat: None for stat in mon._stats}
+        mon._item = battle._data.UNKNOWN_ITEM
+        mon._max_hp = 100
+        mon._current_hp = rng.randint(1, 100)
+        revealed = rng.randint(0, len(mon._moves))
+        mon._moves = dict(list(mon._moves.items())[:revealed])
+        battle._opponent_team[f"p2: {mon.species}"] = mon
+
+    active = rng.choice(list(battle._team.values()))
+    opponent = rng.choice(list(battle._opponent_team.values()))
+    active._active = True
+    opponent._active = True
+
+    for mon in (active, opponent):
+        for stat in ("atk", "def", "spa", "spd", "spe"):
+            mon._boosts[stat] = rng.choice([0, 0, 0, -1, 1, 2])
+
+    weather = rng.choice(WEATHERS)
+    if weather is not None:
+        battle._weather = {weather: 1}
+    battle._side_conditions = dict(rng.choice(HAZARDS))
+    battle._opponent_side_conditions = dict(rng.choice(HAZARDS))
+
+    battle._available_moves = list(active.moves.values())
+    battle._available_switches = [
+        mon for mon in battle._team.values() if not mon.active
+    ]
+    battle._turn = rng.randint(1, 30)
+
+    return battle
+
+
+def build_battles(player: Player, n_battles: int, seed: int) -> List[Battle]:
+    rng = random.Random(seed)
+    teams = list(load_opponent_teams().items())
+    return [
+        build_battle(f"battle-gen9ubers-{i}-{name}", player, team, rng)
+        for i in range(n_battles)
+        for name, team in [teams[i % len(teams)]]
+    ]
+
+
+def phase_calls(player: Player, battles: List[Battle]) -> Dict[str, List[Callable]]:
+    """Zero argument calls per phase, covering every action of every battle"""
+    calls: Dict[str, List[Callable]] = {"choose_move": []}
+
+    def new_turn(battle: Battle):
+        # every decision on a fresh turn, so per-turn caches are rebuilt
+        battle._turn += 1
+        return player.choose_move(battle)
+
+    for battle in battles:
+        calls["choose_move"].append(lambda b=battle: new_turn(b))
+
+        if hasattr(player, "_calculate_damage"):
+            active = battle.active_pokemon
+            opponent = battle.opponent_active_pokemon
+            pairs = [(mv, active, opponent) for mv in battle.available_moves] + [
+                (mv, opponent, mon)
+                for mv in opponent.moves.values()
+                for mon in battle.team.values()
+            ]
+            calls.setdefault("_calculate_damage", []).extend(
+                lambda p=pair, b=battle: player._calculate_damage(*p, b)
+                for pair in pairs
+            )
+        if hasattr(player, "_score_move"):
+            calls.setdefault("_score_move", []).extend(
+                lambda m=mv, b=battle: player._score_move(m, b)
+                for mv in battle.available_moves
+            )
+        if hasattr(player, "_score_switch"):
+            calls.setdefault("_score_switch", []).extend(
+                lambda s=mon, b=battle: player._score_switch(s, b)
+                for mon in battle.available_switches
+            )
+
+    return calls
+
+
+def time_calls(calls: List[Callable], repeats: int) -> Tuple[float, float]:
+    """Median and best per call time in seconds over repeats passes"""
+    for call in calls:
+        call()  # warm up
+
+    passes = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for call in calls:
+            call()
+        passes.append((time.perf_counter() - start) / len(calls))
+    return statistics.median(passes), min(passes)
+
+
+def allocations(calls: List[Callable]) -> Tuple[float, float]:
+    """Bytes still held after each call, averaged, and peak traced memory for one pass"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    total = 0
+    for call in calls:
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        after, _ = tracemalloc.get_traced_memory()
+        total += max(0, after - before)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total / len(calls), peak - start
+
+
+def run_benchmark(n_battles: int, repeats: int, seed: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for player in load_players():
+        battles = build_battles(player, n_battles, seed)
+        for phase, calls in phase_calls(player, battles).items():
+            median, best = time_calls(calls, repeats)
+            retained_bytes, peak = allocations(calls)
+            results[f"{player.username}/{phase}"] = {
+                "calls": len(calls),
+                "median_us": median * 1e6,
+                "best_us": best * 1e6,
+                "calls_per_s": 1 / median if median else 0.0,
+                "retained_bytes": retained_bytes,
+                "peak_kb": peak / 1024,
+            }
+    return results
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Names of the benchmarks that got slower than the baseline by more than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base and result["median_us"] > base["median_us"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--battles", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=726)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown against the baseline, 0.25 = 25%%",
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.battles, args.repeats, args.seed)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    table = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = f"{result['median_us'] / base['median_us'] - 1:+.0%}" if base else "-"
+        table.append(
+            [
+                name,
+                result["calls"],
+                result["median_us"],
+                result["calls_per_s"],
+                result["retained_bytes"],
+                result["peak_kb"],
+                change,
+            ]
+        )
+    print(
+        tabulate(
+            table,
+            headers=[
+                "Benchmark",
+                "Calls",
+                "Median us",
+                "Calls/s",
+                "Retained B/call",
+                "Peak KB",
+                "vs baseline",
+            ],
+            floatfmt=".1f",
+        )
+    )
+
+    if args.update_baseline:
+        if not os.path.exists(os.path.dirname(args.baseline)):
+            os.makedirs(os.path.dirname(args.baseline))
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Slower than baseline by more than {args.tolerance:.0%}:")
+        for name in regressions:
+            print(f"  {name}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,44 @@
 # node pokemon-showdown start --no-security
 
 
+import argparse
 import asyncio
 import csv
 import importlib
 import os
 import random
 import sys
-from collections import defaultdict
-from typing import Dict, List, Set, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
 
-import poke_env as pke
 from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 
+from battle_store import BATTLES_FOLDER, BattleStore
+from latency import LatencyRecorder
+from mock_server import start_mock_servers
+from player_modules import load_player_module
+from ratings import RatingStore
+from sequential_match import CrossEvaluation, MatchStats, p1_wins_match, play_match
+from swiss_pairing import pair_swiss_round
+from tournament_journal import Entry, Snapshot, TournamentJournal
+from team_registry import TEAMS
+from tournament_workers import ShardedMatchRunner
+
+# games used by every match played in this process
+MATCH_STATS = MatchStats()
+
+# decision timings of every agent playing in this process
+LATENCY = LatencyRecorder()
+LATENCY_PREFIX = os.path.join(
+    os.path.dirname(__file__), "results", "latency_competition"
+)
+
+# ratings from every game played in this process, they seed the swiss groups
+RATINGS = RatingStore()
+
+# finished battles are dropped after every batch, --spill-battles keeps them here
+BATTLES: Optional[BattleStore] = None
+
 
 def convert_results_to_html(csv_file: str, html_file: str):
     with open(csv_file, newline="", encoding="utf-8") as infile:
@@ -86,9 +111,10 @@ class Competitor:
         self.wins = 0
         self.losses = 0
         self.history.clear()
+        self.received_bye = False
 
 
-def gather_players():
+def gather_players(start_listening: bool = True):
     player_folders = os.path.join(os.path.dirname(__file__), "players")
 
     players = []
@@ -97,11 +123,7 @@ def gather_players():
         if module_name.endswith(".py"):
             module_path = f"{player_folders}/{module_name}"
 
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+            module = load_player_module(module_path)
 
             # Get the class
             if hasattr(module, "CustomAgent"):
@@ -114,48 +136,199 @@ def gather_players():
                     agent_class(
                         account_configuration=account_config,
                         battle_format="gen9ubers",
+                        start_listening=start_listening,
                     )
                 )
 
     return players
 
 
-def rank_players_by_victories(results_dict, top_k=10):
-    victory_scores = {}
+def current_ratings(match_runner: Optional[ShardedMatchRunner]) -> RatingStore:
+    # sharded games are rated by the runner as its workers report them
+    return match_runner.ratings if match_runner is not None else RATINGS
 
-    for player, opponents in results_dict.items():
-        victories = [
-            1 if (score is not None and score > 0.5) else 0
-            for opp, score in opponents.items()
-            if opp != player
-        ]
-        if victories:
-            victory_scores[player] = sum(victories) / len(victories)
-        else:
-            victory_scores[player] = 0.0
 
-    # Sort by descending victory rate
-    sorted_players = sorted(victory_scores.items(), key=lambda x: x[1], reverse=True)
+def current_latency(match_runner: Optional[ShardedMatchRunner]) -> LatencyRecorder:
+    # sharded decisions are timed in the workers, the runner merges them per match
+    return match_runner.latency if match_runner is not None else LATENCY
+
+
+# called with (index of the match, winner, loser) as soon as a match is decided
+MatchCallback = Callable[[int, Competitor, Competitor], None]
+
+# latest snapshot and the matches journaled after it
+Checkpoint = Tuple[Snapshot, List[Entry]]
+
 
-    return sorted_players[:top_k]
+def competitor_states(competitors: List[Competitor]) -> Dict[str, dict]:
+    return {
+        competitor.username: {
+            "id": competitor.id,
+            "wins": competitor.wins,
+            "losses": competitor.losses,
+            "history": sorted(competitor.history),
+            "received_bye": competitor.received_bye,
+        }
+        for competitor in competitors
+    }
 
 
-async def run_battle(p1: Competitor, p2: Competitor) -> Tuple[Competitor, Competitor]:
-    players = [p1.agent, p2.agent]
+def restore_competitors(competitors: List[Competitor], states: Dict[str, dict]):
+    by_name = {competitor.username: competitor for competitor in competitors}
+    missing = set(states) - set(by_name)
+    if missing:
+        raise ValueError(
+            f"Checkpoint has players that aren't competing: {', '.join(sorted(missing))}"
+        )
+    for name, state in states.items():
+        competitor = by_name[name]
+        competitor.id = state["id"]
+        competitor.wins = state["wins"]
+        competitor.losses = state["losses"]
+        competitor.history = set(state["history"])
+        competitor.received_bye = state["received_bye"]
 
-    cross_evaluation_results = await pke.cross_evaluate(players, n_challenges=3)
 
-    top_players = rank_players_by_victories(
-        cross_evaluation_results, top_k=len(cross_evaluation_results)
+def restore_checkpoint(
+    competitors: List[Competitor], snapshot: Snapshot, ratings: RatingStore
+):
+    """Puts the competitors, ratings and random state back as they were at snapshot"""
+    restore_competitors(competitors, snapshot["competitors"])
+    ratings.restore(snapshot["ratings"])
+    # later pairings shuffle ties the same way the first run would have
+    version, internal_state, gauss_next = snapshot["random"]
+    random.setstate((version, tuple(internal_state), gauss_next))
+
+
+def journal_match(
+    journal: TournamentJournal,
+    ratings: RatingStore,
+    phase: str,
+    round_num: int,
+    slot: int,
+    winner: Competitor,
+    loser: Competitor,
+):
+    # both rating rows go with the result, so a resume rates exactly as before
+    journal.record(
+        {
+            "phase": phase,
+            "round": round_num,
+            "slot": slot,
+            "winner": winner.username,
+            "loser": loser.username,
+            "ratings": {p.username: ratings.row(p.username) for p in (winner, loser)},
+        }
     )
 
-    winner = p1 if top_players[0][0] == p1.username else p2
+
+def replay_journal(
+    entries: List[Entry],
+    phase: str,
+    round_num: int,
+    competitors: List[Competitor],
+    ratings: RatingStore,
+) -> Dict[int, Tuple[Competitor, Competitor]]:
+    """Applies the round's journaled matches, returns their (winner, loser) by slot"""
+    by_name = {competitor.username: competitor for competitor in competitors}
+    done = {}
+    for entry in entries:
+        if entry["phase"] != phase or entry["round"] != round_num:
+            continue
+        winner, loser = by_name[entry["winner"]], by_name[entry["loser"]]
+        award(winner, loser)
+        ratings.restore(entry["ratings"])
+        done[entry["slot"]] = (winner, loser)
+    return done
+
+
+async def run_battle(
+    p1: Competitor, p2: Competitor, save_replays: Union[bool, str] = False
+) -> Tuple[Competitor, Competitor]:
+    # plays until the match is decided instead of a fixed best of 3
+    cross_evaluation_results = await play_match(
+        p1.agent,
+        p2.agent,
+        stats=MATCH_STATS,
+        on_game=RATINGS.record_game,
+        save_replays=save_replays,
+        spill=BATTLES,
+    )
+
+    return record_battle(p1, p2, cross_evaluation_results)
+
+
+def run_sharded_matches(
+    match_runner: ShardedMatchRunner,
+    matches: List[Tuple[Competitor, Competitor]],
+    save_replays: Optional[List[Union[bool, str]]] = None,
+    on_result: Optional[MatchCallback] = None,
+) -> List[Tuple[Competitor, Competitor]]:
+    results: List[Tuple[Competitor, Competitor]] = []
+
+    def record(i: int, cross_evaluation_results: CrossEvaluation):
+        results.append(record_battle(*matches[i], cross_evaluation_results))
+        if on_result is not None:
+            on_result(i, *results[-1])
+
+    match_runner.play(
+        [(p1.agent, p2.agent) for p1, p2 in matches], save_replays, record
+    )
+    return results
+
+
+def record_battle(
+    p1: Competitor, p2: Competitor, cross_evaluation_results
+) -> Tuple[Competitor, Competitor]:
+    p1_rate = cross_evaluation_results[p1.username][p2.username] or 0.0
+    p2_rate = cross_evaluation_results[p2.username][p1.username] or 0.0
+
+    winner = p1 if p1_wins_match(p1_rate, p2_rate) else p2
     loser = p2 if winner == p1 else p1
 
+    award(winner, loser)
+
+    return winner, loser
+
+
+def award(winner: Competitor, loser: Competitor):
     winner.wins += 1
     loser.losses += 1
 
-    return winner, loser
+    winner.history.add(loser.id)
+    loser.history.add(winner.id)
+
+
+async def run_matches(
+    matches: List[Tuple[Competitor, Competitor]],
+    max_concurrent_matches: int = 1,
+    on_result: Optional[MatchCallback] = None,
+    save_replays: Optional[List[Union[bool, str]]] = None,
+) -> List[Tuple[Competitor, Competitor]]:
+    """Plays every match concurrently (at most max_concurrent_matches at once, 0 = no limit)
+    and returns the (winner, loser) results in the same order as matches"""
+    semaphore = (
+        asyncio.Semaphore(max_concurrent_matches)
+        if max_concurrent_matches > 0
+        else None
+    )
+
+    async def play(
+        i: int, p1: Competitor, p2: Competitor
+    ) -> Tuple[Competitor, Competitor]:
+        match_replays = save_replays[i] if save_replays else False
+        if semaphore is None:
+            result = await run_battle(p1, p2, match_replays)
+        else:
+            async with semaphore:
+                result = await run_battle(p1, p2, match_replays)
+        if on_result is not None:
+            on_result(i, *result)
+        return result
+
+    return list(
+        await asyncio.gather(*(play(i, p1, p2) for i, (p1, p2) in enumerate(matches)))
+    )
 
 
 def run_swiss_round(
@@ -164,127 +337,200 @@ def run_swiss_round(
     summary_file: str,
     win_cap: int = 3,
     loss_cap: int = 2,
+    max_concurrent_matches: int = 1,
+    match_runner: Optional[ShardedMatchRunner] = None,
+    journal: Optional[TournamentJournal] = None,
+    checkpoint: Optional[Checkpoint] = None,
 ):
     round_num = 0
 
-    print(
-        f"🏆 Starting tournament with {len(competitors)} players (Win cap: {win_cap}, Loss cap: {loss_cap})"
-    )
+    ratings = current_ratings(match_runner)
 
-    for competitor in competitors:
-        competitor.reset()
-
-    with open(results_file, "a", encoding="utf-8") as file:
-        file.write("Round\tGroup\tPlayer 1\tPlayer 2\tWinner\tBye\n")
-        while True:
-            # Get active players
-            active_players = [
-                competitor
-                for competitor in competitors
-                if competitor.is_active(win_cap, loss_cap)
-            ]
-            if len(active_players) < 2:
-                break
-
-            round_num += 1
-            print(f"\n--- Round {round_num} ---")
-
-            # Group players by (wins, losses)
-            brackets: Dict[Tuple[int, int], List[Competitor]] = defaultdict(list)
-            for competitor in active_players:
-                brackets[(competitor.wins, competitor.losses)].append(competitor)
-
-            for group_key in sorted(brackets.keys()):
-                group = brackets[group_key]
-                random.shuffle(group)
-                unpaired = group[:]
-                while len(unpaired) >= 2:
-                    p1 = unpaired.pop(0)
-                    # Find first player p2 not already played against p1
-                    for i, p2 in enumerate(unpaired):
-                        if p2.id not in p1.history:
-                            unpaired.pop(i)
-                            winner, loser = asyncio.run(run_battle(p1, p2))
-                            print(
-                                f"Group {group_key}: {p1.username} vs {p2.username} → Winner: {winner.username}"
-                            )
-                            file.write(
-                                f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
-                            )
-                            break
-                    else:
-                        # No unique opponent available — just pair with next
-                        p2 = unpaired.pop(0)
-                        winner, loser = asyncio.run(run_battle(p1, p2))
+    # (winner, loser) by pairing slot of the round's matches played so far
+    done: Dict[int, Tuple[Competitor, Competitor]] = {}
+    resumed_pairings = None
+
+    if checkpoint is None:
+        print(
+            f"🏆 Starting tournament with {len(competitors)} players (Win cap: {win_cap}, Loss cap: {loss_cap})"
+        )
+
+        for competitor in competitors:
+            competitor.reset()
+    else:
+        # the interrupted round keeps its pairings, journaled matches aren't replayed
+        snapshot, entries = checkpoint
+        round_num = snapshot["round"]
+        by_name = {competitor.username: competitor for competitor in competitors}
+        resumed_pairings = [
+            (tuple(group_key), by_name[p1], by_name[p2] if p2 else None, rematch)
+            for group_key, p1, p2, rematch in snapshot["pairings"]
+        ]
+        done = replay_journal(entries, "swiss", round_num, competitors, ratings)
+        print(
+            f"♻️ Resuming tournament with {len(competitors)} players at round "
+            f"{round_num}, {len(done)} matches already played"
+        )
+
+    # one loop for the whole tournament instead of one per match
+    loop = asyncio.new_event_loop()
+
+    try:
+        with open(results_file, "a", encoding="utf-8") as file:
+            if checkpoint is None:
+                file.write("Round\tGroup\tPlayer 1\tPlayer 2\tWinner\tBye\n")
+                file.flush()
+            while True:
+                if resumed_pairings is not None:
+                    pairings, resumed_pairings = resumed_pairings, None
+                else:
+                    # Get active players
+                    active_players = [
+                        competitor
+                        for competitor in competitors
+                        if competitor.is_active(win_cap, loss_cap)
+                    ]
+                    if len(active_players) < 2:
+                        break
+
+                    round_num += 1
+                    pairings = pair_swiss_round(active_players, ratings)
+                    done = {}
+
+                    if journal is not None:
+                        journal.snapshot(
+                            {
+                                "phase": "swiss",
+                                "round": round_num,
+                                "pool": [c.username for c in competitors],
+                                "competitors": competitor_states(competitors),
+                                "ratings": ratings.snapshot(),
+                                "random": random.getstate(),
+                                "pairings": [
+                                    [
+                                        group_key,
+                                        p1.username,
+                                        p2 and p2.username,
+                                        rematch,
+                                    ]
+                                    for group_key, p1, p2, rematch in pairings
+                                ],
+                            }
+                        )
+
+                print(f"\n--- Round {round_num} ---")
+
+                slots = [
+                    k
+                    for k, (_, _, p2, _) in enumerate(pairings)
+                    if p2 is not None and k not in done
+                ]
+                matches = [(pairings[k][1], pairings[k][2]) for k in slots]
+
+                def on_result(i: int, winner: Competitor, loser: Competitor):
+                    done[slots[i]] = (winner, loser)
+                    if journal is not None:
+                        journal_match(
+                            journal,
+                            ratings,
+                            "swiss",
+                            round_num,
+                            slots[i],
+                            winner,
+                            loser,
+                        )
+
+                if match_runner is not None:
+                    run_sharded_matches(match_runner, matches, on_result=on_result)
+                else:
+                    loop.run_until_complete(
+                        run_matches(matches, max_concurrent_matches, on_result)
+                    )
+
+                for k, (group_key, p1, p2, rematch) in enumerate(pairings):
+                    if p2 is None:
+                        bye_player = p1
+                        bye_player.wins += 1
+                        bye_player.received_bye = True
                         print(
-                            f"Group {group_key} (re-pair): {p1.username} vs {p2.username} → Winner: {winner.username}"
+                            f"Group {group_key}: Player {bye_player.username} receives a BYE"
                         )
                         file.write(
-                            f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
+                            f"{round_num}\t{group_key}\t{bye_player.username}\t' '\t {bye_player.username}\tyes\n"
                         )
+                        continue
 
-                # Bye if odd number
-                if unpaired:
-                    bye_player = unpaired.pop()
-                    bye_player.wins += 1
+                    winner, loser = done[k]
+                    label = (
+                        f"Group {group_key} (rematch)"
+                        if rematch
+                        else f"Group {group_key}"
+                    )
                     print(
-                        f"Group {group_key}: Player {bye_player.username} receives a BYE"
+                        f"{label}: {p1.username} vs {p2.username} → Winner: {winner.username}"
                     )
                     file.write(
-                        f"{round_num}\t{group_key}\t{bye_player.username}\t' '\t {bye_player.username}\tyes\n"
+                        f"{round_num}\t{group_key}\t{p1.username}\t{p2.username}\t{winner.username}\tno\n"
                     )
+                # rounds before a snapshot are in the results file too
+                file.flush()
+    finally:
+        loop.close()
 
     print("\n🏁 Final Results:")
-    final_sorted = sorted(competitors, key=lambda p: (-p.wins, p.losses, p.id))
+    final_sorted = sorted(
+        competitors,
+        key=lambda p: (-p.wins, p.losses, -ratings.rating(p.username), p.id),
+    )
 
     with open(summary_file, "a", encoding="utf-8") as file:
-        file.write("Player\tWins\tLosses 1\tStatus\n")
+        file.write("Player\tWins\tLosses 1\tStatus\tRating\n")
         for competitor in final_sorted:
             status = (
                 "Qualified"
                 if competitor.wins >= win_cap
                 else ("Eliminated" if competitor.losses >= loss_cap else "")
             )
+            rating = ratings.rating(competitor.username)
             print(
-                f"Player {competitor.username} | W: {competitor.wins}, L: {competitor.losses} {status}"
+                f"Player {competitor.username} | W: {competitor.wins}, L: {competitor.losses} | R: {rating:.0f} {status}"
             )
             file.write(
-                f"{competitor.username}\t{competitor.wins}\t{competitor.losses}\t{status}\n"
+                f"{competitor.username}\t{competitor.wins}\t{competitor.losses}\t{status}\t{rating:.0f}\n"
             )
 
     return [p for p in final_sorted if p.wins >= win_cap]
 
 
-def generate_bots(num_bots: int):
+def generate_bots(num_bots: int, start_listening: bool = True):
     bot_folders = os.path.join(os.path.dirname(__file__), "bots")
     bot_teams_folders = os.path.join(bot_folders, "teams")
 
     bots = []
 
     bot_to_add = "simple"
-    team_file = "uber.txt"
+    team_name = "uber"
 
-    with open(
-        os.path.join(bot_teams_folders, team_file), "r", encoding="utf-8"
-    ) as file:
-        bot_team = file.read()
+    # one teambuilder shared by every filler bot
+    bot_team = TEAMS.load_folder(bot_teams_folders)[team_name]
 
-    for i in range(num_bots):
-        module_name = f"{bot_to_add}.py"
-        module_path = os.path.join(bot_folders, module_name)
-
-        spec = importlib.util.spec_from_file_location(module_name, module_path)
-        if spec is None or spec.loader is None:
-            print(f"⚠️ Could not load module {module_name}. Skipping.")
-            raise ImportError(
-                f"Could not load module {module_name}. Please check the file path."
-            )
+    # the module is loaded once, the bots are all instances of its class
+    module_name = f"{bot_to_add}.py"
+    module_path = os.path.join(bot_folders, module_name)
 
-        module = importlib.util.module_from_spec(spec)
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    if spec is None or spec.loader is None:
+        print(f"⚠️ Could not load module {module_name}. Skipping.")
+        raise ImportError(
+            f"Could not load module {module_name}. Please check the file path."
+        )
+
+    module = importlib.util.module_from_spec(spec)
 
-        sys.modules[module_name] = module
-        spec.loader.exec_module(module)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
 
+    for i in range(num_bots):
         # Get the class
         if hasattr(module, "CustomAgent"):
             # Check if the class is a subclass of Player
@@ -297,6 +543,7 @@ def generate_bots(num_bots: int):
                     team=bot_team,
                     account_configuration=account_config,
                     battle_format="gen9ubers",
+                    start_listening=start_listening,
                 )
             )
 
@@ -312,7 +559,18 @@ def bots_to_add_for_clean_halving(current_players: int, target_top_n: int) -> in
         multiplier += 1
 
 
-def run_swiss_phase(top_k: int, competitors: List[Competitor]):
+def run_swiss_phase(
+    top_k: int,
+    competitors: List[Competitor],
+    max_concurrent_matches: int = 1,
+    match_runner: Optional[ShardedMatchRunner] = None,
+    journal: Optional[TournamentJournal] = None,
+    checkpoint: Optional[Checkpoint] = None,
+):
+    if checkpoint is not None:
+        # back to the tournament that was interrupted
+        by_name = {competitor.username: competitor for competitor in competitors}
+        competitors = [by_name[name] for name in checkpoint[0]["pool"]]
 
     while len(competitors) > top_k:
         num_competitors = len(competitors)
@@ -327,9 +585,6 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
         if not os.path.exists(os.path.dirname(results_file)):
             os.makedirs(os.path.dirname(results_file))
 
-        with open(results_file, "w", encoding="utf-8") as file:
-            pass  # This opens the file in write mode, clearing it
-
         summary_file = os.path.join(
             os.path.dirname(__file__),
             "results",
@@ -338,14 +593,28 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
         if not os.path.exists(os.path.dirname(summary_file)):
             os.makedirs(os.path.dirname(summary_file))
 
-        with open(summary_file, "w", encoding="utf-8") as file:
-            pass  # This opens the file in write mode, clearing it
+        # a resumed tournament carries on with its results so far
+        if checkpoint is None:
+            with open(results_file, "w", encoding="utf-8") as file:
+                pass  # This opens the file in write mode, clearing it
+
+            with open(summary_file, "w", encoding="utf-8") as file:
+                pass  # This opens the file in write mode, clearing it
 
         cap = 3
 
         competitors = run_swiss_round(
-            competitors, results_file, summary_file, win_cap=cap, loss_cap=cap
+            competitors,
+            results_file,
+            summary_file,
+            win_cap=cap,
+            loss_cap=cap,
+            max_concurrent_matches=max_concurrent_matches,
+            match_runner=match_runner,
+            journal=journal,
+            checkpoint=checkpoint,
         )
+        checkpoint = None
 
         convert_results_to_html(
             results_file,
@@ -374,60 +643,129 @@ def run_swiss_phase(top_k: int, competitors: List[Competitor]):
     return competitors
 
 
-def run_knockout_phase(players_ranked: list[Competitor]):
-    """players_ranked: list of player IDs sorted from best (0) to worst (15)"""
+def run_knockout_phase(
+    players_ranked: list[Competitor],
+    match_runner: Optional[ShardedMatchRunner] = None,
+    journal: Optional[TournamentJournal] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    max_concurrent_matches: int = 0,
+):
+    """players_ranked: list of player IDs sorted from best (0) to worst (15)
+
+    Every match of a round is played at once, results are written in bracket order"""
     round_num = 1
     current_round = players_ranked
 
+    ratings = current_ratings(match_runner)
+
+    # (winner, loser) by match of the round's matches played so far
+    done: Dict[int, Tuple[Competitor, Competitor]] = {}
+    if checkpoint is not None:
+        # the bracket of the interrupted round, players_ranked just has to contain it
+        snapshot, entries = checkpoint
+        round_num = snapshot["round"]
+        by_name = {player.username: player for player in players_ranked}
+        current_round = [by_name[name] for name in snapshot["pool"]]
+        done = replay_journal(entries, "knockout", round_num, current_round, ratings)
+
     results_file = os.path.join(
         os.path.dirname(__file__), "results", "knockout_results.txt"
     )
     if not os.path.exists(os.path.dirname(results_file)):
         os.makedirs(os.path.dirname(results_file))
 
-    with open(results_file, "w", encoding="utf-8") as file:
-        pass  # This opens the file in write mode, clearing it
+    if checkpoint is None:
+        with open(results_file, "w", encoding="utf-8") as file:
+            pass  # This opens the file in write mode, clearing it
 
+    # replays are stored under these folder names, see replay_store
     replay_dir = os.path.join(os.path.dirname(__file__), "replays")
-    if not os.path.exists(replay_dir):
-        os.makedirs(replay_dir)
-
-    with open(results_file, "a", encoding="utf-8") as file:
-        file.write("Top\tPlayer 1\tPlayer 2\tWinner\n")
 
-        while len(current_round) > 1:
-            print(f"\n=== Round {round_num}: Top {len(current_round)} players ===")
+    # one loop for the whole phase, each round's matches run on it together
+    loop = asyncio.new_event_loop()
+
+    try:
+        with open(results_file, "a", encoding="utf-8") as file:
+            if checkpoint is None:
+                file.write("Top\tPlayer 1\tPlayer 2\tWinner\n")
+                file.flush()
+
+            while len(current_round) > 1:
+                if journal is not None and checkpoint is None:
+                    journal.snapshot(
+                        {
+                            "phase": "knockout",
+                            "round": round_num,
+                            "pool": [player.username for player in current_round],
+                            "competitors": competitor_states(current_round),
+                            "ratings": ratings.snapshot(),
+                            "random": random.getstate(),
+                        }
+                    )
+                checkpoint = None
 
-            for player in current_round:
-                print(f"Player {player.id:3d} {player.username}")
+                print(f"\n=== Round {round_num}: Top {len(current_round)} players ===")
 
-            next_round = []
-            num_matches = len(current_round) // 2
+                for player in current_round:
+                    print(f"Player {player.id:3d} {player.username}")
 
-            current_dir = os.path.join(replay_dir, f"round_{round_num}")
-            if not os.path.exists(current_dir):
-                os.makedirs(current_dir)
+                num_matches = len(current_round) // 2
 
-            for i in range(num_matches):
-                p1 = current_round[i]
-                p2 = current_round[-(i + 1)]
+                current_dir = os.path.join(replay_dir, f"round_{round_num}")
 
-                p1.agent._save_replays = (
+                # matches played before a restart come from the journal
+                slots = [i for i in range(num_matches) if i not in done]
+                matches = [(current_round[i], current_round[-(i + 1)]) for i in slots]
+                # replays are routed per match, the agents' own setting is left alone
+                match_replays = [
                     current_dir + "/" + p1.username + "--vs--" + p2.username
-                )
+                    for p1, p2 in matches
+                ]
+
+                def on_result(i: int, winner: Competitor, loser: Competitor):
+                    done[slots[i]] = (winner, loser)
+                    if journal is not None:
+                        journal_match(
+                            journal,
+                            ratings,
+                            "knockout",
+                            round_num,
+                            slots[i],
+                            winner,
+                            loser,
+                        )
 
-                winner, loser = asyncio.run(run_battle(p1, p2))
-                print(
-                    f"Match: {p1.username} vs {p2.username} → Winner: {winner.username}"
-                )
+                if match_runner is not None:
+                    run_sharded_matches(match_runner, matches, match_replays, on_result)
+                else:
+                    loop.run_until_complete(
+                        run_matches(
+                            matches, max_concurrent_matches, on_result, match_replays
+                        )
+                    )
 
-                file.write(
-                    f"{len(current_round)}\t{p1.username}\t{p2.username}\t{winner.username}\n"
-                )
+                # matches finish in any order, the bracket is written in seed order
+                next_round = []
+                for i in range(num_matches):
+                    p1 = current_round[i]
+                    p2 = current_round[-(i + 1)]
+                    winner, loser = done[i]
+                    label = "Match" if i in slots else "Match (journaled)"
+                    print(
+                        f"{label}: {p1.username} vs {p2.username} → Winner: {winner.username}"
+                    )
+                    file.write(
+                        f"{len(current_round)}\t{p1.username}\t{p2.username}\t{winner.username}\n"
+                    )
+                    next_round.append(winner)
+                # rounds before a snapshot are in the results file too
+                file.flush()
 
-                next_round.append(winner)
-            current_round = next_round
-            round_num += 1
+                current_round = next_round
+                round_num += 1
+                done = {}
+    finally:
+        loop.close()
 
     convert_results_to_html(
         results_file,
@@ -444,7 +782,14 @@ def run_knockout_phase(players_ranked: list[Competitor]):
 def run_competition(
     players: List[Player],
     top_k: int = 16,
+    max_concurrent_matches: int = 1,
+    match_runner: Optional[ShardedMatchRunner] = None,
+    journal: Optional[TournamentJournal] = None,
+    resume: bool = False,
 ):
+    """Swiss rounds down to top_k then a knockout, checkpointed to journal if given.
+
+    resume picks up from the journal's last snapshot, the same players must compete"""
     competitors = [Competitor(i + 1, p.username, p) for i, p in enumerate(players)]
 
     if len(competitors) < top_k:
@@ -455,7 +800,7 @@ def run_competition(
 
     print(f"🤖 Adding {bots_to_add} bots to make a clean halving for {top_k} players")
 
-    bots = generate_bots(bots_to_add)
+    bots = generate_bots(bots_to_add, start_listening=match_runner is None)
 
     bot_competitors = [
         Competitor(i + len(players) + 1, p.username, p) for i, p in enumerate(bots)
@@ -463,18 +808,126 @@ def run_competition(
 
     competitors += bot_competitors
 
-    top_k_competitors = run_swiss_phase(top_k, competitors)
+    for competitor in competitors:
+        LATENCY.instrument(competitor.agent)
+
+    checkpoint = None
+    if journal is not None:
+        checkpoint = journal.load() if resume else None
+        if checkpoint is None:
+            if resume:
+                print("⚠️ No checkpoint to resume from, starting over")
+            journal.clear()
+
+    phase = "swiss"
+    if checkpoint is not None:
+        snapshot = checkpoint[0]
+        phase = snapshot["phase"]
+        if phase == "done":
+            print(f"\n🏆 Final Winner: {snapshot['winner']} (checkpointed run)")
+            return
+        restore_checkpoint(competitors, snapshot, current_ratings(match_runner))
+        print(f"♻️ Resuming the {phase} phase at round {snapshot['round']}")
+
+    # every battle's timings are written out as it ends, only the totals stay
+    os.makedirs(os.path.dirname(LATENCY_PREFIX), exist_ok=True)
+    current_latency(match_runner).stream_to(f"{LATENCY_PREFIX}.csv")
+
+    if phase == "swiss":
+        top_k_competitors = run_swiss_phase(
+            top_k,
+            competitors,
+            max_concurrent_matches,
+            match_runner,
+            journal,
+            checkpoint,
+        )
+        checkpoint = None
+    else:
+        top_k_competitors = competitors
 
     print("\n🏁 Knockout Rounds:")
-    winner = run_knockout_phase(top_k_competitors)
+    winner = run_knockout_phase(
+        top_k_competitors,
+        match_runner,
+        journal,
+        checkpoint,
+        max_concurrent_matches,
+    )
     print(f"\n🏆 Final Winner: {winner.username} (ID: {winner.id})")
 
+    if journal is not None:
+        journal.snapshot({"phase": "done", "winner": winner.username})
+
+    stats = match_runner.stats if match_runner is not None else MATCH_STATS
+    print(f"🎮 {stats.summary()}")
+
+    print("📈 Top ratings:")
+    for name, rating in current_ratings(match_runner).ranking(top_k=top_k):
+        print(f"{name} | R: {rating:.0f}")
+
+    latency_files = current_latency(match_runner).export(LATENCY_PREFIX)
+    print(f"⏱️ Decision latencies written to {', '.join(latency_files)}")
+
 
 def main():
+    global BATTLES
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shards",
+        type=int,
+        nargs="+",
+        default=[],
+        help="ports of local showdown servers, one worker process per server",
+    )
+    parser.add_argument(
+        "--mock-server",
+        action="store_true",
+        help="serve simplified battles in process instead of a showdown server",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="carry on from the last checkpoint instead of starting over",
+    )
+    parser.add_argument(
+        "--spill-battles",
+        action="store_true",
+        help=f"keep finished battles in {BATTLES_FOLDER} instead of dropping them",
+    )
+    args = parser.parse_args()
 
-    players = gather_players()
+    if args.mock_server:
+        start_mock_servers(args.shards or [8000])
 
-    run_competition(players, top_k=16)
+    battles_folder = BATTLES_FOLDER if args.spill_battles else None
+    if battles_folder is not None:
+        BATTLES = BattleStore(battles_folder)
+
+    journal = TournamentJournal()
+
+    if not args.shards:
+        players = gather_players()
+        run_competition(
+            players,
+            top_k=16,
+            max_concurrent_matches=8,
+            journal=journal,
+            resume=args.resume,
+        )
+        return
+
+    # workers rebuild the agents on their own server, these stay offline
+    players = gather_players(start_listening=False)
+    with ShardedMatchRunner(args.shards, battles_folder=battles_folder) as match_runner:
+        run_competition(
+            players,
+            top_k=16,
+            match_runner=match_runner,
+            journal=journal,
+            resume=args.resume,
+        )
 
 
 if __name__ == "__main__":
@@ -1,29 +1,83 @@
 # node pokemon-showdown start --no-security
 
 
+import argparse
 import asyncio
+import hashlib
 import importlib
+import inspect
+import json
 import os
 import sys
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
-import poke_env as pke
 from poke_env import AccountConfiguration
 from poke_env.player.player import Player
 from tabulate import tabulate
 
+import sequential_match
+from battle_store import BATTLES_FOLDER, BattleStore
+from latency import LatencyRecorder
+from mock_server import start_mock_servers
+from player_modules import load_player_module
+from ratings import RatingStore
+from replay_store import store_replays
+from sequential_match import (
+    DEFAULT_RULE,
+    CrossEvaluation,
+    GameCallback,
+    MatchStats,
+    p1_wins_match,
+    play_match,
+)
+from team_registry import TEAMS
+from tournament_workers import ShardedMatchRunner
+
+# None plays each pairing until the stopping rule decides it, or set a fixed count
+N_CHALLENGES: Optional[int] = None
+
+# games used by every match played in this process
+MATCH_STATS = MatchStats()
+
+# decision timings of every agent playing in this process
+LATENCY = LatencyRecorder()
+LATENCY_PREFIX = os.path.join(
+    os.path.dirname(__file__), "results", "latency_expert_main"
+)
+
+# ratings from every game played in this process
+RATINGS = RatingStore()
+
+# finished battles are dropped after every batch, --spill-battles keeps them here
+BATTLES: Optional[BattleStore] = None
+
+BOT_RESULTS_FILE = os.path.join(
+    os.path.dirname(__file__), "results", "bot_cross_evaluation.json"
+)
+# mock battles say nothing about the real matchups, keep them apart
+MOCK_BOT_RESULTS_FILE = os.path.join(
+    os.path.dirname(__file__), "results", "bot_cross_evaluation_mock.json"
+)
+
 
 def rank_players_by_victories(results_dict, top_k=10):
     victory_scores = {}
 
+    # cross evaluations list their players in pairing order, p1 first, so each
+    # pair is decided the way its match was
+    players = list(results_dict)
+    victories = {player: 0 for player in players}
+    for i, p1 in enumerate(players):
+        for p2 in players[i + 1 :]:
+            p1_score, p2_score = results_dict[p1][p2], results_dict[p2][p1]
+            if p1_score is None or p2_score is None:
+                continue
+            victories[p1 if p1_wins_match(p1_score, p2_score) else p2] += 1
+
     for player, opponents in results_dict.items():
-        victories = [
-            1 if (score is not None and score > 0.5) else 0
-            for opp, score in opponents.items()
-            if opp != player
-        ]
-        if victories:
-            victory_scores[player] = sum(victories) / len(victories)
+        played = [opp for opp in opponents if opp != player]
+        if played:
+            victory_scores[player] = victories[player] / len(played)
         else:
             victory_scores[player] = 0.0
 
@@ -33,24 +87,18 @@ def rank_players_by_victories(results_dict, top_k=10):
     return sorted_players[:top_k]
 
 
-def gather_players():
+def gather_players(start_listening: bool = True):
     player_folders = os.path.join(os.path.dirname(__file__), "players")
 
     players = []
 
     replay_dir = os.path.join(os.path.dirname(__file__), "replays")
-    if not os.path.exists(replay_dir):
-        os.makedirs(replay_dir)
 
     for module_name in os.listdir(player_folders):
         if module_name.endswith(".py"):
             module_path = f"{player_folders}/{module_name}"
 
-            spec = importlib.util.spec_from_file_location(module_name, module_path)
-            module = importlib.util.module_from_spec(spec)
-
-            sys.modules[module_name] = module
-            spec.loader.exec_module(module)
+            module = load_player_module(module_path)
 
             # Get the class
             if hasattr(module, "CustomAgent"):
@@ -61,36 +109,30 @@ def gather_players():
                 agent_class = getattr(module, "CustomAgent")
 
                 agent_replay_dir = os.path.join(replay_dir, f"{player_name}")
-                if not os.path.exists(agent_replay_dir):
-                    os.makedirs(agent_replay_dir)
 
                 account_config = AccountConfiguration(player_name, None)
                 player = agent_class(
                     account_configuration=account_config,
                     battle_format="gen9ubers",
+                    start_listening=start_listening,
                 )
 
-                player._save_replays = agent_replay_dir
+                # kept in the replay store under this folder's name
+                store_replays(player, agent_replay_dir)
 
                 players.append(player)
 
     return players
 
 
-def gather_bots():
+def gather_bots(start_listening: bool = True):
     bot_folders = os.path.join(os.path.dirname(__file__), "bots")
     bot_teams_folders = os.path.join(bot_folders, "teams")
 
     generic_bots = []
 
-    bot_teams = {}
-
-    for team_file in os.listdir(bot_teams_folders):
-        if team_file.endswith(".txt"):
-            with open(
-                os.path.join(bot_teams_folders, team_file), "r", encoding="utf-8"
-            ) as file:
-                bot_teams[team_file[:-4]] = file.read()
+    # parsed once, every bot playing a team shares its teambuilder
+    bot_teams = TEAMS.load_folder(bot_teams_folders)
 
     for module_name in os.listdir(bot_folders):
         if module_name.endswith(".py"):
@@ -115,6 +157,7 @@ def gather_bots():
                             team=team,
                             account_configuration=account_config,
                             battle_format="gen9ubers",
+                            start_listening=start_listening,
                         )
                     )
 
@@ -122,14 +165,153 @@ def gather_bots():
 
 
 async def cross_evaluate(agents: List[Player]):
-    return await pke.cross_evaluate(agents, n_challenges=3)
+    return await sequential_match.cross_evaluate(
+        agents,
+        n_challenges=N_CHALLENGES,
+        stats=MATCH_STATS,
+        on_game=RATINGS.record_game,
+        spill=BATTLES,
+    )
 
 
-def evalute_againts_bots(players: List[Player]):
+def play_pairs(
+    pairs: List[Tuple[Player, Player]],
+    match_runner: Optional[ShardedMatchRunner] = None,
+    on_game: Optional[GameCallback] = None,
+) -> List[CrossEvaluation]:
+    if match_runner is not None:
+        return match_runner.play(pairs, on_game=on_game)
+
+    def record_game(p1: str, p2: str, score: float):
+        RATINGS.record_game(p1, p2, score)
+        if on_game is not None:
+            on_game(p1, p2, score)
+
+    async def play_all():
+        return [
+            await play_match(
+                p1,
+                p2,
+                n_challenges=N_CHALLENGES,
+                stats=MATCH_STATS,
+                on_game=record_game,
+                spill=BATTLES,
+            )
+            for p1, p2 in pairs
+        ]
+
+    return asyncio.run(play_all())
+
+
+def cross_evaluate_missing(
+    agents: List[Player],
+    known_results: CrossEvaluation,
+    match_runner: Optional[ShardedMatchRunner] = None,
+    on_game: Optional[GameCallback] = None,
+) -> CrossEvaluation:
+    """Cross evaluation of agents that only plays the pairings missing from known_results"""
+    results: CrossEvaluation = {
+        p1.username: {
+            p2.username: known_results.get(p1.username, {}).get(p2.username)
+            for p2 in agents
+        }
+        for p1 in agents
+    }
+
+    pairs = [
+        (p1, p2)
+        for i, p1 in enumerate(agents)
+        for p2 in agents[i + 1 :]
+        if results[p1.username][p2.username] is None
+    ]
+    played = play_pairs(pairs, match_runner, on_game)
+    for (p1, p2), pair_results in zip(pairs, played):
+        results[p1.username][p2.username] = pair_results[p1.username][p2.username]
+        results[p2.username][p1.username] = pair_results[p2.username][p1.username]
+
+    return results
+
+
+def bot_fingerprint(bot: Player) -> str:
+    # bot code + team, so editing either invalidates its cached results
+    with open(inspect.getfile(type(bot)), "rb") as file:
+        source = file.read()
+    team = bot._team.yield_team() if bot._team is not None else ""
+    return hashlib.sha256(source + b"\0" + team.encode("utf-8")).hexdigest()[:16]
+
+
+def evaluate_bots(
+    bots: List[Player],
+    match_runner: Optional[ShardedMatchRunner] = None,
+    cache_file: str = BOT_RESULTS_FILE,
+) -> CrossEvaluation:
+    """Bot vs bot block of the cross evaluation, reusing results cached on disk"""
+    cache: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(cache_file):
+        with open(cache_file, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+
+    fingerprints = {bot.username: bot_fingerprint(bot) for bot in bots}
+
+    match_format = N_CHALLENGES or "sprt-" + "-".join(map(str, DEFAULT_RULE))
+
+    def pair_key(p1: str, p2: str) -> str:
+        return f"{fingerprints[p1]}:{fingerprints[p2]}:{match_format}"
+
+    # cached pairings replay their games one by one, so the ratings see the same
+    # number of games as if the pairing had been played again
+    ratings = match_runner.ratings if match_runner is not None else RATINGS
+
+    known_results: CrossEvaluation = {bot.username: {} for bot in bots}
+    for i, b1 in enumerate(bots):
+        for b2 in bots[i + 1 :]:
+            cached = cache.get(pair_key(b1.username, b2.username))
+            # entries from before games were cached are played again
+            if not isinstance(cached, dict):
+                continue
+            known_results[b1.username][b2.username] = cached["results"][0]
+            known_results[b2.username][b1.username] = cached["results"][1]
+            for score in cached["games"]:
+                ratings.record_game(b1.username, b2.username, score)
+
+    games: Dict[Tuple[str, str], List[float]] = {}
+
+    def record_game(p1: str, p2: str, score: float):
+        games.setdefault((p1, p2), []).append(score)
+
+    results = cross_evaluate_missing(bots, known_results, match_runner, record_game)
+
+    for (p1, p2), scores in games.items():
+        cache[pair_key(p1, p2)] = {
+            "results": [results[p1][p2], results[p2][p1]],
+            "games": scores,
+        }
+
+    if not os.path.exists(os.path.dirname(cache_file)):
+        os.makedirs(os.path.dirname(cache_file))
+
+    with open(cache_file, "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=1, sort_keys=True)
+
+    return results
+
+
+def evalute_againts_bots(
+    players: List[Player],
+    match_runner: Optional[ShardedMatchRunner] = None,
+    known_results: Optional[CrossEvaluation] = None,
+):
     print(f"{len(players)} are competing in this challenge")
 
     print("Running Cross Evaluations...")
-    cross_evaluation_results = asyncio.run(cross_evaluate(players))
+    if known_results is not None:
+        cross_evaluation_results = cross_evaluate_missing(
+            players, known_results, match_runner
+        )
+    elif match_runner is not None:
+        cross_evaluation_results = match_runner.cross_evaluate(players)
+    else:
+        cross_evaluation_results = asyncio.run(cross_evaluate(players))
     print("Evaluations Complete")
 
     table = [["-"] + [p.username for p in players]]
@@ -162,10 +344,18 @@ def assign_marks(rank: int) -> float:
     return 0.0 if marks < 0 else marks
 
 
-def main():
-    generic_bots = gather_bots()
+def mark_players(
+    bot_results_file: str, match_runner: Optional[ShardedMatchRunner] = None
+):
+    """Marks every player against the bots, on the runner's shards if one is given"""
+    start_listening = match_runner is None
+
+    generic_bots = gather_bots(start_listening)
+
+    players = gather_players(start_listening)
 
-    players = gather_players()
+    for agent in generic_bots + players:
+        LATENCY.instrument(agent)
 
     results_file = os.path.join(
         os.path.dirname(__file__), "results", "marking_results.txt"
@@ -176,21 +366,32 @@ def main():
     with open(results_file, "w", encoding="utf-8") as file:
         pass  # This opens the file in write mode, clearing it
 
+    # every battle's timings are written out as it ends, only the totals stay
+    latency = match_runner.latency if match_runner is not None else LATENCY
+    latency.stream_to(f"{LATENCY_PREFIX}.csv")
+
+    # bots only need to play each other once, each player then just plays its row
+    print("Evaluating bots against each other...")
+    bot_results = evaluate_bots(generic_bots, match_runner, bot_results_file)
+
     for player in players:
         agents = []
         print(f"Evaluating player: {player.username}")
         agents.append(player)
         agents.extend(generic_bots)
 
-        agent_rankings = evalute_againts_bots(agents)
+        agent_rankings = evalute_againts_bots(agents, match_runner, bot_results)
 
         player_rank = len(agents) + 1
         player_mark = 0.0
-        print("Rank. Player - Win Rate - Mark")
+        ratings = match_runner.ratings if match_runner is not None else RATINGS
+        print("Rank. Player - Win Rate - Rating - Mark")
         for rank, (agent, winrate) in enumerate(agent_rankings, 1):
             mark = assign_marks(rank)
 
-            print(f"{rank}. {agent} - {winrate:.2f} - {mark}")
+            print(
+                f"{rank}. {agent} - {winrate:.2f} - {ratings.rating(agent):.0f} - {mark}"
+            )
             if agent == player.username:
                 player_rank = rank
                 player_mark = mark
@@ -200,6 +401,62 @@ def main():
         with open(results_file, "a", encoding="utf-8") as file:
             file.write(f"{player.username} #{player_rank} {player_mark}\n")
 
+    stats = match_runner.stats if match_runner is not None else MATCH_STATS
+    print(stats.summary())
+
+    ratings = match_runner.ratings if match_runner is not None else RATINGS
+    print("Ratings")
+    print(
+        tabulate(
+            ratings.table(),
+            headers=["Player", "Rating", "Deviation", "Games", "Score"],
+            floatfmt=".1f",
+        )
+    )
+
+    latency_files = latency.export(LATENCY_PREFIX)
+    print(f"Decision latencies written to {', '.join(latency_files)}")
+
+
+def main():
+    global BATTLES
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shards",
+        type=int,
+        nargs="+",
+        default=[],
+        help="ports of local showdown servers, one worker process per server",
+    )
+    parser.add_argument(
+        "--mock-server",
+        action="store_true",
+        help="serve simplified battles in process instead of a showdown server",
+    )
+    parser.add_argument(
+        "--spill-battles",
+        action="store_true",
+        help=f"keep finished battles in {BATTLES_FOLDER} instead of dropping them",
+    )
+    args = parser.parse_args()
+
+    if args.mock_server:
+        start_mock_servers(args.shards or [8000])
+
+    battles_folder = BATTLES_FOLDER if args.spill_battles else None
+    if battles_folder is not None:
+        BATTLES = BattleStore(battles_folder)
+
+    bot_results_file = MOCK_BOT_RESULTS_FILE if args.mock_server else BOT_RESULTS_FILE
+    if not args.shards:
+        mark_players(bot_results_file)
+        return
+
+    # sharded workers rebuild the agents on their own server, these stay offline
+    with ShardedMatchRunner(args.shards, N_CHALLENGES, battles_folder) as match_runner:
+        mark_players(bot_results_file, match_runner)
+
 
 if __name__ == "__main__":
     main()
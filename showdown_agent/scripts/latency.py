@@ -0,0 +1,279 @@
+import csv
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from poke_env.battle.abstract_battle import AbstractBattle
+from poke_env.player.player import Player
+
+# log spaced buckets, 8 per doubling from 10us, anything slower than ~80s lands in the last
+_MIN_SECONDS = 1e-5
+_BUCKETS_PER_DOUBLING = 8
+_NUM_BUCKETS = 23 * _BUCKETS_PER_DOUBLING
+
+# decisions slower than this count as over budget
+DEFAULT_BUDGET = 0.25
+
+ALL_BATTLES = "*"
+
+PHASES = ("choose_move", "_score_move", "_score_switch")
+
+FIELDNAMES = [
+    "agent",
+    "battle",
+    "phase",
+    "count",
+    "mean_ms",
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "max_ms",
+    "over_budget",
+]
+
+Row = Dict[str, Any]
+
+
+def _bucket(seconds: float) -> int:
+    if seconds <= _MIN_SECONDS:
+        return 0
+    index = int(math.log2(seconds / _MIN_SECONDS) * _BUCKETS_PER_DOUBLING) + 1
+    return min(index, _NUM_BUCKETS - 1)
+
+
+def _bucket_upper_bound(index: int) -> float:
+    return _MIN_SECONDS * 2 ** (index / _BUCKETS_PER_DOUBLING)
+
+
+class LatencyHistogram:
+    """Log histogram, recording is one log2 and a dict increment.
+
+    Only buckets that were hit are stored: there is one histogram per battle and
+    phase, and a battle's few dozen decisions land in a handful of buckets."""
+
+    __slots__ = ("budget", "counts", "count", "total", "max", "over_budget")
+
+    def __init__(self, budget: float = DEFAULT_BUDGET):
+        self.budget = budget
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.over_budget = 0
+
+    def record(self, seconds: float):
+        index = _bucket(seconds)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if seconds > self.budget:
+            self.over_budget += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, count in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.over_budget += other.over_budget
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th quantile, capped at the max seen"""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in sorted(self.counts.items()):
+            seen += count
+            if seen >= target:
+                return min(_bucket_upper_bound(i), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "p50_ms": 1000 * self.quantile(0.50),
+            "p95_ms": 1000 * self.quantile(0.95),
+            "p99_ms": 1000 * self.quantile(0.99),
+            "max_ms": 1000 * self.max,
+            "over_budget": self.over_budget,
+        }
+
+
+class LatencyRecorder:
+    """Per agent and per phase decision timings over the whole run.
+
+    Battles keep their own histograms only while they are played: once one is over
+    its rows go to the csv given to stream_to, or wait for take() without one."""
+
+    def __init__(self, budget: float = DEFAULT_BUDGET):
+        self.budget = budget
+        self.totals: Dict[Tuple[str, str], LatencyHistogram] = {}
+        # (agent, battle_tag) -> phase -> histogram, for battles still being played
+        self.battles: Dict[Tuple[str, str], Dict[str, LatencyHistogram]] = {}
+        self.finished: List[Row] = []
+        self._csv_path: Optional[str] = None
+        self._csv_file: Optional[IO[str]] = None
+        self._csv_writer: Optional[csv.DictWriter] = None
+        # agents deciding on threads record from those, battles finish on the event loop
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # take() ships the recorder from shard workers, locks don't pickle
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, battle_tag: str, phase: str, seconds: float):
+        with self._lock:
+            phases = self.battles.get((agent, battle_tag))
+            if phases is None:
+                phases = self.battles[(agent, battle_tag)] = {}
+            histogram = phases.get(phase)
+            if histogram is None:
+                histogram = phases[phase] = LatencyHistogram(self.budget)
+            histogram.record(seconds)
+
+    def finish(self, agent: str, battle_tag: str):
+        """Folds a battle into agent's totals and hands its rows on"""
+        with self._lock:
+            phases = self.battles.pop((agent, battle_tag), None)
+        if phases is None:
+            return
+        rows = [
+            {"agent": agent, "battle": battle_tag, "phase": phase, **h.summary()}
+            for phase, h in sorted(phases.items())
+        ]
+        with self._lock:
+            for phase, histogram in phases.items():
+                if (agent, phase) not in self.totals:
+                    self.totals[(agent, phase)] = LatencyHistogram(self.budget)
+                self.totals[(agent, phase)].merge(histogram)
+            self._write_battle_rows(rows)
+
+    def _write_battle_rows(self, rows: List[Row]):
+        if self._csv_writer is None:
+            self.finished.extend(rows)
+            return
+        self._csv_writer.writerows(rows)
+        # a crash loses at most the battle being written
+        self._csv_file.flush()
+
+    def stream_to(self, csv_path: str):
+        """Writes every finished battle's rows to csv_path from now on
+
+        export(path_prefix) with the same csv appends the totals and closes it"""
+        with self._lock:
+            self._open_csv(csv_path)
+
+    def _open_csv(self, csv_path: str):
+        self._csv_path = csv_path
+        self._csv_file = open(csv_path, "w", newline="", encoding="utf-8")
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=FIELDNAMES)
+        self._csv_writer.writeheader()
+        finished, self.finished = self.finished, []
+        self._write_battle_rows(finished)
+
+    def merge(self, other: "LatencyRecorder"):
+        with self._lock:
+            for key, histogram in other.totals.items():
+                if key not in self.totals:
+                    self.totals[key] = LatencyHistogram(self.budget)
+                self.totals[key].merge(histogram)
+            self._write_battle_rows(other.finished)
+
+    def take(self) -> "LatencyRecorder":
+        """Moves the totals and finished battles so far into a new recorder"""
+        taken = LatencyRecorder(self.budget)
+        with self._lock:
+            taken.totals, self.totals = self.totals, {}
+            taken.finished, self.finished = self.finished, []
+        return taken
+
+    def _timed(self, agent: str, phase: str, method: Callable[..., Any]):
+        @functools.wraps(method)
+        def timed(*args):
+            battle = args[-1]
+            start = time.perf_counter()
+            result = method(*args)
+            if inspect.isawaitable(result):
+                return self._timed_awaitable(agent, battle, phase, start, result)
+            self.record(agent, battle.battle_tag, phase, time.perf_counter() - start)
+            return result
+
+        return timed
+
+    async def _timed_awaitable(self, agent, battle, phase, start, awaitable):
+        result = await awaitable
+        self.record(agent, battle.battle_tag, phase, time.perf_counter() - start)
+        return result
+
+    def _finishing(self, agent: str, callback: Callable[[AbstractBattle], None]):
+        @functools.wraps(callback)
+        def battle_finished(battle: AbstractBattle):
+            self.finish(agent, battle.battle_tag)
+            callback(battle)
+
+        return battle_finished
+
+    def instrument(self, player: Player) -> Player:
+        """Times choose_move, plus the scoring phases when the agent has them"""
+        for phase in PHASES:
+            method = getattr(player, phase, None)
+            if method is not None and not hasattr(method, "__wrapped__"):
+                setattr(player, phase, self._timed(player.username, phase, method))
+        callback = player._battle_finished_callback
+        if not hasattr(callback, "__wrapped__"):
+            player._battle_finished_callback = self._finishing(
+                player.username, callback
+            )
+        return player
+
+    def rows(self) -> List[Row]:
+        """One row per agent and phase over all battles"""
+        with self._lock:
+            totals = sorted(self.totals.items())
+        return [
+            {"agent": agent, "battle": ALL_BATTLES, "phase": phase, **h.summary()}
+            for (agent, phase), h in totals
+        ]
+
+    def export(self, path_prefix: str) -> List[str]:
+        """Writes path_prefix.json and path_prefix.csv, returns the paths
+
+        Battles still open count as finished. The json holds the totals, the csv
+        every battle's rows followed by the totals"""
+        with self._lock:
+            still_open = list(self.battles)
+        for agent, battle_tag in still_open:
+            self.finish(agent, battle_tag)
+        rows = self.rows()
+
+        json_path = f"{path_prefix}.json"
+        with open(json_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {"budget_ms": 1000 * self.budget, "rows": rows},
+                file,
+                indent=1,
+            )
+
+        csv_path = f"{path_prefix}.csv"
+        with self._lock:
+            if self._csv_path != csv_path:
+                self._open_csv(csv_path)
+            self._csv_writer.writerows(rows)
+            self._csv_file.close()
+            self._csv_path = self._csv_file = self._csv_writer = None
+
+        return [json_path, csv_path]
@@ -0,0 +1,599 @@
+# Stand in for `node pokemon-showdown start --no-security`, one port per shard:
+# python mock_server.py 8000 8001 8002 8003
+#
+# Speaks enough of the showdown websocket protocol for poke_env players to log in,
+# challenge each other and play simplified singles battles: damage from the usual
+# gen 5+ formula and GenData's type chart, boosts and healing from status moves,
+# no abilities, items, statuses, hazards or weather. Meant for load testing the
+# tournament scripts, not for judging agents.
+
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from poke_env.battle import Move, PokemonType
+from poke_env.data import GenData, to_id_str
+from poke_env.stats import compute_raw_stats
+from poke_env.teambuilder import Teambuilder, TeambuilderPokemon
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+STATS = ("hp", "atk", "def", "spa", "spd", "spe")
+BOOSTABLE = ("atk", "def", "spa", "spd", "spe", "accuracy", "evasion")
+
+DEFAULT_MAX_TURNS = 200
+
+
+class Challenge(NamedTuple):
+    challenger: str
+    challenged: str
+    battle_format: str
+    team: str
+
+
+class MockPokemon:
+    def __init__(self, side: str, packed: TeambuilderPokemon, data: GenData):
+        species = to_id_str(packed.species or packed.nickname)
+        entry = data.pokedex[species]
+
+        self.side = side
+        self.name = packed.nickname or entry["name"]
+        self.species = species
+        self.level = packed.level or 100
+        self.details = f"{entry['name']}, L{self.level}"
+        self.types = [PokemonType.from_name(t) for t in entry["types"]]
+        self.item = to_id_str(packed.item or "")
+        self.ability = to_id_str(packed.ability or "")
+        self.moves = [Move(to_id_str(move), gen=data.gen) for move in packed.moves]
+
+        raw_stats = compute_raw_stats(
+            species,
+            packed.evs,
+            packed.ivs,
+            self.level,
+            (packed.nature or "serious").lower(),
+            data,
+        )
+        self.stats = dict(zip(STATS, raw_stats))
+        self.hp = self.stats["hp"]
+        self.boosts = {stat: 0 for stat in BOOSTABLE}
+        self.active = False
+
+    @property
+    def ident(self) -> str:
+        return f"{self.side}: {self.name}"
+
+    @property
+    def position(self) -> str:
+        return f"{self.side}a: {self.name}"
+
+    @property
+    def fainted(self) -> bool:
+        return self.hp <= 0
+
+    def condition(self, viewer: str) -> str:
+        """Exact hp for the owner, a percentage for the opponent, like showdown"""
+        if self.fainted:
+            return "0 fnt"
+        if viewer == self.side:
+            return f"{self.hp}/{self.stats['hp']}"
+        return f"{max(1, round(100 * self.hp / self.stats['hp']))}/100"
+
+    def boosted(self, stat: str) -> float:
+        stage = self.boosts[stat]
+        return self.stats[stat] * (2 + max(stage, 0)) / (2 - min(stage, 0))
+
+    def request(self) -> dict:
+        return {
+            "ident": self.ident,
+            "details": self.details,
+            "condition": self.condition(self.side),
+            "active": self.active,
+            "stats": {stat: self.stats[stat] for stat in STATS[1:]},
+            "moves": [move.id for move in self.moves],
+            "baseAbility": self.ability,
+            "item": self.item,
+            "pokeball": "pokeball",
+            "ability": self.ability,
+        }
+
+
+class MockBattle:
+    """One singles battle, resolved as soon as both sides have chosen"""
+
+    def __init__(
+        self,
+        server: "MockShowdownServer",
+        room: str,
+        usernames: Tuple[str, str],
+        teams: Tuple[str, str],
+        seed: int,
+    ):
+        self.server = server
+        self.room = room
+        self.usernames = dict(zip(("p1", "p2"), usernames))
+        self.teams = {
+            side: [
+                MockPokemon(side, packed, server.data)
+                for packed in Teambuilder.parse_packed_team(team)
+            ]
+            for side, team in zip(("p1", "p2"), teams)
+        }
+        self.rng = random.Random(seed)
+        self.turn = 0
+        self.rqid = 0
+        self.choices: Dict[str, Optional[str]] = {}
+        self.logs: Dict[str, List[str]] = {"p1": [], "p2": []}
+        self.finished = False
+
+    def active(self, side: str) -> MockPokemon:
+        return next(mon for mon in self.teams[side] if mon.active)
+
+    def _log(self, line: str, hp_of: Optional[MockPokemon] = None):
+        """Same line for both sides, with hp_of's condition filled in per viewer"""
+        for viewer, log in self.logs.items():
+            if hp_of is None:
+                log.append(line)
+            else:
+                log.append(f"{line}|{hp_of.condition(viewer)}")
+
+    async def _flush(self, requests: Optional[Dict[str, dict]] = None):
+        for side, log in self.logs.items():
+            if log:
+                await self.server.send(
+                    self.usernames[side], "\n".join([f">{self.room}"] + log)
+                )
+            log.clear()
+        for side, request in (requests or {}).items():
+            self.rqid += 1
+            request = {**request, "side": self._side_request(side), "rqid": self.rqid}
+            await self.server.send(
+                self.usernames[side],
+                f">{self.room}\n|request|{json.dumps(request)}",
+            )
+
+    def _side_request(self, side: str) -> dict:
+        return {
+            "name": self.usernames[side],
+            "id": side,
+            "pokemon": [mon.request() for mon in self.teams[side]],
+        }
+
+    async def start(self):
+        self._log("|init|battle")
+        self._log(f"|title|{self.usernames['p1']} vs. {self.usernames['p2']}")
+        for side, username in self.usernames.items():
+            self._log(f"|player|{side}|{username}|1|")
+        for side, team in self.teams.items():
+            self._log(f"|teamsize|{side}|{len(team)}")
+        self._log(f"|gen|{self.server.data.gen}")
+        self._log("|clearpoke")
+        for side, team in self.teams.items():
+            for mon in team:
+                self._log(f"|poke|{side}|{mon.details}|")
+        self._log("|teampreview")
+
+        self.choices = {"p1": None, "p2": None}
+        await self._flush({side: {"teamPreview": True} for side in self.teams})
+
+    async def choose(self, username: str, choice: str):
+        side = next(
+            (side for side, name in self.usernames.items() if name == username), None
+        )
+        if self.finished or side is None or side not in self.choices:
+            return
+        self.choices[side] = choice
+        if any(choice is None for choice in self.choices.values()):
+            return
+
+        choices, self.choices = self.choices, {}
+        if self.turn == 0:
+            await self._resolve_team_preview(choices)
+        else:
+            await self._resolve(choices)
+
+    async def _resolve_team_preview(self, choices: Dict[str, str]):
+        for side, choice in choices.items():
+            order = [int(c) - 1 for c in choice.split()[-1] if c.isdigit()]
+            team = self.teams[side]
+            if sorted(order) != list(range(len(team))):
+                order = list(range(len(team)))
+            self.teams[side] = [team[i] for i in order]
+
+        self._log("|")
+        self._log("|start")
+        for side in self.teams:
+            self._switch_in(self.teams[side][0])
+        await self._next_turn()
+
+    def _switch_in(self, mon: MockPokemon):
+        for other in self.teams[mon.side]:
+            if other.active:
+                other.active = False
+                other.boosts = {stat: 0 for stat in BOOSTABLE}
+        mon.active = True
+        self._log(f"|switch|{mon.position}|{mon.details}", hp_of=mon)
+
+    def _parse_choice(self, side: str, choice: str) -> Tuple[str, object]:
+        """("switch", mon) or ("move", move), invalid choices become the default"""
+        active = self.active(side)
+        bench = [mon for mon in self.teams[side] if not mon.active and not mon.fainted]
+        words = choice.replace("/choose", "").split()
+        forced = active.fainted
+
+        if len(words) >= 2 and words[0] == "switch":
+            target = to_id_str(words[1])
+            for i, mon in enumerate(self.teams[side]):
+                if mon in bench and target in (
+                    mon.species,
+                    to_id_str(mon.name),
+                    str(i + 1),
+                ):
+                    return "switch", mon
+        elif len(words) >= 2 and words[0] == "move" and not forced:
+            target = to_id_str(words[1])
+            for i, move in enumerate(active.moves):
+                if target in (move.id, str(i + 1)):
+                    return "move", move
+
+        if forced:
+            return "switch", bench[0]
+        return "move", active.moves[0]
+
+    async def _resolve(self, choices: Dict[str, str]):
+        actions = {
+            side: self._parse_choice(side, choice) for side, choice in choices.items()
+        }
+
+        forced_switch = any(self.active(side).fainted for side in actions)
+        if forced_switch:
+            for side, (_, mon) in actions.items():
+                self._switch_in(mon)
+            await self._next_turn()
+            return
+
+        self._log("|")
+        for side in self._speed_order(
+            [side for side, (kind, _) in actions.items() if kind == "switch"]
+        ):
+            self._switch_in(actions[side][1])
+
+        movers = [side for side, (kind, _) in actions.items() if kind == "move"]
+        movers.sort(
+            key=lambda side: (actions[side][1].priority, self._speed(side)),
+            reverse=True,
+        )
+        for side in movers:
+            attacker = self.active(side)
+            if attacker.fainted:
+                continue
+            self._use_move(attacker, self.active(_foe(side)), actions[side][1])
+
+        await self._end_turn()
+
+    def _speed(self, side: str) -> Tuple[float, float]:
+        # random second key settles speed ties
+        return self.active(side).boosted("spe"), self.rng.random()
+
+    def _speed_order(self, sides: List[str]) -> List[str]:
+        return sorted(sides, key=self._speed, reverse=True)
+
+    def _use_move(self, attacker: MockPokemon, defender: MockPokemon, move: Move):
+        self._log(f"|move|{attacker.position}|{move.entry['name']}|{defender.position}")
+
+        accuracy = move.accuracy
+        if (
+            move.entry.get("target") not in ("self", "allySide")
+            and accuracy is not True
+            and self.rng.random() > accuracy
+        ):
+            self._log(f"|-miss|{attacker.position}|{defender.position}")
+            return
+
+        if move.base_power:
+            self._damage(attacker, defender, move)
+        if move.boosts:
+            target = attacker if move.entry.get("target") == "self" else defender
+            self._boost(target, move.boosts)
+        if move.self_boost:
+            self._boost(attacker, move.self_boost)
+        if move.heal and not attacker.fainted:
+            healed = min(
+                attacker.stats["hp"] - attacker.hp,
+                int(attacker.stats["hp"] * move.heal),
+            )
+            if healed > 0:
+                attacker.hp += healed
+                self._log(f"|-heal|{attacker.position}", hp_of=attacker)
+
+    def _damage(self, attacker: MockPokemon, defender: MockPokemon, move: Move):
+        if defender.fainted:
+            return
+
+        effectiveness = move.type.damage_multiplier(
+            *defender.types[:2] + [None] * (2 - len(defender.types)),
+            type_chart=self.server.data.type_chart,
+        )
+        if effectiveness == 0:
+            self._log(f"|-immune|{defender.position}")
+            return
+
+        physical = move.category.name == "PHYSICAL"
+        attack = attacker.boosted("atk" if physical else "spa")
+        defense = defender.boosted("def" if physical else "spd")
+
+        damage = (2 * attacker.level // 5 + 2) * move.base_power * attack / defense
+        damage = damage / 50 + 2
+        damage *= self.rng.randint(85, 100) / 100
+        if move.type in attacker.types:
+            damage *= 1.5
+        damage = max(1, int(damage * effectiveness))
+
+        if effectiveness > 1:
+            self._log(f"|-supereffective|{defender.position}")
+        elif effectiveness < 1:
+            self._log(f"|-resisted|{defender.position}")
+
+        defender.hp = max(0, defender.hp - damage)
+        self._log(f"|-damage|{defender.position}", hp_of=defender)
+        if defender.fainted:
+            self._log(f"|faint|{defender.position}")
+
+    def _boost(self, mon: MockPokemon, boosts: Dict[str, int]):
+        if mon.fainted:
+            return
+        for stat, amount in boosts.items():
+            before = mon.boosts[stat]
+            mon.boosts[stat] = max(-6, min(6, before + amount))
+            change = mon.boosts[stat] - before
+            kind = "-boost" if amount > 0 else "-unboost"
+            self._log(f"|{kind}|{mon.position}|{stat}|{abs(change)}")
+
+    async def _end_turn(self):
+        self._log("|upkeep")
+
+        alive = {
+            side: [mon for mon in team if not mon.fainted]
+            for side, team in self.teams.items()
+        }
+        if not alive["p1"] or not alive["p2"]:
+            winner = "p1" if alive["p1"] else "p2" if alive["p2"] else None
+            await self._finish(winner)
+            return
+
+        need_switch = [side for side in self.teams if self.active(side).fainted]
+        if need_switch:
+            self.choices = {side: None for side in need_switch}
+            await self._flush(
+                {
+                    side: (
+                        {"forceSwitch": [True]}
+                        if side in need_switch
+                        else {"wait": True}
+                    )
+                    for side in self.teams
+                }
+            )
+            return
+
+        await self._next_turn()
+
+    async def _next_turn(self):
+        if self.turn >= self.server.max_turns:
+            await self._finish(None)
+            return
+
+        self.turn += 1
+        self._log(f"|turn|{self.turn}")
+        self.choices = {side: None for side in self.teams}
+        await self._flush(
+            {
+                side: {
+                    "active": [
+                        {
+                            "moves": [
+                                {
+                                    "move": move.entry["name"],
+                                    "id": move.id,
+                                    "pp": move.max_pp,
+                                    "maxpp": move.max_pp,
+                                    "target": move.entry.get("target", "normal"),
+                                    "disabled": False,
+                                }
+                                for move in self.active(side).moves
+                            ]
+                        }
+                    ]
+                }
+                for side in self.teams
+            }
+        )
+
+    async def _finish(self, winner: Optional[str]):
+        self.finished = True
+        if winner is None:
+            self._log("|tie")
+        else:
+            self._log(f"|win|{self.usernames[winner]}")
+        await self._flush()
+        self.server.battles.pop(self.room, None)
+
+
+def _foe(side: str) -> str:
+    return "p2" if side == "p1" else "p1"
+
+
+class MockShowdownServer:
+    """Accounts, challenges and battle rooms of one server"""
+
+    def __init__(self, seed: int = 0, max_turns: int = DEFAULT_MAX_TURNS):
+        self.data = GenData.from_gen(9)
+        self.seed = seed
+        self.max_turns = max_turns
+        self.connections: Dict[str, ServerConnection] = {}
+        self.teams: Dict[str, Optional[str]] = {}
+        self.challenges: List[Challenge] = []
+        self.battles: Dict[str, MockBattle] = {}
+        self.n_battles = 0
+
+    async def send(self, user_id: str, message: str):
+        connection = self.connections.get(to_id_str(user_id))
+        if connection is not None:
+            try:
+                await connection.send(message)
+            except ConnectionClosed:
+                pass
+
+    async def handler(self, connection: ServerConnection):
+        username: Optional[str] = None
+        await connection.send("|challstr|4|mockchallstr")
+        try:
+            async for message in connection:
+                room, _, text = str(message).partition("|")
+                if text.startswith("/trn "):
+                    username = text[5:].split(",")[0]
+                    self.connections[to_id_str(username)] = connection
+                    await connection.send(f"|updateuser| {username}|1|1|{{}}")
+                elif username is None:
+                    continue
+                elif room:
+                    battle = self.battles.get(room)
+                    if battle is not None and (
+                        text.startswith("/choose") or text.startswith("/team")
+                    ):
+                        await battle.choose(username, text)
+                else:
+                    await self._handle_command(username, text)
+        except ConnectionClosed:
+            pass
+        finally:
+            if (
+                username is not None
+                and self.connections.get(to_id_str(username)) is connection
+            ):
+                del self.connections[to_id_str(username)]
+
+    async def _handle_command(self, username: str, text: str):
+        command, _, argument = text.partition(" ")
+        if command == "/utm":
+            self.teams[username] = None if argument == "null" else argument
+        elif command == "/challenge":
+            challenged, _, battle_format = argument.partition(",")
+            challenged, battle_format = challenged.strip(), battle_format.strip()
+            team = self.teams.get(username)
+            if team is None:
+                await self.send(
+                    username, "|popup|The mock server needs a team for every battle"
+                )
+                return
+            self.challenges.append(
+                Challenge(username, to_id_str(challenged), battle_format, team)
+            )
+            await self.send(
+                challenged,
+                f"|pm| {username}| {challenged}|/challenge {battle_format}|{battle_format}",
+            )
+        elif command == "/accept":
+            challenger = to_id_str(argument)
+            challenge = next(
+                (
+                    c
+                    for c in self.challenges
+                    if to_id_str(c.challenger) == challenger
+                    and c.challenged == to_id_str(username)
+                ),
+                None,
+            )
+            team = self.teams.get(username)
+            if challenge is None or team is None:
+                return
+            self.challenges.remove(challenge)
+            await self._start_battle(challenge, username, team)
+
+    async def _start_battle(self, challenge: Challenge, username: str, team: str):
+        self.n_battles += 1
+        room = f"battle-{challenge.battle_format}-{self.n_battles}"
+        battle = MockBattle(
+            self,
+            room,
+            (challenge.challenger, username),
+            (challenge.team, team),
+            seed=self.seed * 1_000_003 + self.n_battles,
+        )
+        self.battles[room] = battle
+        await battle.start()
+
+
+async def serve_mock_servers(
+    servers: Sequence[MockShowdownServer],
+    ports: Sequence[int],
+    started: Optional[threading.Event] = None,
+):
+    listening = []
+    try:
+        for server, port in zip(servers, ports):
+            listening.append(
+                await serve(server.handler, "localhost", port, max_queue=None)
+            )
+    except OSError:
+        # the ports bound so far are let go, so a retry can have them
+        for server in listening:
+            server.close()
+            await server.wait_closed()
+        raise
+    if started is not None:
+        started.set()
+    await asyncio.gather(*(server.serve_forever() for server in listening))
+
+
+def start_mock_servers(
+    ports: Sequence[int], seed: int = 0, max_turns: int = DEFAULT_MAX_TURNS
+) -> List[MockShowdownServer]:
+    """One independent mock per port, served from a daemon thread, returns once listening"""
+    # separate state per port, shards log in the same usernames on every server
+    servers = [
+        MockShowdownServer(seed=seed + i, max_turns=max_turns)
+        for i in range(len(ports))
+    ]
+    started = threading.Event()
+    failed: List[Exception] = []
+
+    def serve_in_thread():
+        try:
+            asyncio.run(serve_mock_servers(servers, ports, started))
+        except Exception as error:
+            if started.is_set():
+                raise
+            # e.g. a port already in use, the caller would wait forever otherwise
+            failed.append(error)
+            started.set()
+
+    thread = threading.Thread(target=serve_in_thread, daemon=True)
+    thread.start()
+    started.wait()
+    if failed:
+        raise failed[0]
+    return servers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ports", type=int, nargs="*", default=[8000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    args = parser.parse_args()
+
+    servers = [
+        MockShowdownServer(seed=args.seed + i, max_turns=args.max_turns)
+        for i in range(len(args.ports))
+    ]
+    print(f"Mock showdown server listening on {', '.join(map(str, args.ports))}")
+    asyncio.run(serve_mock_servers(servers, args.ports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Player files are imported by path. Under their file name, "rtal831.py", pickle can't
+# import them back, so load_player_module registers them by folder as "players.rtal831",
+# the name a plain import finds from this directory: whatever an agent pickles then
+# unpickles in any process started from here, e.g. in a spawned pool
+
+
+import importlib.util
+import os
+import sys
+from types import ModuleType
+from typing import Optional
+
+
+def player_module_name(module_path: str) -> str:
+    folder, file_name = os.path.split(os.path.abspath(module_path))
+    return f"{os.path.basename(folder)}.{os.path.splitext(file_name)[0]}"
+
+
+def load_player_module(
+    module_path: str, module_name: Optional[str] = None
+) -> ModuleType:
+    """The module at module_path, imported under module_name unless it already is"""
+    module_path = os.path.abspath(module_path)
+    if module_name is None:
+        module_name = player_module_name(module_path)
+    module = sys.modules.get(module_name)
+    if module is not None and getattr(module, "__file__", None) == module_path:
+        return module
+
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Could not load module {module_path}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
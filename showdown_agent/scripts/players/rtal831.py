@@ -1,13 +1,28 @@
+import asyncio
+import importlib
 import math
+import multiprocessing
+import os
+import pickle
 import random
-from typing import Optional
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+import numpy as np
 from poke_env.battle import Battle
 from poke_env.player import Player
 from poke_env.data import GenData
+from poke_env.data.normalize import to_id_str
 from poke_env.battle.move import Move
 from poke_env.battle.pokemon import Pokemon
+from poke_env.battle.pokemon_type import PokemonType
 from poke_env.battle.side_condition import SideCondition
+from poke_env.battle.status import Status
+from poke_env.battle.weather import Weather
+from poke_env.stats import compute_raw_stats
+from poke_env.teambuilder import ConstantTeambuilder
 
 # my ubers team
 team = """
@@ -74,38 +89,1079 @@ IVs: 0 Atk
 - Taunt
 """
 
-class CustomAgent(Player):
-    def __init__(self, *args, **kwargs):
-        super().__init__(team=team, *args, **kwargs)
-        # load gamedata for stats
-        try:
-            self._gen9 = GenData.from_gen(9)
-            self._base_stats = getattr(self._gen9, "base_stats", {}) or {}
-        except Exception:
-            self._gen9 = None
-            self._base_stats = {}
-
-    def _base_stat_fallback(self, poke: Pokemon, stat_name: str) -> int:
-        species = getattr(poke, "species", None)
-        if not species:
-            return 100
-        key = species.lower().replace(" ", "").replace("-", "").replace("'", "")
+# type indices for the numpy damage engine, last index = no second type
+_TYPE_INDEX = {t: i for i, t in enumerate(PokemonType)}
+_NO_TYPE = len(_TYPE_INDEX)
+
+# species rows hold [base stats, estimated lv100 stats] for atk/def/spa/spd/spe
+_STAT_SLOTS = {'atk': 0, 'def': 1, 'spa': 2, 'spd': 3, 'spe': 4}
+
+# set to an .npz path to snapshot the static tables between runs
+DATA_CACHE_ENV = "SHOWDOWN_AGENT_DATA_CACHE"
+
+# seconds per decision for the expectimax search, unset or 0 = greedy scorer only
+SEARCH_BUDGET_ENV = "SHOWDOWN_AGENT_SEARCH_BUDGET"
+
+# seconds per close decision for the monte carlo rollouts, unset or 0 = off
+ROLLOUT_BUDGET_ENV = "SHOWDOWN_AGENT_ROLLOUT_BUDGET"
+
+# processes in the rollout pool, unset or 0 = one per cpu
+ROLLOUT_WORKERS_ENV = "SHOWDOWN_AGENT_ROLLOUT_WORKERS"
+
+# seconds per decision for the endgame solver, unset or 0 = off
+ENDGAME_BUDGET_ENV = "SHOWDOWN_AGENT_ENDGAME_BUDGET"
+
+# threads choose_move scores on, unset or 0 = score on the player's event loop
+DECISION_THREADS_ENV = "SHOWDOWN_AGENT_DECISION_THREADS"
+
+
+class _StaticTables(NamedTuple):
+    species_rows: Dict[str, int]
+    species_stats: np.ndarray
+    type_chart: np.ndarray
+
+
+_static_tables: Optional[_StaticTables] = None
+
+
+def _get_gen_data() -> Optional[GenData]:
+    # poke_env keeps one GenData per gen for the whole process
+    try:
+        return GenData.from_gen(9)
+    except Exception:
+        return None
+
+
+def _build_static_tables() -> _StaticTables:
+    gen_data = _get_gen_data()
+    pokedex = gen_data.pokedex if gen_data else {}
+    type_chart = gen_data.type_chart if gen_data else {}
+
+    rows: Dict[str, int] = {}
+    stats = np.full((len(pokedex), 2, len(_STAT_SLOTS)), 100, dtype=np.int16)
+    for i, (species_id, entry) in enumerate(pokedex.items()):
+        base = entry.get("baseStats", {})
+        for stat_name, slot in _STAT_SLOTS.items():
+            stats[i, 0, slot] = base.get(stat_name, 100)
+        rows[species_id] = i
+    # 31 ivs, 84 evs, neutral nature: floor((2 * base + 31 + 84 / 4) * 100 / 100) + 5
+    stats[:, 1, :] = 2 * stats[:, 0, :] + 31 + 21 + 5
+
+    # [move type, defender type] -> multiplier
+    chart = np.ones((_NO_TYPE + 1, _NO_TYPE + 1))
+    for def_type, row in type_chart.items():
+        for atk_type, mult in row.items():
+            chart[_TYPE_INDEX[PokemonType[atk_type]], _TYPE_INDEX[PokemonType[def_type]]] = mult
+
+    return _StaticTables(rows, stats, chart)
+
+
+def _read_tables_snapshot(path: str) -> Optional[_StaticTables]:
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            species_ids = data["species_ids"].tolist()
+            return _StaticTables(
+                {species_id: i for i, species_id in enumerate(species_ids)},
+                data["species_stats"],
+                data["type_chart"],
+            )
+    except Exception:
+        return None
+
+
+def _write_tables_snapshot(path: str, tables: _StaticTables):
+    species_ids = sorted(tables.species_rows, key=tables.species_rows.get)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez(
+            tmp_path,
+            species_ids=np.array(species_ids),
+            species_stats=tables.species_stats,
+            type_chart=tables.type_chart,
+        )
+        os.replace(tmp_path, path)
+    except Exception:
+        pass
+
+
+def _get_static_tables() -> _StaticTables:
+    # loaded on first use and shared by every agent in the process
+    global _static_tables
+    if _static_tables is None:
+        path = os.environ.get(DATA_CACHE_ENV, "")
+        tables = _read_tables_snapshot(path) if path else None
+        if tables is None:
+            tables = _build_static_tables()
+            if path:
+                _write_tables_snapshot(path, tables)
+        _static_tables = tables
+    return _static_tables
+
+
+def _species_stat(species: Optional[str], stat_name: str, estimated: bool) -> int:
+    if not species:
+        return 100
+    tables = _get_static_tables()
+    row = tables.species_rows.get(to_id_str(species))
+    if row is None:
+        return 100
+    return int(tables.species_stats[row, 1 if estimated else 0, _STAT_SLOTS[stat_name]])
+
+
+# the 16 random damage rolls, 85% to 100%
+_DAMAGE_ROLLS = np.arange(85, 101) / 100
+
+
+# team files the moveset index starts from, the bots' teams next to this folder
+_TEAMS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bots", "teams")
+_RAW_STATS = ('hp', 'atk', 'def', 'spa', 'spd', 'spe')
+
+
+class _SpeciesSets(NamedTuple):
+    # how often each move, item, ability and stat spread was seen on a species
+    moves: Dict[str, int]
+    items: Dict[str, int]
+    abilities: Dict[str, int]
+    stats: Dict[Tuple[int, ...], int]
+
+
+class _MovesetIndex:
+    # species -> likely sets, seeded from known teams and added to after every battle;
+    # entries are replaced rather than changed, so decision threads can read while it's updated
+
+    def __init__(self):
+        self.species: Dict[str, _SpeciesSets] = {}
+        # (species, revealed move ids) -> up to 4 moves to expect
+        self._likely: Dict[Tuple[str, Tuple[str, ...]], List[Move]] = {}
+        self._moves: Dict[str, Move] = {}
+
+    def add(self, species: str, moves, item: str = "", ability: str = "", stats: Optional[Tuple[int, ...]] = None):
+        old = self.species.get(species) or _SpeciesSets({}, {}, {}, {})
+        sets = _SpeciesSets(dict(old.moves), dict(old.items), dict(old.abilities), dict(old.stats))
+        for move_id in moves:
+            sets.moves[move_id] = sets.moves.get(move_id, 0) + 1
+        if item:
+            sets.items[item] = sets.items.get(item, 0) + 1
+        if ability:
+            sets.abilities[ability] = sets.abilities.get(ability, 0) + 1
+        if stats:
+            sets.stats[stats] = sets.stats.get(stats, 0) + 1
+        self.species[species] = sets
+        self._likely = {}
+
+    def add_team(self, team_string: str):
+        data = _get_gen_data()
+        for tb_mon in ConstantTeambuilder(team_string).team:
+            species = to_id_str(tb_mon.species or tb_mon.nickname or "")
+            if not species:
+                continue
+            stats = None
+            try:
+                stats = tuple(compute_raw_stats(
+                    species, tb_mon.evs, tb_mon.ivs, tb_mon.level or 100, (tb_mon.nature or "serious").lower(), data
+                ))
+            except Exception:
+                pass
+            self.add(
+                species, [to_id_str(mv) for mv in tb_mon.moves],
+                to_id_str(tb_mon.item or ""), to_id_str(tb_mon.ability or ""), stats,
+            )
+
+    def observe(self, mon: Pokemon):
+        # what a finished battle revealed, the spread never is
+        item = mon.item if mon.item and mon.item != GenData.UNKNOWN_ITEM else ""
+        self.add(mon.species, list(mon.moves), item, mon.ability or "")
+
+    def _move(self, move_id: str) -> Optional[Move]:
+        move = self._moves.get(move_id)
+        if move is None:
+            try:
+                move = self._moves[move_id] = Move(move_id, gen=9)
+            except Exception:
+                return None
+        return move
+
+    def likely_moves(self, mon: Pokemon) -> List[Move]:
+        # revealed moves, topped up to 4 with the most common others
+        revealed = list(mon.moves.values())
+        if len(revealed) >= 4 or mon.species not in self.species:
+            return revealed
+        key = (mon.species, tuple(mon.moves))
+        likely = self._likely.get(key)
+        if likely is None:
+            counts = self.species[mon.species].moves
+            extra = sorted((m for m in counts if m not in mon.moves), key=counts.get, reverse=True)
+            likely = revealed + [mv for mv in map(self._move, extra[:4 - len(revealed)]) if mv is not None]
+            self._likely[key] = likely
+        return likely
+
+    def likely_item(self, species: str) -> str:
+        items = self.species[species].items if species in self.species else {}
+        return max(items, key=items.get) if items else ""
+
+    def likely_stats(self, species: str) -> Optional[Tuple[int, ...]]:
+        stats = self.species[species].stats if species in self.species else {}
+        return max(stats, key=stats.get) if stats else None
+
+
+_moveset_index: Optional[_MovesetIndex] = None
+
+
+def _get_moveset_index() -> _MovesetIndex:
+    # built on first use from the bots' team files and our own team, shared by every agent in the process
+    global _moveset_index
+    if _moveset_index is None:
+        index = _MovesetIndex()
+        teams = [team]
         try:
-            base = self._base_stats.get(key, None)
-            if base:
-                lookup = {
-                    'atk': ['atk', 'attack'],
-                    'def': ['def', 'defense'],
-                    'spa': ['spa', 'spatk', 'spc'],
-                    'spd': ['spd', 'spdef'],
-                    'spe': ['spe', 'speed'],
-                }
-                for k in lookup[stat_name]:
-                    if k in base:
-                        return int(base[k])
-        except Exception:
+            for team_file in sorted(os.listdir(_TEAMS_FOLDER)):
+                if team_file.endswith(".txt"):
+                    with open(os.path.join(_TEAMS_FOLDER, team_file), "r", encoding="utf-8") as file:
+                        teams.append(file.read())
+        except OSError:
             pass
-        return 100
+        for team_string in teams:
+            try:
+                index.add_team(team_string)
+            except Exception:
+                pass
+        _moveset_index = index
+    return _moveset_index
+
+
+def _stage_multiplier(stage: np.ndarray) -> np.ndarray:
+    return np.where(stage > 0, (2 + stage) / 2, 2 / (2 - np.minimum(stage, 0)))
+
+
+def _batch_damage(
+        attack: np.ndarray,
+        defense: np.ndarray,
+        base_power: np.ndarray,
+        atk_stage: np.ndarray,
+        def_stage: np.ndarray,
+        move_type: np.ndarray,
+        def_type_1: np.ndarray,
+        def_type_2: np.ndarray,
+        physical: np.ndarray,
+        stab: np.ndarray,
+        weather_mult: np.ndarray,
+        item_mult: np.ndarray,
+        orichalcum: np.ndarray,
+        prism_armor: np.ndarray,
+        type_chart: np.ndarray,
+        is_estimate: bool = True,
+        rolls: bool = False,
+) -> np.ndarray:
+    # same formula and multiplier order as CustomAgent._calculate_damage,
+    # rolls = True gives every roll instead, shape (n, 16)
+    level = 100.0
+    attack = attack * _stage_multiplier(atk_stage)
+    defense = defense * _stage_multiplier(def_stage)
+
+    damage = (((2 * level / 5) + 2) * base_power * (attack / defense)) / 50 + 2
+    damage = damage * weather_mult
+    damage = damage * np.where(stab, 1.5, 1.0)
+
+    type_multiplier = type_chart[move_type, def_type_1] * type_chart[move_type, def_type_2]
+    damage = damage * type_multiplier
+
+    damage = damage * item_mult
+    damage = damage * np.where(orichalcum & physical, 1.33, 1.0)
+    damage = damage * np.where(prism_armor & (type_multiplier > 1), 0.75, 1.0)
+
+    if rolls:
+        damage = damage[:, None] * _DAMAGE_ROLLS
+        base_power = base_power[:, None]
+    elif is_estimate:
+        damage = damage * 0.925
+
+    damage = np.where(base_power > 0, damage, 0.0)
+    return np.maximum(0, np.floor(damage)).astype(np.int64)
+
+
+def _ko_chances(rolls: np.ndarray, hp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # chance each row KOs from hp in one hit and in two, every roll equally likely
+    hp = hp[:, None]
+    one_hit = (rolls >= hp).mean(axis=1)
+    two_hits = (rolls[:, :, None] + rolls[:, None, :] >= hp[:, :, None]).mean(axis=(1, 2))
+    return one_hit, two_hits
+
+
+class _DamageRows(NamedTuple):
+    # _batch_damage inputs per (move, attacker, defender), minus weather
+    attack: np.ndarray
+    defense: np.ndarray
+    base_power: np.ndarray
+    atk_stage: np.ndarray
+    def_stage: np.ndarray
+    move_type: np.ndarray
+    def_type_1: np.ndarray
+    def_type_2: np.ndarray
+    physical: np.ndarray
+    stab: np.ndarray
+    item_mult: np.ndarray
+    orichalcum: np.ndarray
+    prism_armor: np.ndarray
+    fire: np.ndarray
+    water: np.ndarray
+
+
+_ROW_DTYPES = (
+    float, float, float, float, float, np.int64, np.int64, np.int64, bool, bool, float, bool, bool, bool, bool
+)
+
+
+def _rows_damage(rows: _DamageRows, sun, rain, is_estimate: bool = True, rolls: bool = False) -> np.ndarray:
+    # sun and rain are bools or per row arrays
+    weather_mult = np.where(
+        sun & rows.fire | rain & rows.water, 1.5,
+        np.where(sun & rows.water | rain & rows.fire, 0.5, 1.0),
+    )
+    return _batch_damage(
+        rows.attack, rows.defense, rows.base_power, rows.atk_stage, rows.def_stage,
+        rows.move_type, rows.def_type_1, rows.def_type_2, rows.physical, rows.stab,
+        weather_mult, rows.item_mult, rows.orichalcum & sun, rows.prism_armor,
+        _get_static_tables().type_chart, is_estimate, rolls,
+    )
+
+
+# simulator codes, 0 = none
+_BRN, _PAR, _PSN, _TOX, _SLP, _FRZ = range(1, 7)
+_SIM_STATUS = {Status.BRN: _BRN, Status.PAR: _PAR, Status.PSN: _PSN, Status.TOX: _TOX, Status.SLP: _SLP, Status.FRZ: _FRZ}
+_STATUS_IMMUNE_TYPES = {
+    _BRN: {PokemonType.FIRE}, _PAR: {PokemonType.ELECTRIC}, _FRZ: {PokemonType.ICE},
+    _PSN: {PokemonType.POISON, PokemonType.STEEL}, _TOX: {PokemonType.POISON, PokemonType.STEEL},
+}
+
+_ROCKS, _SPIKES, _TSPIKES = range(3)
+_SIM_HAZARDS = {SideCondition.STEALTH_ROCK: _ROCKS, SideCondition.SPIKES: _SPIKES, SideCondition.TOXIC_SPIKES: _TSPIKES}
+_HAZARD_CAPS = (1, 3, 2)
+_SPIKES_DAMAGE = (0.0, 1 / 8, 1 / 6, 1 / 4)
+
+_SUN, _RAIN = 1, 2
+_SIM_WEATHER = {Weather.SUNNYDAY: _SUN, Weather.DESOLATELAND: _SUN, Weather.RAINDANCE: _RAIN, Weather.PRIMORDIALSEA: _RAIN}
+_WEATHER_ABILITIES = {'drought': _SUN, 'orichalcumpulse': _SUN, 'drizzle': _RAIN}
+
+# scalar _stage_multiplier for stages -6..6
+_STAGE_MULT = tuple((2 + max(stage, 0)) / (2 - min(stage, 0)) for stage in range(-6, 7))
+
+# sim actions: 0-3 = move slot of the active pokemon, 4+ = switch to team slot (action - 4)
+_SWITCH = 4
+
+_stand_in_moves: Dict[Tuple[str, str], Optional[Move]] = {}
+
+
+def _stand_in_move(type_name: str, category: str) -> Optional[Move]:
+    # plain attack standing in for moves the opponent hasn't revealed
+    key = (type_name, category)
+    if key not in _stand_in_moves:
+        gen_data = _get_gen_data()
+        best_id, best_power = None, 0
+        for move_id, entry in (gen_data.moves if gen_data else {}).items():
+            if (
+                    entry.get("type", "").upper() != type_name
+                    or entry.get("category", "").upper() != category
+                    or entry.get("isNonstandard") or entry.get("priority", 0)
+                    or entry.get("accuracy") not in (True, 100)
+                    or any(k in entry for k in ("recoil", "drain", "self", "selfdestruct", "multihit", "damage"))
+                    or entry.get("flags", {}).get("charge") or entry.get("flags", {}).get("recharge")
+            ):
+                continue
+            power = entry.get("basePower", 0)
+            if best_power < power <= 90:
+                best_id, best_power = move_id, power
+        _stand_in_moves[key] = Move(best_id, gen=9) if best_id else None
+    return _stand_in_moves[key]
+
+
+def _estimated_max_hp(species: Optional[str]) -> float:
+    # 31 ivs, 84 evs, lv100, same spread as the estimated stats
+    gen_data = _get_gen_data()
+    entry = gen_data.pokedex.get(to_id_str(species or ""), {}) if gen_data else {}
+    return float(2 * entry.get("baseStats", {}).get("hp", 100) + 31 + 21 + 110)
+
+
+class _SimMove(NamedTuple):
+    rows: Tuple[int, ...]  # damage row per defender slot, -1 = no damage
+    physical: bool
+    priority: int
+    accuracy: float
+    heal: float
+    drain: float
+    recoil: float
+    self_boosts: Optional[Tuple[int, ...]]
+    target_boosts: Optional[Tuple[int, ...]]
+    status: int
+    secondary_status: int
+    secondary_chance: float
+    hazard: int
+    immune: Tuple[bool, ...]  # per defender slot, move type can't touch it
+
+
+class _SimState:
+    # everything that changes during a battle, one row per side
+    __slots__ = ('hp', 'status', 'boosts', 'active', 'hazards', 'weather', 'weather_turns', 'turn')
+
+    def __init__(self, hp, status, boosts, active, hazards, weather, weather_turns, turn):
+        self.hp = hp  # fraction of max hp, (2, 6)
+        self.status = status  # (2, 6)
+        self.boosts = boosts  # active pokemon's atk/def/spa/spd/spe stages, (2, 5)
+        self.active = active  # team slot, (2,)
+        self.hazards = hazards  # rocks/spikes/toxic spikes layers on each side, (2, 3)
+        self.weather = weather
+        self.weather_turns = weather_turns
+        self.turn = turn
+
+    def clone(self) -> "_SimState":
+        return _SimState(
+            self.hp.copy(), self.status.copy(), self.boosts.copy(), self.active.copy(),
+            self.hazards.copy(), self.weather, self.weather_turns, self.turn,
+        )
+
+    def key(self) -> bytes:
+        # compact hash key, hp rounded to 1/1000
+        return b"".join((
+            np.round(self.hp * 1000).astype(np.int16).tobytes(), self.status.tobytes(),
+            self.boosts.tobytes(), self.active.tobytes(), self.hazards.tobytes(),
+            bytes((self.weather, self.weather_turns)),
+        ))
+
+
+class _BattleSim:
+    # simplified battle built from what we know of a poke_env Battle, side 0 is us
+    # damage comes from _batch_damage; no abilities or items beyond what it models,
+    # plus regenerator, weather setters, life orb, leftovers, black sludge and boots
+
+    def __init__(self, agent: "CustomAgent", battle: Battle):
+        ours = [mon for mon in battle.team.values()][:6]
+        theirs = [mon for mon in battle.opponent_team.values()]
+        seen = {mon.species for mon in theirs}
+        for mon in battle.teampreview_opponent_team:
+            if mon.species not in seen and len(theirs) < 6:
+                theirs.append(mon)
+                seen.add(mon.species)
+        self.mons: Tuple[List[Pokemon], List[Pokemon]] = (ours, theirs)
+        self.size = (len(ours), len(theirs))
+
+        self.max_hp = np.ones((2, 6))
+        self.speed = np.ones((2, 6))
+        self.rock_damage = np.zeros((2, 6))
+        self.grounded = np.zeros((2, 6), dtype=bool)
+        self.absorbs_tspikes = np.zeros((2, 6), dtype=bool)
+        self.items: Tuple[List[str], List[str]] = ([], [])
+        self.abilities: Tuple[List[str], List[str]] = ([], [])
+        self.types: Tuple[List[frozenset], List[frozenset]] = ([], [])
+        type_chart = _get_static_tables().type_chart
+        rock = _TYPE_INDEX[PokemonType.ROCK]
+
+        for side, mons in enumerate(self.mons):
+            for i, mon in enumerate(mons):
+                if side == 0:
+                    self.max_hp[side, i] = mon.max_hp or 1
+                else:
+                    stats = _get_moveset_index().likely_stats(mon.species)
+                    self.max_hp[side, i] = stats[0] if stats else _estimated_max_hp(mon.species)
+                self.speed[side, i] = agent._get_stat_safe(mon, 'spe')
+                item = agent._item(mon).lower()
+                ability = (getattr(mon, "ability", "") or "").lower()
+                self.items[side].append(item)
+                self.abilities[side].append(ability)
+                if item == 'choicescarf':
+                    self.speed[side, i] *= 1.5
+                types = [t for t in mon.types if t in _TYPE_INDEX]
+                self.types[side].append(frozenset(types))
+                if item != 'heavydutyboots':
+                    self.rock_damage[side, i] = np.prod([type_chart[rock, _TYPE_INDEX[t]] for t in types]) / 8
+                self.grounded[side, i] = PokemonType.FLYING not in types and ability != 'levitate'
+                self.absorbs_tspikes[side, i] = PokemonType.POISON in types
+
+        # every damaging move of each side against every pokemon on the other
+        entries: List[Tuple[Move, Pokemon, Pokemon]] = []
+        move_lists: Tuple[List[List[Move]], List[List[Move]]] = ([], [])
+        for side, mons in enumerate(self.mons):
+            for mon in mons:
+                if side == 0 and mon is battle.active_pokemon and battle.available_moves:
+                    moves = list(battle.available_moves)
+                elif side == 1:
+                    moves = agent._opponent_moves(mon)[:4]
+                else:
+                    moves = list(mon.moves.values())[:4]
+                if side == 1 and not any(getattr(mv, "base_power", 0) for mv in moves):
+                    physical = agent._get_stat_safe(mon, 'atk') >= agent._get_stat_safe(mon, 'spa')
+                    stand_in = _stand_in_move(mon.type_1.name, 'PHYSICAL' if physical else 'SPECIAL')
+                    if stand_in is not None:
+                        moves.append(stand_in)
+                move_lists[side].append(moves)
+
+        self.moves: Tuple[List[List[_SimMove]], List[List[_SimMove]]] = ([], [])
+        for side, mons in enumerate(self.mons):
+            foes = self.mons[1 - side]
+            for mon, moves in zip(mons, move_lists[side]):
+                sim_moves = []
+                for mv in moves:
+                    rows = []
+                    for foe in foes:
+                        if getattr(mv, "base_power", 0) > 0 and mv.category.name != 'STATUS':
+                            rows.append(len(entries))
+                            entries.append((mv, mon, foe))
+                        else:
+                            rows.append(-1)
+                    sim_moves.append(self._sim_move(mv, tuple(rows), foes))
+                self.moves[side].append(sim_moves)
+
+        # stages are overwritten every step, the rest of each row is fixed
+        self.rows = agent._encode_damage_rows(entries)
+        # (row, atk stage, def stage, weather, burned, estimate) -> damage
+        self.damage_memo: Dict[tuple, int] = {}
+
+        # fraction of the defender's hp each move takes at neutral stages, [side][mon][move][foe]
+        neutral = _rows_damage(self.rows, False, False) if entries else np.zeros(0)
+        self.threat: Tuple[List[List[Tuple[float, ...]]], List[List[Tuple[float, ...]]]] = ([], [])
+        for side in (0, 1):
+            for sim_moves in self.moves[side]:
+                self.threat[side].append([
+                    tuple(
+                        neutral[row] / self.max_hp[1 - side, k] if row >= 0 else 0.0
+                        for k, row in enumerate(mv.rows)
+                    )
+                    for mv in sim_moves
+                ])
+        self.root_orders: Dict[int, object] = {}
+        for j, mv in enumerate(move_lists[0][ours.index(battle.active_pokemon)] if battle.active_pokemon in ours else []):
+            self.root_orders[j] = mv
+        for mon in battle.available_switches:
+            if mon in ours:
+                self.root_orders[_SWITCH + ours.index(mon)] = mon
+
+    def __getstate__(self):
+        # rollout workers only need the arrays, not the poke_env objects
+        state = self.__dict__.copy()
+        state['mons'] = None
+        state['root_orders'] = {}
+        return state
+
+    @staticmethod
+    def _boost_tuple(boosts: Optional[Dict[str, int]]) -> Optional[Tuple[int, ...]]:
+        if not boosts:
+            return None
+        values = tuple(boosts.get(stat, 0) for stat in _STAT_SLOTS)
+        return values if any(values) else None
+
+    def _sim_move(self, mv: Move, rows: Tuple[int, ...], foes: List[Pokemon]) -> _SimMove:
+        target = mv.entry.get("target", "normal")
+        self_target = target in ('self', 'allySide', 'allyTeam', 'adjacentAllyOrSelf')
+        heal = getattr(mv, "heal", 0) or 0
+        if mv.id in ('morningsun', 'moonlight', 'synthesis'):
+            heal = 0.5
+
+        secondary_status, secondary_chance = 0, 0.0
+        for effect in getattr(mv, "secondary", None) or []:
+            if effect.get("status"):
+                secondary_status = _SIM_STATUS.get(Status[effect["status"].upper()], 0)
+                secondary_chance = effect.get("chance", 100) / 100
+                break
+
+        immune = []
+        type_chart = _get_static_tables().type_chart
+        for foe in foes:
+            mult = 1.0
+            if mv.type in _TYPE_INDEX:
+                for t in foe.types:
+                    if t in _TYPE_INDEX:
+                        mult *= type_chart[_TYPE_INDEX[mv.type], _TYPE_INDEX[t]]
+            immune.append(mult == 0 and not self_target)
+
+        side_condition = getattr(mv, "side_condition", None)
+        return _SimMove(
+            rows=rows,
+            physical=mv.category.name == 'PHYSICAL',
+            priority=getattr(mv, "priority", 0) or 0,
+            accuracy=1.0 if mv.accuracy is True or self_target else float(mv.accuracy),
+            heal=heal,
+            drain=getattr(mv, "drain", 0) or 0,
+            recoil=getattr(mv, "recoil", 0) or 0,
+            self_boosts=self._boost_tuple(getattr(mv, "self_boost", None) or (mv.boosts if self_target else None)),
+            target_boosts=None if self_target else self._boost_tuple(mv.boosts),
+            status=_SIM_STATUS.get(mv.status, 0) if mv.status else 0,
+            secondary_status=secondary_status,
+            secondary_chance=secondary_chance,
+            hazard=_SIM_HAZARDS.get(side_condition, -1) if side_condition else -1,
+            immune=tuple(immune),
+        )
+
+    def initial_state(self, battle: Battle) -> _SimState:
+        hp = np.zeros((2, 6))
+        status = np.zeros((2, 6), dtype=np.int8)
+        boosts = np.zeros((2, 5), dtype=np.int8)
+        active = np.zeros(2, dtype=np.int8)
+        hazards = np.zeros((2, 3), dtype=np.int8)
+
+        actives = (battle.active_pokemon, battle.opponent_active_pokemon)
+        conditions = (battle.side_conditions, battle.opponent_side_conditions)
+        for side, mons in enumerate(self.mons):
+            for i, mon in enumerate(mons):
+                hp[side, i] = 0.0 if mon.fainted else (mon.current_hp_fraction or 0.0)
+                status[side, i] = _SIM_STATUS.get(mon.status, 0) if mon.status else 0
+                if mon is actives[side]:
+                    active[side] = i
+                    boosts[side] = [mon.boosts.get(stat, 0) for stat in _STAT_SLOTS]
+            for condition, layers in conditions[side].items():
+                if condition in _SIM_HAZARDS:
+                    slot = _SIM_HAZARDS[condition]
+                    hazards[side, slot] = min(_HAZARD_CAPS[slot], max(1, layers))
+
+        weather, weather_turns = 0, 0
+        for w, start in (battle.weather or {}).items():
+            weather = _SIM_WEATHER.get(w, 0)
+            weather_turns = max(1, 5 - (battle.turn - start)) if weather else 0
+
+        return _SimState(hp, status, boosts, active, hazards, weather, weather_turns, battle.turn)
+
+    def winner(self, state: _SimState) -> Optional[int]:
+        # 0 = we won, 1 = they did, None = still going
+        if not (state.hp[1] > 0).any():
+            return 0
+        if not (state.hp[0] > 0).any():
+            return 1
+        return None
+
+    def legal_actions(self, state: _SimState, side: int) -> List[Optional[int]]:
+        # None = nothing to do this step, the other side is replacing a fainted pokemon
+        active = state.active[side]
+        bench = [_SWITCH + i for i in range(self.size[side]) if i != active and state.hp[side, i] > 0]
+        if state.hp[side, active] <= 0:
+            return bench or [None]
+        if state.hp[1 - side, state.active[1 - side]] <= 0:
+            return [None]
+        return list(range(len(self.moves[side][active]))) + bench
+
+    def step(
+            self, state: _SimState, actions: Tuple[Optional[int], Optional[int]], rng: Optional[random.Random] = None
+    ) -> _SimState:
+        # rng = None plays the expected line: average rolls, no misses, no status luck
+        state = state.clone()
+        replacing = any(state.hp[side, state.active[side]] <= 0 for side in (0, 1))
+
+        switches = [side for side in (0, 1) if actions[side] is not None and actions[side] >= _SWITCH]
+        for side in sorted(switches, key=lambda side: -self._speed(state, side)):
+            self._switch(state, side, actions[side] - _SWITCH)
+        if replacing:
+            return state
+
+        state.turn += 1
+        movers = [side for side in (0, 1) if actions[side] is not None and actions[side] < _SWITCH]
+        movers.sort(key=lambda side: (
+            -self.moves[side][state.active[side]][actions[side]].priority,
+            -self._speed(state, side),
+            rng.random() if rng else side,
+        ))
+        for side in movers:
+            if state.hp[side, state.active[side]] > 0:
+                self._use_move(state, side, self.moves[side][state.active[side]][actions[side]], rng)
+
+        self._end_of_turn(state)
+        return state
+
+    def _speed(self, state: _SimState, side: int) -> float:
+        active = state.active[side]
+        speed = self.speed[side, active] * _STAGE_MULT[state.boosts[side, 4] + 6]
+        return speed * 0.5 if state.status[side, active] == _PAR else speed
+
+    def _switch(self, state: _SimState, side: int, slot: int):
+        leaving = state.active[side]
+        if state.hp[side, leaving] > 0 and self.abilities[side][leaving] == 'regenerator':
+            state.hp[side, leaving] = min(1.0, state.hp[side, leaving] + 1 / 3)
+        state.active[side] = slot
+        state.boosts[side] = 0
+
+        hazards = state.hazards[side]
+        state.hp[side, slot] -= hazards[_ROCKS] * self.rock_damage[side, slot]
+        if self.grounded[side, slot] and self.items[side][slot] != 'heavydutyboots':
+            state.hp[side, slot] -= _SPIKES_DAMAGE[hazards[_SPIKES]]
+            if hazards[_TSPIKES]:
+                if self.absorbs_tspikes[side, slot]:
+                    hazards[_TSPIKES] = 0
+                else:
+                    self._inflict(state, side, slot, _TOX if hazards[_TSPIKES] > 1 else _PSN)
+        state.hp[side, slot] = max(0.0, state.hp[side, slot])
+
+        weather = _WEATHER_ABILITIES.get(self.abilities[side][slot], 0)
+        if weather and state.hp[side, slot] > 0:
+            state.weather, state.weather_turns = weather, 5
+
+    def _inflict(self, state: _SimState, side: int, slot: int, status: int):
+        if state.status[side, slot] or state.hp[side, slot] <= 0:
+            return
+        if _STATUS_IMMUNE_TYPES.get(status, set()).intersection(self.types[side][slot]):
+            return
+        state.status[side, slot] = status
+
+    def _damage(self, state: _SimState, side: int, row: int, physical: bool, rng: Optional[random.Random]) -> int:
+        atk_slot, def_slot = (0, 1) if physical else (2, 3)
+        atk_stage, def_stage = int(state.boosts[side, atk_slot]), int(state.boosts[1 - side, def_slot])
+        burned = physical and state.status[side, state.active[side]] == _BRN
+        # a one row numpy pass costs far more than the lookup, and searches revisit the same few
+        key = (row, atk_stage, def_stage, state.weather, burned, rng is None)
+        damage = self.damage_memo.get(key)
+        if damage is None:
+            rows = _DamageRows(*(column[row:row + 1] for column in self.rows))
+            rows = rows._replace(
+                atk_stage=np.array([atk_stage]),
+                def_stage=np.array([def_stage]),
+                item_mult=rows.item_mult * 0.5 if burned else rows.item_mult,
+            )
+            damage = int(_rows_damage(rows, state.weather == _SUN, state.weather == _RAIN, is_estimate=rng is None)[0])
+            self.damage_memo[key] = damage
+        if rng is not None:
+            damage = int(damage * rng.randint(85, 100) / 100)
+        return damage
+
+    def _use_move(self, state: _SimState, side: int, move: _SimMove, rng: Optional[random.Random]):
+        attacker, defender = state.active[side], state.active[1 - side]
+        foe = 1 - side
+
+        status = state.status[side, attacker]
+        if status in (_SLP, _FRZ):
+            if rng is None or rng.random() >= (1 / 3 if status == _SLP else 0.2):
+                return
+            state.status[side, attacker] = 0
+        if status == _PAR and rng is not None and rng.random() < 0.25:
+            return
+        if rng is not None and move.accuracy < 1 and rng.random() > move.accuracy:
+            return
+
+        dealt = 0.0
+        row = move.rows[defender] if defender < len(move.rows) else -1
+        if row >= 0 and state.hp[foe, defender] > 0:
+            damage = self._damage(state, side, row, move.physical, rng)
+            dealt = min(state.hp[foe, defender], damage / self.max_hp[foe, defender])
+            state.hp[foe, defender] -= dealt
+            # back to the attacker's own hp scale
+            dealt_hp = dealt * self.max_hp[foe, defender] / self.max_hp[side, attacker]
+            state.hp[side, attacker] += dealt_hp * move.drain - dealt_hp * move.recoil
+            if dealt > 0 and self.items[side][attacker] == 'lifeorb':
+                state.hp[side, attacker] -= 0.1
+            state.hp[side, attacker] = min(1.0, max(0.0, state.hp[side, attacker]))
+
+        if move.heal and state.hp[side, attacker] > 0:
+            state.hp[side, attacker] = min(1.0, state.hp[side, attacker] + move.heal)
+        if move.self_boosts and state.hp[side, attacker] > 0:
+            state.boosts[side] = np.clip(state.boosts[side] + move.self_boosts, -6, 6)
+
+        immune = defender < len(move.immune) and move.immune[defender]
+        if state.hp[foe, defender] > 0 and not immune:
+            if move.target_boosts:
+                state.boosts[foe] = np.clip(state.boosts[foe] + move.target_boosts, -6, 6)
+            if move.status:
+                self._inflict(state, foe, defender, move.status)
+            elif move.secondary_status and dealt > 0 and rng is not None and rng.random() < move.secondary_chance:
+                self._inflict(state, foe, defender, move.secondary_status)
+
+        if move.hazard >= 0:
+            state.hazards[foe, move.hazard] = min(_HAZARD_CAPS[move.hazard], state.hazards[foe, move.hazard] + 1)
+
+    def _end_of_turn(self, state: _SimState):
+        for side in (0, 1):
+            active = state.active[side]
+            if state.hp[side, active] <= 0:
+                continue
+            status = state.status[side, active]
+            if status == _BRN:
+                state.hp[side, active] -= 1 / 16
+            elif status in (_PSN, _TOX):
+                state.hp[side, active] -= 1 / 8
+            item = self.items[side][active]
+            if item == 'leftovers' or item == 'blacksludge' and PokemonType.POISON in self.types[side][active]:
+                state.hp[side, active] += 1 / 16
+            state.hp[side, active] = min(1.0, max(0.0, state.hp[side, active]))
+
+        if state.weather_turns:
+            state.weather_turns -= 1
+            if not state.weather_turns:
+                state.weather = 0
+
+    def hp_balance(self, state: _SimState) -> float:
+        # remaining hp ours minus theirs, in pokemon
+        return float(state.hp[0].sum() - state.hp[1].sum())
+
+
+# expectimax search settings
+_MAX_SEARCH_DEPTH = 3
+_MAX_REPLIES = 3  # opponent replies expanded per node, most likely first
+_MAX_INNER_ACTIONS = 4  # our actions expanded below the root
+_HEURISTIC_WEIGHT = 1e-4  # root heuristic score as a tie breaker, 1200 (a KO) ~ 0.12 hp
+_WEIGHT_MARGIN = 1.01  # keeps depth 1's best action ahead through float rounding
+_WIN_VALUE = 100.0
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class _Expectimax:
+    # depth limited expectimax over _BattleSim turns, each turn is one ply:
+    # we maximise, the opponent's replies are a chance node weighted by how hard they hit
+
+    def __init__(self, sim: _BattleSim, deadline: float):
+        self.sim = sim
+        self.deadline = deadline
+        # (state key, depth) -> value, kept across deepening iterations
+        self.table: Dict[Tuple[bytes, int], float] = {}
+        self.nodes = 0
+
+    def evaluate(self, state: _SimState) -> float:
+        winner = self.sim.winner(state)
+        if winner is not None:
+            return _WIN_VALUE if winner == 0 else -_WIN_VALUE
+        alive = (state.hp > 0).sum(axis=1)
+        boosts = state.boosts.sum(axis=1)
+        return self.sim.hp_balance(state) + 0.3 * float(alive[0] - alive[1]) + 0.05 * float(boosts[0] - boosts[1])
+
+    def _hits(self, state: _SimState, side: int, action: Optional[int]) -> float:
+        # share of the foe's remaining hp this move takes, 0 for switches
+        if action is None or action >= _SWITCH:
+            return 0.0
+        foe = state.active[1 - side]
+        return min(self.sim.threat[side][state.active[side]][action][foe], state.hp[1 - side, foe])
+
+    def our_actions(self, state: _SimState) -> List[Optional[int]]:
+        actions = self.sim.legal_actions(state, 0)
+        actions.sort(key=lambda a: self._hits(state, 0, a), reverse=True)
+        return actions[:_MAX_INNER_ACTIONS]
+
+    def replies(self, state: _SimState, side: int = 1) -> List[Tuple[Optional[int], float]]:
+        weights = [(a, 0.1 + self._hits(state, side, a)) for a in self.sim.legal_actions(state, side)]
+        weights.sort(key=lambda item: item[1], reverse=True)
+        weights = weights[:_MAX_REPLIES]
+        total = sum(w for _, w in weights)
+        return [(a, w / total) for a, w in weights]
+
+    def value(self, state: _SimState, depth: int) -> float:
+        if depth == 0 or self.sim.winner(state) is not None:
+            return self.evaluate(state)
+        key = (state.key(), depth)
+        cached = self.table.get(key)
+        if cached is not None:
+            return cached
+        value = max(self.action_values(state, depth, self.our_actions(state)).values())
+        self.table[key] = value
+        return value
+
+    def action_values(
+            self, state: _SimState, depth: int, actions: List[Optional[int]]
+    ) -> Dict[Optional[int], float]:
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+
+        # replacing a fainted pokemon doesn't use up a ply
+        replacing = any(state.hp[side, state.active[side]] <= 0 for side in (0, 1))
+        next_depth = depth if replacing else depth - 1
+        replies = self.replies(state)
+        return {
+            action: sum(p * self.value(self.sim.step(state, (action, reply)), next_depth) for reply, p in replies)
+            for action in actions
+        }
+
+
+# endgame solver settings
+_ENDGAME_MONS = 2  # solve once neither side has more than this many left
+_MAX_ENDGAME_TURNS = 8
+_FICTITIOUS_PLAY_ROUNDS = 64
+
+
+def _solve_two_row_game(payoff: np.ndarray) -> Tuple[float, np.ndarray]:
+    # best mix p of the two rows maximises the lower envelope, which peaks at an end or a crossing
+    top, bottom = payoff
+    candidates = [0.0, 1.0]
+    for j in range(payoff.shape[1]):
+        for k in range(j + 1, payoff.shape[1]):
+            slope = (top[j] - bottom[j]) - (top[k] - bottom[k])
+            if slope:
+                p = (bottom[k] - bottom[j]) / slope
+                if 0 < p < 1:
+                    candidates.append(p)
+    values = [float((p * top + (1 - p) * bottom).min()) for p in candidates]
+    best = int(np.argmax(values))
+    return values[best], np.array([candidates[best], 1 - candidates[best]])
+
+
+def _solve_matrix_game(payoff: np.ndarray) -> Tuple[float, np.ndarray]:
+    # value and our mixed strategy of a zero sum turn, rows are ours, exact for saddle points
+    # and two row games, fictitious play beyond that
+    lower = payoff.min(axis=1)
+    best_row = int(lower.argmax())
+    if lower[best_row] >= payoff.max(axis=0).min() - 1e-9:
+        strategy = np.zeros(len(payoff))
+        strategy[best_row] = 1.0
+        return float(lower[best_row]), strategy
+    if len(payoff) == 2:
+        return _solve_two_row_game(payoff)
+
+    plays = np.zeros(len(payoff))
+    row_totals = np.zeros(len(payoff))
+    col_totals = np.zeros(payoff.shape[1])
+    row = best_row
+    for _ in range(_FICTITIOUS_PLAY_ROUNDS):
+        plays[row] += 1
+        col_totals += payoff[row]
+        row_totals += payoff[:, int(col_totals.argmin())]
+        row = int(row_totals.argmax())
+    strategy = plays / plays.sum()
+    # what the mix guarantees against their best reply
+    value = float((strategy @ payoff).min())
+
+    # settled on two rows, which can be solved exactly
+    support = np.flatnonzero(plays)
+    if len(support) == 2:
+        two_row_value, mix = _solve_two_row_game(payoff[support])
+        if two_row_value >= value:
+            strategy = np.zeros(len(payoff))
+            strategy[support] = mix
+            value = two_row_value
+    return value, strategy
+
+
+class _EndgameSolver:
+    # simultaneous move minimax over _BattleSim's expected line, each turn is a matrix game
+    # solved for both sides' mixes, values memoized by (state key, turns left)
+
+    def __init__(self, sim: _BattleSim, deadline: float):
+        self.sim = sim
+        self.deadline = deadline
+        self.evaluator = _Expectimax(sim, deadline)
+        # (state key, turns) -> (value, exact), exact = no line was cut off by the turn limit
+        self.table: Dict[Tuple[bytes, int], Tuple[float, bool]] = {}
+
+    def value(self, state: _SimState, turns: int) -> Tuple[float, bool]:
+        if self.sim.winner(state) is not None:
+            return self.evaluator.evaluate(state), True
+        if turns == 0:
+            return self.evaluator.evaluate(state), False
+        key = (state.key(), turns)
+        cached = self.table.get(key)
+        if cached is None:
+            value, _, _, exact = self.solve(state, turns)
+            cached = self.table[key] = (value, exact)
+        return cached
+
+    def solve(self, state: _SimState, turns: int) -> Tuple[float, np.ndarray, List[Optional[int]], bool]:
+        if time.perf_counter() > self.deadline:
+            raise _SearchTimeout()
+
+        ours = self.sim.legal_actions(state, 0)
+        theirs = self.sim.legal_actions(state, 1)
+        # replacing a fainted pokemon doesn't use up a turn
+        replacing = any(state.hp[side, state.active[side]] <= 0 for side in (0, 1))
+        next_turns = turns if replacing else turns - 1
+
+        payoff = np.zeros((len(ours), len(theirs)))
+        exact = True
+        for i, a in enumerate(ours):
+            for j, b in enumerate(theirs):
+                payoff[i, j], leaf_exact = self.value(self.sim.step(state, (a, b)), next_turns)
+                exact = exact and leaf_exact
+        value, strategy = _solve_matrix_game(payoff)
+        return value, strategy, ours, exact
+
+
+# monte carlo rollout settings
+_ROLLOUT_MARGIN = 50.0  # heuristic scores this close to the best are worth sampling
+_MAX_ROLLOUT_ACTIONS = 4
+_ROLLOUT_HORIZON = 4  # turns played out, the candidate action included
+_ROLLOUT_BATCH = 16  # rollouts per pool task
+_MIN_ROLLOUTS = 32  # per candidate, fewer falls back to the heuristic
+
+_rollout_pool: Optional[ProcessPoolExecutor] = None
+_rollout_workers = 0
+
+# worker side, the last decision's unpickled sim, reused by its other batches
+_worker_rollout: Tuple[bytes, Optional[Tuple[_BattleSim, _SimState]]] = (b"", None)
+
+
+def _get_rollout_pool() -> Tuple[ProcessPoolExecutor, int]:
+    # one pool per process for every agent, spawn like the tournament workers since poke_env's loop thread can't be forked
+    global _rollout_pool, _rollout_workers
+    if _rollout_pool is None:
+        _rollout_workers = int(os.environ.get(ROLLOUT_WORKERS_ENV, "") or 0) or os.cpu_count() or 1
+        # sims and batches are pickled by this module's name, so each worker imports it by that name first
+        _rollout_pool = ProcessPoolExecutor(
+                max_workers=_rollout_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=importlib.import_module,
+                initargs=(__name__,))
+        # a sharded tournament worker joins its children before atexit would shut the pool down,
+        # and the pool has to go before its queues close at exitpriority 10
+        Finalize(None, _rollout_pool.shutdown, exitpriority=20)
+        # start every worker now, a cold one takes a second or two to import
+        for _ in range(_rollout_workers):
+            _rollout_pool.submit(int)
+    return _rollout_pool, _rollout_workers
+
+
+def _rollout_batch(payload: bytes, action: int, n: int, seed: int) -> Tuple[int, float, int]:
+    # n random playouts after action: rolled damage, misses, speed ties, both sides picking by threat
+    global _worker_rollout
+    if _worker_rollout[0] != payload:
+        _worker_rollout = (payload, pickle.loads(payload))
+    sim, root = _worker_rollout[1]
+    policy = _Expectimax(sim, math.inf)
+    rng = random.Random(seed)
+
+    total = 0.0
+    for _ in range(n):
+        state, turns, first = root, 0, action
+        while turns < _ROLLOUT_HORIZON and sim.winner(state) is None:
+            ours = first
+            if ours is None:
+                ours = _sample(policy.replies(state, 0), rng)
+            theirs = _sample(policy.replies(state, 1), rng)
+            replacing = any(state.hp[side, state.active[side]] <= 0 for side in (0, 1))
+            state = sim.step(state, (ours, theirs), rng)
+            first = None
+            if not replacing:
+                turns += 1
+        total += policy.evaluate(state)
+    return action, total, n
+
+
+def _sample(weighted: List[Tuple[Optional[int], float]], rng: random.Random) -> Optional[int]:
+    actions = [a for a, _ in weighted]
+    return rng.choices(actions, weights=[w for _, w in weighted])[0]
+
+
+class CustomAgent(Player):
+    def __init__(
+            self, *args, search_budget: Optional[float] = None, rollout_budget: Optional[float] = None,
+            decision_threads: Optional[int] = None, endgame_budget: Optional[float] = None, **kwargs
+    ):
+        super().__init__(team=team, *args, **kwargs)
+        if search_budget is None:
+            search_budget = float(os.environ.get(SEARCH_BUDGET_ENV, "") or 0)
+        self._search_budget = search_budget
+        if rollout_budget is None:
+            rollout_budget = float(os.environ.get(ROLLOUT_BUDGET_ENV, "") or 0)
+        self._rollout_budget = rollout_budget
+        if rollout_budget > 0:
+            _get_rollout_pool()
+        if endgame_budget is None:
+            endgame_budget = float(os.environ.get(ENDGAME_BUDGET_ENV, "") or 0)
+        self._endgame_budget = endgame_budget
+        _get_moveset_index()
+        if decision_threads is None:
+            decision_threads = int(os.environ.get(DECISION_THREADS_ENV, "") or 0)
+        # threads rather than processes, a live Battle can't be pickled
+        self._decision_executor = None
+        if decision_threads > 0:
+            self._decision_executor = ThreadPoolExecutor(decision_threads, thread_name_prefix=f"{self.username}-decide")
+        # battle_tag -> (turn stamp, damage matrix, (one hit, two hit) KO chances)
+        self._damage_matrices: Dict[str, Tuple[
+            tuple, Dict[Tuple[int, str, int], int], Dict[Tuple[int, str, int], Tuple[float, float]]
+        ]] = {}
+
+    def _base_stat_fallback(self, poke: Pokemon, stat_name: str, estimated: bool = False) -> int:
+        return _species_stat(getattr(poke, "species", None), stat_name, estimated)
 
     def _get_stat_safe(self, poke: Pokemon, stat_key: str) -> float:
         val = None
@@ -115,10 +1171,24 @@ class CustomAgent(Player):
             val = None
 
         if val is None:
-            # use base stats if unknown
-            return float(self._base_stat_fallback(poke, stat_key))
+            # the most common known spread, else estimate lv100 stats from base stats
+            stats = _get_moveset_index().likely_stats(getattr(poke, "species", None))
+            if stats is not None:
+                return float(stats[_RAW_STATS.index(stat_key)])
+            return float(self._base_stat_fallback(poke, stat_key, estimated=True))
         return float(val)
 
+    def _item(self, poke: Pokemon) -> str:
+        # unrevealed items are guessed from the moveset index
+        item = getattr(poke, "item", "") or ""
+        if item == GenData.UNKNOWN_ITEM:
+            return _get_moveset_index().likely_item(poke.species)
+        return item
+
+    def _opponent_moves(self, poke: Pokemon) -> List[Move]:
+        # revealed moves first, the rest of a likely set from the moveset index
+        return _get_moveset_index().likely_moves(poke)
+
     def _calculate_damage(
             self, move: Move, attacker: Pokemon, defender: Pokemon, battle: Battle, is_estimate: bool = True
     ) -> int:
@@ -162,8 +1232,8 @@ class CustomAgent(Player):
         damage = (((2 * level / 5) + 2) * base_power * (attack_stat / defense_stat)) / 50 + 2
 
         # weather
+        weather = "".join(w.name for w in (battle.weather or {}))
         try:
-            weather = battle.weather or ""
             if 'SUNNYDAY' in weather and move.type.name == 'FIRE':
                 damage *= 1.5
             elif 'SUNNYDAY' in weather and move.type.name == 'WATER':
@@ -197,7 +1267,7 @@ class CustomAgent(Player):
             pass
 
         # items
-        item = getattr(attacker, "item", "") or ""
+        item = self._item(attacker)
         try:
             if item.lower() == 'choiceband' and move.category.name == 'PHYSICAL':
                 damage *= 1.5
@@ -212,7 +1282,7 @@ class CustomAgent(Player):
 
         # abilities
         try:
-            if attacker.ability == 'orichalcumpulse' and 'SUNNYDAY' in (battle.weather or "") and move.category.name == 'PHYSICAL':
+            if attacker.ability == 'orichalcumpulse' and 'SUNNYDAY' in weather and move.category.name == 'PHYSICAL':
                 damage *= 1.33
             if defender.ability == 'prismarmor' and type_multiplier > 1:
                 damage *= 0.75
@@ -228,6 +1298,196 @@ class CustomAgent(Player):
         except Exception:
             return 0
 
+    def _encode_damage_rows(self, entries: List[Tuple[Move, Pokemon, Pokemon]]) -> _DamageRows:
+        # encode (move, attacker, defender) rows for _batch_damage, weather applied later;
+        # every move and pokemon is looked up once, the rows are gathered as tuples
+        moves: Dict[int, tuple] = {}
+        mons: Dict[int, tuple] = {}
+        stats: Dict[Tuple[int, str], float] = {}
+
+        def move_info(move: Move) -> tuple:
+            info = moves.get(id(move))
+            if info is None:
+                category = move.category.name
+                if not move.base_power or category not in ('PHYSICAL', 'SPECIAL'):
+                    info = ()
+                else:
+                    move_type = move.type
+                    # ??? and stellar are always neutral
+                    neutral = move_type in (PokemonType.THREE_QUESTION_MARKS, PokemonType.STELLAR)
+                    info = (move.base_power, category == 'PHYSICAL', move_type.name,
+                            _NO_TYPE if neutral else _TYPE_INDEX[move_type])
+                moves[id(move)] = info
+            return info
+
+        def mon_info(mon: Pokemon) -> tuple:
+            info = mons.get(id(mon))
+            if info is None:
+                type_1, type_2 = _NO_TYPE, _NO_TYPE
+                if mon.type_1 not in (PokemonType.THREE_QUESTION_MARKS, PokemonType.STELLAR):
+                    type_1 = _TYPE_INDEX[mon.type_1]
+                    if mon.type_2 is not None:
+                        type_2 = _TYPE_INDEX[mon.type_2]
+                info = mons[id(mon)] = (
+                    [t.name for t in mon.types], type_1, type_2,
+                    self._item(mon).lower(), mon.ability, mon.boosts,
+                )
+            return info
+
+        def stat(mon: Pokemon, key: str) -> float:
+            value = stats.get((id(mon), key))
+            if value is None:
+                value = stats[(id(mon), key)] = self._get_stat_safe(mon, key)
+            return value
+
+        empty = (1.0, 1.0, 0.0, 0, 0, _NO_TYPE, _NO_TYPE, _NO_TYPE, False, False, 1.0, False, False, False, False)
+        encoded = []
+        for move, attacker, defender in entries:
+            info = move_info(move)
+            if not info:
+                encoded.append(empty)
+                continue
+            base_power, is_physical, type_name, move_type = info
+            atk_key, def_key = ('atk', 'def') if is_physical else ('spa', 'spd')
+            atk_types, _, _, item, ability, boosts = mon_info(attacker)
+            _, def_type_1, def_type_2, _, def_ability, def_boosts = mon_info(defender)
+            if move_type == _NO_TYPE:
+                def_type_1, def_type_2 = _NO_TYPE, _NO_TYPE
+
+            item_mult = 1.0
+            if item == 'choiceband' and is_physical:
+                item_mult = 1.5
+            elif item == 'lifeorb':
+                item_mult = 1.3
+            elif item == 'earthplate' and type_name == 'GROUND' or item == 'spookyplate' and type_name == 'GHOST':
+                item_mult = 1.2
+
+            encoded.append((
+                stat(attacker, atk_key), stat(defender, def_key), base_power,
+                boosts.get(atk_key, 0), def_boosts.get(def_key, 0),
+                move_type, def_type_1, def_type_2, is_physical, type_name in atk_types, item_mult,
+                ability == 'orichalcumpulse', def_ability == 'prismarmor',
+                type_name == 'FIRE', type_name == 'WATER',
+            ))
+
+        columns = list(zip(*encoded)) if encoded else [()] * len(empty)
+        return _DamageRows(*(
+            np.array(column, dtype=dtype) for column, dtype in zip(columns, _ROW_DTYPES)
+        ))
+
+    def _batch_calculate_damage(
+            self, entries: List[Tuple[Move, Pokemon, Pokemon]], battle: Battle, is_estimate: bool = True
+    ) -> np.ndarray:
+        weather = "".join(w.name for w in (battle.weather or {}))
+        return _rows_damage(
+            self._encode_damage_rows(entries), 'SUNNYDAY' in weather, 'RAINDANCE' in weather, is_estimate
+        )
+
+    def _battle_finished_callback(self, battle: Battle):
+        self._damage_matrices.pop(battle.battle_tag, None)
+        index = _get_moveset_index()
+        for mon in battle.opponent_team.values():
+            index.observe(mon)
+
+    @staticmethod
+    def _turn_stamp(battle: Battle) -> tuple:
+        # boosts can change mid-turn (e.g. forced switch after a setup KO)
+        stamp = [battle.turn]
+        for mon in (battle.active_pokemon, battle.opponent_active_pokemon):
+            if mon is None:
+                stamp.append(None)
+            else:
+                stamp.append((mon.species, tuple(mon.boosts.values())))
+        return tuple(stamp)
+
+    def _damage_matrix(self, battle: Battle) -> Dict[Tuple[int, str, int], int]:
+        stamp = self._turn_stamp(battle)
+        cached = self._damage_matrices.get(battle.battle_tag)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        entries: List[Tuple[Move, Pokemon, Pokemon]] = []
+        active = battle.active_pokemon
+        opponent = battle.opponent_active_pokemon
+        if opponent is not None:
+            for mon in battle.team.values():
+                if mon.fainted:
+                    continue
+                # our team x moves x opponent
+                moves = battle.available_moves if mon is active else mon.moves.values()
+                for mv in moves:
+                    if getattr(mv, "base_power", 0) > 0:
+                        entries.append((mv, mon, opponent))
+                # opponent likely moves x each of our pokemon
+                for mv in self._opponent_moves(opponent):
+                    if getattr(mv, "base_power", 0) > 0:
+                        entries.append((mv, opponent, mon))
+
+        # one numpy pass for every pair this turn, average roll and all 16
+        matrix: Dict[Tuple[int, str, int], int] = {}
+        ko: Dict[Tuple[int, str, int], Tuple[float, float]] = {}
+        if entries:
+            rows = self._encode_damage_rows(entries)
+            weather = "".join(w.name for w in (battle.weather or {}))
+            sun, rain = 'SUNNYDAY' in weather, 'RAINDANCE' in weather
+            damages = _rows_damage(rows, sun, rain)
+            hp = np.array([self._absolute_hp(defender, battle) for _, _, defender in entries])
+            one_hit, two_hits = _ko_chances(_rows_damage(rows, sun, rain, rolls=True), hp)
+            for i, (mv, attacker, defender) in enumerate(entries):
+                key = (id(attacker), mv.id, id(defender))
+                matrix[key] = int(damages[i])
+                ko[key] = (float(one_hit[i]), float(two_hits[i]))
+
+        self._damage_matrices[battle.battle_tag] = (stamp, matrix, ko)
+        return matrix
+
+    def _cached_damage(self, move: Move, attacker: Pokemon, defender: Pokemon, battle: Battle) -> int:
+        matrix = self._damage_matrix(battle)
+        key = (id(attacker), move.id, id(defender))
+        damage = matrix.get(key)
+        if damage is None:
+            damage = self._calculate_damage(move, attacker, defender, battle)
+            matrix[key] = damage
+        return damage
+
+    @staticmethod
+    def _absolute_hp(mon: Pokemon, battle: Battle) -> float:
+        # the opponent's hp only comes as a percentage, scale it to a likely max hp like _BattleSim
+        if any(mon is own for own in battle.team.values()):
+            return float(mon.current_hp or 1)
+        stats = _get_moveset_index().likely_stats(mon.species)
+        max_hp = stats[0] if stats else _estimated_max_hp(mon.species)
+        return max(mon.current_hp_fraction * max_hp, 1.0)
+
+    def _cached_ko_chances(self, move: Move, attacker: Pokemon, defender: Pokemon, battle: Battle) -> Tuple[float, float]:
+        # chance to KO defender this turn in one hit and in two
+        self._damage_matrix(battle)
+        ko = self._damage_matrices[battle.battle_tag][2]
+        key = (id(attacker), move.id, id(defender))
+        chances = ko.get(key)
+        if chances is None:
+            if not getattr(move, "base_power", 0) or move.category.name not in ('PHYSICAL', 'SPECIAL'):
+                chances = (0.0, 0.0)
+            else:
+                weather = "".join(w.name for w in (battle.weather or {}))
+                rolls = _rows_damage(
+                    self._encode_damage_rows([(move, attacker, defender)]),
+                    'SUNNYDAY' in weather, 'RAINDANCE' in weather, rolls=True
+                )
+                one_hit, two_hits = _ko_chances(rolls, np.array([self._absolute_hp(defender, battle)]))
+                chances = (float(one_hit[0]), float(two_hits[0]))
+            ko[key] = chances
+        return chances
+
+    def _threat_chances(self, attacker: Pokemon, defender: Pokemon, battle: Battle) -> Tuple[float, float]:
+        # best one hit and two hit KO chances over the opponent's likely damaging moves
+        one_hit, two_hits = 0.0, 0.0
+        for mv in self._opponent_moves(attacker):
+            if getattr(mv, "base_power", 0) > 0:
+                p1, p2 = self._cached_ko_chances(mv, attacker, defender, battle)
+                one_hit, two_hits = max(one_hit, p1), max(two_hits, p2)
+        return one_hit, two_hits
+
     def _score_move(self, move: Move, battle: Battle) -> float:
         active = battle.active_pokemon
         opponent = battle.opponent_active_pokemon
@@ -242,7 +1502,7 @@ class CustomAgent(Player):
 
         # 1. damage
         if opponent and base_power > 0:
-            damage = self._calculate_damage(move, active, opponent, battle)
+            damage = self._cached_damage(move, active, opponent, battle)
 
             score += (damage / (opponent.max_hp or 1)) * 130
 
@@ -253,9 +1513,8 @@ class CustomAgent(Player):
             ]:
                 score += (damage / (opponent.max_hp or 1)) * 50
 
-            # huge bonus for KO
-            if damage >= (opponent.current_hp or 1):
-                score += 1200
+            # huge bonus for KO, by how many rolls get it
+            score += 1200 * self._cached_ko_chances(move, active, opponent, battle)[0]
 
         # healing
         if move_heal > 0 or move_id in ['morningsun', 'recover']:
@@ -306,18 +1565,9 @@ class CustomAgent(Player):
             pass
 
         # safety check
-        if opponent and opponent.moves:
-            # check for KO risk
-            potential_damages = [
-                self._calculate_damage(mv, opponent, active, battle)
-                for mv in opponent.moves.values()
-                if getattr(mv, "base_power", 0) > 0
-            ]
-
-            if potential_damages and active.current_hp <= max(potential_damages):
-                # if in danger, dont setup
-                if base_power == 0:
-                    score -= 80
+        if opponent and base_power == 0:
+            # if in danger, dont setup
+            score -= 80 * self._threat_chances(opponent, active, battle)[0]
 
         # pivoting
         if move_self_switch:
@@ -329,11 +1579,7 @@ class CustomAgent(Player):
                 opp_spe = self._get_stat_safe(opponent, 'spe') if opponent else 0
                 active_spe = self._get_stat_safe(active, 'spe')
                 if opponent and opp_spe > active_spe:
-                    damage = self._calculate_damage(move, active, opponent, battle)
-                    if damage >= (opponent.current_hp or 1):
-                        score += 50
-                    else:
-                        score += 20
+                    score += 20 + 30 * self._cached_ko_chances(move, active, opponent, battle)[0]
             except Exception:
                 score += 10
 
@@ -349,9 +1595,9 @@ class CustomAgent(Player):
 
         # how much dmg will we take?
         max_damage = 0
-        for mv in opponent.moves.values():
+        for mv in self._opponent_moves(opponent):
             if getattr(mv, "base_power", 0) > 0:
-                dmg = self._calculate_damage(mv, opponent, switch_target, battle)
+                dmg = self._cached_damage(mv, opponent, switch_target, battle)
                 if dmg > max_damage:
                     max_damage = dmg
 
@@ -362,7 +1608,7 @@ class CustomAgent(Player):
         best_damage_output = 0
         for mv in switch_target.moves.values():
             if getattr(mv, "base_power", 0) > 0:
-                dmg = self._calculate_damage(mv, switch_target, opponent, battle)
+                dmg = self._cached_damage(mv, switch_target, opponent, battle)
                 if dmg > best_damage_output:
                     best_damage_output = dmg
 
@@ -378,21 +1624,167 @@ class CustomAgent(Player):
         except Exception:
             pass
 
-        # crisis switch
-        is_in_danger = False
-        for mv in opponent.moves.values():
-            if getattr(mv, "base_power", 0) > 0:
-                dmg = self._calculate_damage(mv, opponent, active, battle)
-                if dmg >= (active.current_hp or 1):
-                    is_in_danger = True
-                    break
-
-        if is_in_danger and damage_fraction < 0.5:
-            score += 100
+        # crisis switch, active likely KO'd and the target likely takes two hits
+        in_danger = self._threat_chances(opponent, active, battle)[0]
+        if in_danger:
+            score += 100 * in_danger * (1 - self._threat_chances(opponent, switch_target, battle)[1])
 
         return score
 
+    def _search_action(self, battle: Battle, scored: List[Tuple[object, float]]) -> Optional[object]:
+        # iterative deepening until the budget runs out, keeps the last finished depth
+        deadline = time.perf_counter() + self._search_budget
+        try:
+            sim = _BattleSim(self, battle)
+        except Exception:
+            return None
+        state = sim.initial_state(battle)
+
+        action_of = {id(order): action for action, order in sim.root_orders.items()}
+        heuristic = {action_of[id(order)]: score for order, score in scored if id(order) in action_of}
+        if len(heuristic) < 2:
+            return None
+
+        search = _Expectimax(sim, deadline)
+        ordering = sorted(heuristic, key=heuristic.get, reverse=True)
+        best = None
+        weight = _HEURISTIC_WEIGHT
+        for depth in range(1, _MAX_SEARCH_DEPTH + 1):
+            try:
+                values = search.action_values(state, depth, ordering)
+            except _SearchTimeout:
+                break
+            if depth == 1:
+                # weigh the heuristic just enough that depth 1 ranks its best action first,
+                # deeper plies then only overrule it by seeing more than one turn ahead
+                top = ordering[0]
+                for a in ordering[1:]:
+                    if heuristic[a] < heuristic[top]:
+                        needed = (values[a] - values[top]) / (heuristic[top] - heuristic[a])
+                        weight = max(weight, needed * _WEIGHT_MARGIN)
+            # best line of this depth goes first in the next one
+            blended = {a: v + weight * heuristic[a] for a, v in values.items()}
+            ordering = sorted(blended, key=blended.get, reverse=True)
+            best = ordering[0]
+
+        return sim.root_orders[best] if best is not None else None
+
+    def _endgame_action(self, battle: Battle) -> Optional[object]:
+        # with few pokemon left, solve a turn deeper at a time until the game is decided,
+        # None if that doesn't happen inside the budget
+        if self._endgame_budget <= 0:
+            return None
+        ours = sum(not mon.fainted for mon in battle.team.values())
+        theirs = len(battle.teampreview_opponent_team or battle.opponent_team) or 6
+        theirs -= sum(mon.fainted for mon in battle.opponent_team.values())
+        if max(ours, theirs) > _ENDGAME_MONS:
+            return None
+
+        deadline = time.perf_counter() + self._endgame_budget
+        try:
+            sim = _BattleSim(self, battle)
+        except Exception:
+            return None
+        state = sim.initial_state(battle)
+        if (state.hp > 0).sum(axis=1).max() > _ENDGAME_MONS or sim.winner(state) is not None:
+            return None
+
+        solver = _EndgameSolver(sim, deadline)
+        solved = None
+        for turns in range(1, _MAX_ENDGAME_TURNS + 1):
+            try:
+                value, strategy, actions, exact = solver.solve(state, turns)
+            except _SearchTimeout:
+                break
+            # every line played out, or a forced win or loss whatever the rest does
+            if exact or abs(value) >= _WIN_VALUE:
+                solved = strategy, actions
+                break
+        if solved is None:
+            return None
+
+        # play the mix, over the actions poke_env offers
+        strategy, actions = solved
+        weighted = [(a, w) for a, w in zip(actions, strategy) if a in sim.root_orders and w > 0]
+        if not weighted:
+            return None
+        actions, weights = zip(*weighted)
+        return sim.root_orders[random.choices(actions, weights=weights)[0]]
+
+    def _rollout_candidates(self, battle: Battle, scored: List[Tuple[object, float]]):
+        # sim, root state and heuristic score of each close action, None if the call isn't close
+        best = max(score for _, score in scored)
+        close = [(order, score) for order, score in scored if score >= best - _ROLLOUT_MARGIN]
+        if len(close) < 2:
+            return None
+        try:
+            sim = _BattleSim(self, battle)
+        except Exception:
+            return None
+
+        action_of = {id(order): action for action, order in sim.root_orders.items()}
+        close.sort(key=lambda item: item[1], reverse=True)
+        candidates = {action_of[id(order)]: score for order, score in close[:_MAX_ROLLOUT_ACTIONS] if id(order) in action_of}
+        if len(candidates) < 2:
+            return None
+        return sim, sim.initial_state(battle), candidates
+
+    async def _rollout_order(self, sim: _BattleSim, state: _SimState, candidates: Dict[int, float], fallback):
+        # keeps every worker busy with batches for the least sampled candidate until the deadline
+        deadline = time.perf_counter() + self._rollout_budget
+        try:
+            pool, workers = _get_rollout_pool()
+            loop = asyncio.get_running_loop()
+            payload = pickle.dumps((sim, state), pickle.HIGHEST_PROTOCOL)
+            totals = dict.fromkeys(candidates, 0.0)
+            counts = dict.fromkeys(candidates, 0)
+            queued = dict.fromkeys(candidates, 0)
+            pending = set()
+
+            def submit():
+                action = min(candidates, key=lambda a: counts[a] + queued[a])
+                queued[action] += _ROLLOUT_BATCH
+                pending.add(loop.run_in_executor(
+                        pool, _rollout_batch, payload, action, _ROLLOUT_BATCH, random.getrandbits(32)))
+
+            for _ in range(2 * workers):
+                submit()
+            while pending:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    action, total, n = future.result()
+                    queued[action] -= n
+                    totals[action] += total
+                    counts[action] += n
+                    submit()
+            for future in pending:
+                future.cancel()
+        except Exception:
+            return fallback
+
+        if min(counts.values()) < _MIN_ROLLOUTS:
+            return fallback
+        best = max(candidates, key=lambda a: totals[a] / counts[a] + _HEURISTIC_WEIGHT * candidates[a])
+        return self.create_order(sim.root_orders[best])
+
     def choose_move(self, battle: Battle):
+        if self._decision_executor is None:
+            return self._decide(battle)
+        return self._offloaded_decision(battle)
+
+    async def _offloaded_decision(self, battle: Battle):
+        # the loop keeps handling the other battles' messages while this one is scored
+        loop = asyncio.get_running_loop()
+        choice = await loop.run_in_executor(self._decision_executor, self._decide, battle)
+        # rollouts come back as a coroutine, which has to run on the loop
+        if asyncio.iscoroutine(choice):
+            choice = await choice
+        return choice
+
+    def _decide(self, battle: Battle):
         if battle.finished:
             return self.choose_random_move(battle)
 
@@ -409,6 +1801,7 @@ class CustomAgent(Player):
 
         best_action = None
         best_score = -math.inf
+        scored = []
 
         for action_info in possible_actions:
             score = 0.0
@@ -418,11 +1811,27 @@ class CustomAgent(Player):
                 score = self._score_switch(action_info['action'], battle)
 
             score += random.uniform(-5, 5)
+            scored.append((action_info['action'], score))
 
             if score > best_score:
                 best_score = score
                 best_action = action_info['action']
 
+        endgame = self._endgame_action(battle)
+        if endgame is not None:
+            return self.create_order(endgame)
+
+        if self._rollout_budget > 0 and len(scored) > 1 and best_action:
+            # close calls are sampled on the pool, awaited so the websocket loop keeps running
+            rollout = self._rollout_candidates(battle, scored)
+            if rollout is not None:
+                return self._rollout_order(*rollout, fallback=self.create_order(best_action))
+
+        if self._search_budget > 0 and len(scored) > 1:
+            searched = self._search_action(battle, scored)
+            if searched is not None:
+                best_action = searched
+
         if best_action:
             return self.create_order(best_action)
         return self.choose_random_move(battle)
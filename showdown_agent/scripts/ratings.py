@@ -0,0 +1,234 @@
+# Glicko-2 ratings updated one game at a time, so rankings and seeds never need
+# the full cross evaluation re-aggregated, or a rating period at a time as in the paper
+
+
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# glicko-2 works on this scale internally, ratings are shown on the usual elo scale
+_SCALE = 173.7178
+_BASE_RATING = 1500.0
+_BASE_DEVIATION = 350.0 / _SCALE
+_BASE_VOLATILITY = 0.06
+
+_CONVERGENCE = 1e-6
+
+# (p1, p2, p1's score) with 1 a win, 0 a loss and 0.5 a tie
+Game = Tuple[str, str, float]
+
+
+def _g(phi: np.ndarray) -> np.ndarray:
+    return 1.0 / np.sqrt(1.0 + 3.0 * phi * phi / (math.pi * math.pi))
+
+
+def _volatility(phi: float, sigma: float, v: float, delta: float, tau: float) -> float:
+    # new volatility by the illinois method, step 5 of Glickman's glicko-2 paper
+    a = math.log(sigma * sigma)
+
+    def f(x: float) -> float:
+        ex = math.exp(x)
+        return ex * (delta * delta - phi * phi - v - ex) / (
+            2.0 * (phi * phi + v + ex) ** 2
+        ) - (x - a) / (tau * tau)
+
+    low = a
+    if delta * delta > phi * phi + v:
+        high = math.log(delta * delta - phi * phi - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        high = a - k * tau
+
+    f_low, f_high = f(low), f(high)
+    while abs(high - low) > _CONVERGENCE:
+        mid = low + (low - high) * f_low / (f_high - f_low)
+        f_mid = f(mid)
+        if f_mid * f_high <= 0:
+            low, f_low = high, f_high
+        else:
+            f_low /= 2
+        high, f_high = mid, f_mid
+    return math.exp(low / 2)
+
+
+class RatingStore:
+    """Glicko-2 rating, deviation and volatility per player, kept in flat numpy arrays.
+
+    Every game is its own rating period for both players, so results can be recorded
+    as they come in from any match or tournament phase. record_period takes a batch of
+    games as one period instead."""
+
+    def __init__(self, tau: float = 0.5, capacity: int = 64):
+        self.tau = tau
+        self.names: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._mu = np.zeros(capacity)
+        self._phi = np.full(capacity, _BASE_DEVIATION)
+        self._sigma = np.full(capacity, _BASE_VOLATILITY)
+        self._games = np.zeros(capacity, dtype=np.int64)
+        self._score = np.zeros(capacity)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def index(self, name: str) -> int:
+        """Row of name, new players start unrated"""
+        i = self._index.get(name)
+        if i is None:
+            i = self._index[name] = len(self.names)
+            self.names.append(name)
+            if i == len(self._mu):
+                self._grow()
+        return i
+
+    def _grow(self):
+        size = len(self._mu)
+        self._mu = np.concatenate([self._mu, np.zeros(size)])
+        self._phi = np.concatenate([self._phi, np.full(size, _BASE_DEVIATION)])
+        self._sigma = np.concatenate([self._sigma, np.full(size, _BASE_VOLATILITY)])
+        self._games = np.concatenate([self._games, np.zeros(size, dtype=np.int64)])
+        self._score = np.concatenate([self._score, np.zeros(size)])
+
+    def record_game(self, p1: str, p2: str, score: float):
+        """Updates both players after one game, score is p1's"""
+        i, j = self.index(p1), self.index(p2)
+        mu_i, phi_i, sigma_i = (
+            float(self._mu[i]),
+            float(self._phi[i]),
+            float(self._sigma[i]),
+        )
+        mu_j, phi_j, sigma_j = (
+            float(self._mu[j]),
+            float(self._phi[j]),
+            float(self._sigma[j]),
+        )
+        self._update(i, mu_i, phi_i, sigma_i, [mu_j], [phi_j], [score])
+        self._update(j, mu_j, phi_j, sigma_j, [mu_i], [phi_i], [1.0 - score])
+
+    def record_games(self, games: Iterable[Game]):
+        for p1, p2, score in games:
+            self.record_game(p1, p2, score)
+
+    def record_period(self, games: Iterable[Game]):
+        """Updates every player in games once, against their opponents' ratings from
+        before the period"""
+        played: Dict[int, List[Tuple[int, float]]] = {}
+        for p1, p2, score in games:
+            i, j = self.index(p1), self.index(p2)
+            played.setdefault(i, []).append((j, score))
+            played.setdefault(j, []).append((i, 1.0 - score))
+
+        mu, phi, sigma = self._mu.copy(), self._phi.copy(), self._sigma.copy()
+        for i, results in played.items():
+            opponents = [j for j, _ in results]
+            self._update(
+                i,
+                float(mu[i]),
+                float(phi[i]),
+                float(sigma[i]),
+                mu[opponents],
+                phi[opponents],
+                [score for _, score in results],
+            )
+
+    def _update(
+        self,
+        i: int,
+        mu: float,
+        phi: float,
+        sigma: float,
+        opp_mu: Iterable[float],
+        opp_phi: Iterable[float],
+        scores: Iterable[float],
+    ):
+        opp_mu, opp_phi = np.asarray(opp_mu, float), np.asarray(opp_phi, float)
+        scores = np.asarray(scores, float)
+        g = _g(opp_phi)
+        expected = 1.0 / (1.0 + np.exp(-g * (mu - opp_mu)))
+        v = 1.0 / float(np.sum(g * g * expected * (1.0 - expected)))
+        improvement = float(np.sum(g * (scores - expected)))
+        delta = v * improvement
+
+        sigma = _volatility(phi, sigma, v, delta, self.tau)
+        phi_star = min(math.sqrt(phi * phi + sigma * sigma), _BASE_DEVIATION)
+        phi = 1.0 / math.sqrt(1.0 / (phi_star * phi_star) + 1.0 / v)
+
+        self._mu[i] = mu + phi * phi * improvement
+        self._phi[i] = phi
+        self._sigma[i] = sigma
+        self._games[i] += len(scores)
+        self._score[i] += float(np.sum(scores))
+
+    def rating(self, name: str) -> float:
+        if name not in self._index:
+            return _BASE_RATING
+        return _BASE_RATING + _SCALE * float(self._mu[self._index[name]])
+
+    def deviation(self, name: str) -> float:
+        if name not in self._index:
+            return _BASE_DEVIATION * _SCALE
+        return _SCALE * float(self._phi[self._index[name]])
+
+    def row(self, name: str) -> List[float]:
+        """name's internal rating, deviation, volatility, games and score"""
+        i = self.index(name)
+        return [
+            float(self._mu[i]),
+            float(self._phi[i]),
+            float(self._sigma[i]),
+            int(self._games[i]),
+            float(self._score[i]),
+        ]
+
+    def set_row(self, name: str, row: List[float]):
+        i = self.index(name)
+        self._mu[i], self._phi[i], self._sigma[i], self._games[i], self._score[i] = row
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        """Every player's row, to restore() later"""
+        return {name: self.row(name) for name in self.names}
+
+    def restore(self, rows: Dict[str, List[float]]):
+        for name, row in rows.items():
+            self.set_row(name, row)
+
+    def ranking(
+        self, names: Optional[Iterable[str]] = None, top_k: Optional[int] = None
+    ) -> List[Tuple[str, float]]:
+        """(name, rating) by descending rating, of names or of every rated player"""
+        if names is None:
+            names = self.names
+        names = list(names)
+        rows = np.array([self._index.get(name, -1) for name in names], dtype=np.int64)
+        mu = np.where(rows >= 0, self._mu[rows], 0.0)
+
+        if top_k is not None and top_k < len(names):
+            # only the top_k need sorting
+            top = np.argpartition(-mu, top_k - 1)[:top_k]
+            order = top[np.lexsort((top, -mu[top]))]
+        else:
+            order = np.argsort(-mu, kind="stable")
+        shown = (_BASE_RATING + _SCALE * mu[order]).tolist()
+        return [(names[k], rating) for k, rating in zip(order.tolist(), shown)]
+
+    def seed(self, names: Iterable[str]) -> List[str]:
+        """names strongest first, equally rated players keep their order"""
+        return [name for name, _ in self.ranking(names)]
+
+    def table(
+        self, names: Optional[Iterable[str]] = None, top_k: Optional[int] = None
+    ) -> List[List]:
+        """Rows of name, rating, deviation, games and score for tabulate"""
+        rows = []
+        for name, rating in self.ranking(names, top_k):
+            i = self._index.get(name)
+            games = int(self._games[i]) if i is not None else 0
+            score = float(self._score[i]) if i is not None else 0.0
+            rows.append([name, rating, self.deviation(name), games, score])
+        return rows
@@ -0,0 +1,452 @@
+# Replays are written by a background thread into gzipped segment files under
+# replays/store/ instead of one html file each on the event loop. Content is stored
+# by hash: the html template once, then just the log of every replay
+# python replay_store.py export replays/html      write the stored replays out as html
+# python replay_store.py pack replays/rtal831     move loose html replays into the store
+
+
+import argparse
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from poke_env.battle.abstract_battle import AbstractBattle
+from poke_env.data import REPLAY_TEMPLATE
+from poke_env.player.player import Player
+
+REPLAYS_FOLDER = os.path.join(os.path.dirname(__file__), "replays")
+STORE_FOLDER = os.path.join(REPLAYS_FOLDER, "store")
+
+# replays compressed together, reading one back decompresses its whole batch
+_BATCH_SIZE = 64
+# a writer starts a new segment file past this many compressed bytes
+_SEGMENT_BYTES = 16 << 20
+# a partial batch is written once nothing came in for this long
+_IDLE_SECONDS = 1.0
+
+_FLUSH = object()
+_STOP = object()
+
+# (path, battle tag, player, opponent, log)
+Replay = Tuple[str, str, str, str, str]
+
+# {"blob", "segment", "offset", "length", "start", "size"} per stored content and
+# {"replay", "battle_tag", "player", "opponent", "template", "log"} per replay
+IndexEntry = Dict[str, Union[str, int]]
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def replay_log(battle: AbstractBattle) -> str:
+    """The log poke_env puts in a replay page"""
+    return f">{battle.battle_tag}" + "\n".join(
+        "|".join(split_message)
+        for turn in sorted(battle.observations)
+        for split_message in battle.observations[turn].events
+    )
+
+
+def replay_html(
+    template: str, battle_tag: str, player: str, opponent: str, log: str
+) -> str:
+    return (
+        template.replace("{BATTLE_TAG}", battle_tag)
+        .replace("{PLAYER_USERNAME}", player)
+        .replace("{OPPONENT_USERNAME}", opponent)
+        .replace("{REPLAY_LOG}", log)
+    )
+
+
+def replay_path(folder: str, player: str, battle_tag: str) -> str:
+    """The file poke_env would have written, relative to the replays folder if inside it"""
+    path = os.path.abspath(os.path.join(folder, f"{player} - {battle_tag}.html"))
+    try:
+        relative = os.path.relpath(path, REPLAYS_FOLDER)
+    except ValueError:
+        # another drive
+        return path
+    if relative.startswith(".."):
+        return path
+    return relative.replace(os.sep, "/")
+
+
+def _index_entries(folder: str) -> Iterator[IndexEntry]:
+    if not os.path.isdir(folder):
+        return
+    for index_file in sorted(os.listdir(folder)):
+        if not index_file.endswith(".jsonl"):
+            continue
+        with open(os.path.join(folder, index_file), "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # torn last line of a writer that died, nothing after it
+                    break
+
+
+class ReplayWriter:
+    """Background replay sink, submit() only queues and a thread batches, dedupes and
+    compresses. Every writer has its own segment and index files, so the processes of
+    a sharded run can share a store."""
+
+    def __init__(self, folder: str = STORE_FOLDER, batch_size: int = _BATCH_SIZE):
+        self.folder = folder
+        self.batch_size = batch_size
+        # names this writer's files, unique per process and run
+        self.name = f"{os.getpid()}-{time.time_ns():x}"
+        self.index_file = os.path.join(folder, f"{self.name}.jsonl")
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # hashes already in the store, filled in by the writer thread
+        self._stored: Set[str] = set()
+        self._segment = 0
+        self._segment_bytes = 0
+        # first failed write since the last flush(), raised from there
+        self._error: Optional[OSError] = None
+
+        self._template = REPLAY_TEMPLATE.encode("utf-8")
+        self._template_hash = content_hash(self._template)
+
+    def submit(self, battle: AbstractBattle, folder: Union[bool, str]):
+        """Queues battle's replay under the name poke_env's save_replays would use"""
+        folder = "replays" if folder is True else str(folder)
+        self.add(
+            (
+                replay_path(folder, battle.player_username, battle.battle_tag),
+                battle.battle_tag,
+                battle.player_username,
+                str(battle.opponent_username),
+                replay_log(battle),
+            )
+        )
+
+    def add(self, replay: Replay):
+        self._start()
+        self._queue.put(replay)
+
+    def flush(self):
+        """Blocks until everything added so far is on disk, raises if any of it failed"""
+        if self._thread is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="replay-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        self._stored = {
+            entry["blob"] for entry in _index_entries(self.folder) if "blob" in entry
+        }
+        pending: List[Replay] = []
+        while True:
+            try:
+                item = self._queue.get(timeout=_IDLE_SECONDS if pending else None)
+            except queue.Empty:
+                self._commit(pending)
+                pending = []
+                continue
+
+            if item is _FLUSH or item is _STOP:
+                self._commit(pending)
+                pending = []
+                self._queue.task_done()
+                if item is _STOP:
+                    return
+                continue
+
+            pending.append(item)
+            if len(pending) >= self.batch_size:
+                self._commit(pending)
+                pending = []
+
+    def _commit(self, pending: List[Replay]):
+        if not pending:
+            return
+        try:
+            self._write_batch(pending)
+        except OSError as error:
+            # losing replays must not take the tournament down, flush() reports it
+            print(f"Could not store {len(pending)} replays: {error}", file=sys.stderr)
+            if self._error is None:
+                self._error = error
+        for _ in pending:
+            self._queue.task_done()
+
+    def _write_batch(self, replays: List[Replay]):
+        # content not in the store yet, by hash
+        blobs: Dict[str, bytes] = {}
+        if self._template_hash not in self._stored:
+            blobs[self._template_hash] = self._template
+
+        lines: List[IndexEntry] = []
+        for path, battle_tag, player, opponent, log in replays:
+            data = log.encode("utf-8")
+            log_hash = content_hash(data)
+            if log_hash not in self._stored:
+                blobs[log_hash] = data
+            lines.append(
+                {
+                    "replay": path,
+                    "battle_tag": battle_tag,
+                    "player": player,
+                    "opponent": opponent,
+                    "template": self._template_hash,
+                    "log": log_hash,
+                }
+            )
+
+        os.makedirs(self.folder, exist_ok=True)
+        blob_lines: List[IndexEntry] = []
+        if blobs:
+            member = gzip.compress(b"".join(blobs.values()), compresslevel=6, mtime=0)
+            if (
+                self._segment_bytes
+                and self._segment_bytes + len(member) > _SEGMENT_BYTES
+            ):
+                self._segment += 1
+                self._segment_bytes = 0
+            segment = f"{self.name}-{self._segment}.gz"
+            with open(os.path.join(self.folder, segment), "ab") as file:
+                offset = file.tell()
+                file.write(member)
+            self._segment_bytes = offset + len(member)
+
+            start = 0
+            for key, data in blobs.items():
+                blob_lines.append(
+                    {
+                        "blob": key,
+                        "segment": segment,
+                        "offset": offset,
+                        "length": len(member),
+                        "start": start,
+                        "size": len(data),
+                    }
+                )
+                start += len(data)
+            self._stored.update(blobs)
+
+        # the content a replay points at is always indexed before the replay
+        with open(self.index_file, "a", encoding="utf-8") as file:
+            file.write(
+                "".join(
+                    json.dumps(line, separators=(",", ":")) + "\n"
+                    for line in blob_lines + lines
+                )
+            )
+
+
+# one writer per process
+REPLAYS = ReplayWriter()
+
+
+def store_replays(player: Player, folder: Union[bool, str]) -> Player:
+    """Sends player's replays to REPLAYS instead of poke_env's html files"""
+    if not hasattr(player, "_replay_folder"):
+        finished = player._battle_finished_callback
+
+        def battle_finished(battle: AbstractBattle):
+            if player._replay_folder:
+                REPLAYS.submit(battle, player._replay_folder)
+            finished(battle)
+
+        player._battle_finished_callback = battle_finished
+    player._replay_folder = folder
+    player._save_replays = False
+    return player
+
+
+def replay_folder(player: Player) -> Union[bool, str]:
+    """Where player's replays go, stored or written by poke_env"""
+    return getattr(player, "_replay_folder", player._save_replays)
+
+
+class ReplayArchive:
+    """Reads a store back, every replay as the html poke_env would have written"""
+
+    def __init__(self, folder: str = STORE_FOLDER):
+        self.folder = folder
+        self.blobs: Dict[str, IndexEntry] = {}
+        self.replays: Dict[str, IndexEntry] = {}
+        for entry in _index_entries(folder):
+            if "blob" in entry:
+                self.blobs.setdefault(entry["blob"], entry)
+            else:
+                self.replays[entry["replay"]] = entry
+
+        self._templates: Dict[str, str] = {}
+        # the last decompressed batch, replays are mostly read in the order written
+        self._batch: Tuple[Optional[Tuple[str, int]], bytes] = (None, b"")
+
+    def __len__(self) -> int:
+        return len(self.replays)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.replays)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self.replays
+
+    def _blob(self, key: str) -> bytes:
+        entry = self.blobs[key]
+        batch_key = (entry["segment"], entry["offset"])
+        if self._batch[0] != batch_key:
+            with open(os.path.join(self.folder, entry["segment"]), "rb") as file:
+                file.seek(entry["offset"])
+                self._batch = (batch_key, gzip.decompress(file.read(entry["length"])))
+        return self._batch[1][entry["start"] : entry["start"] + entry["size"]]
+
+    def html(self, path: str) -> str:
+        entry = self.replays[path]
+        template = self._templates.get(entry["template"])
+        if template is None:
+            template = self._blob(entry["template"]).decode("utf-8")
+            self._templates[entry["template"]] = template
+        return replay_html(
+            template,
+            entry["battle_tag"],
+            entry["player"],
+            entry["opponent"],
+            self._blob(entry["log"]).decode("utf-8"),
+        )
+
+    def export(self, out_folder: str, match: str = "") -> int:
+        """Writes replays whose path contains match under out_folder, returns how many"""
+        exported = 0
+        for path in self.replays:
+            if match not in path:
+                continue
+            # stored absolute paths land under out_folder too
+            relative = os.path.splitdrive(path)[1].lstrip("/\\")
+            out_file = os.path.join(out_folder, relative)
+            os.makedirs(os.path.dirname(out_file), exist_ok=True)
+            with open(out_file, "w", encoding="utf-8") as file:
+                file.write(self.html(path))
+            exported += 1
+        return exported
+
+
+def parse_replay(html_file: str) -> Optional[Replay]:
+    """A poke_env html replay split back into its fields, None if it isn't one"""
+    name = os.path.basename(html_file)
+    if " - " not in name or not name.endswith(".html"):
+        return None
+    player, battle_tag = name[: -len(".html")].rsplit(" - ", 1)
+    with open(html_file, "r", encoding="utf-8") as file:
+        html = file.read()
+
+    head, tail = REPLAY_TEMPLATE.split("{REPLAY_LOG}")
+    # the opponent's name sits right after the player's in the page heading
+    before, marker = head.split("{OPPONENT_USERNAME}")[0], "</a></h1>"
+    start = len(replay_html(before, battle_tag, player, "", ""))
+    end = html.find(marker, start)
+    if end < 0:
+        return None
+    opponent = html[start:end]
+
+    prefix = replay_html(head, battle_tag, player, opponent, "")
+    suffix = replay_html(tail, battle_tag, player, opponent, "")
+    if not (html.startswith(prefix) and html.endswith(suffix)):
+        return None
+    log = html[len(prefix) : len(html) - len(suffix)]
+    if replay_html(REPLAY_TEMPLATE, battle_tag, player, opponent, log) != html:
+        return None
+    return (
+        replay_path(os.path.dirname(html_file), player, battle_tag),
+        battle_tag,
+        player,
+        opponent,
+        log,
+    )
+
+
+def pack(folders: List[str], writer: ReplayWriter = REPLAYS) -> Tuple[int, int]:
+    """Moves the html replays under folders into the store, returns (packed, skipped)
+
+    A file is only deleted once its replay reads back from the store unchanged."""
+    packed: List[Tuple[str, Replay]] = []
+    skipped = 0
+    for folder in folders:
+        for root, _, files in os.walk(folder):
+            for name in sorted(files):
+                if not name.endswith(".html"):
+                    continue
+                html_file = os.path.join(root, name)
+                replay = parse_replay(html_file)
+                if replay is None:
+                    skipped += 1
+                    continue
+                writer.add(replay)
+                packed.append((html_file, replay))
+
+    # raises before anything is deleted if a batch could not be written
+    writer.flush()
+
+    archive = ReplayArchive(writer.folder)
+    removed = 0
+    for html_file, (path, *fields) in packed:
+        if path in archive and archive.html(path) == replay_html(
+            REPLAY_TEMPLATE, *fields
+        ):
+            os.remove(html_file)
+            removed += 1
+    return removed, skipped + len(packed) - removed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", default=STORE_FOLDER)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write stored replays out as html")
+    export.add_argument("out_folder")
+    export.add_argument("--match", default="", help="only paths containing this")
+    pack_command = commands.add_parser("pack", help="move html replays into the store")
+    pack_command.add_argument("folders", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        exported = ReplayArchive(args.store).export(args.out_folder, args.match)
+        print(f"Exported {exported} replays to {args.out_folder}")
+    else:
+        writer = ReplayWriter(args.store)
+        try:
+            packed, skipped = pack(args.folders, writer)
+        except OSError as error:
+            sys.exit(f"Nothing was removed, the store could not be written: {error}")
+        finally:
+            writer.close()
+        print(f"Packed {packed} replays into {args.store}, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import math
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from poke_env.battle.abstract_battle import AbstractBattle
+from poke_env.player.player import Player
+
+from replay_store import REPLAYS
+
+CrossEvaluation = Dict[str, Dict[str, Optional[float]]]
+
+# called with (p1, p2, p1's score) after every game, e.g. RatingStore.record_game
+GameCallback = Callable[[str, str, float], None]
+
+# gets every finished battle, from p1's side, before the match drops it
+BattleSink = Callable[[AbstractBattle], None]
+
+
+class StoppingRule(NamedTuple):
+    """SPRT on p1's win probability, H0: 0.5 - delta against H1: 0.5 + delta.
+
+    The defaults settle a 2-0 sweep and keep playing close matches up to max_games."""
+
+    delta: float = 0.25
+    alpha: float = 0.1
+    beta: float = 0.1
+    max_games: int = 9
+    batch_size: int = 1
+
+    def decide(self, p1_wins: int, p2_wins: int, games: int) -> Optional[bool]:
+        """True if p1 won the match, False if p2 did, None to keep playing"""
+        p_low, p_high = 0.5 - self.delta, 0.5 + self.delta
+        llr = p1_wins * math.log(p_high / p_low) + p2_wins * math.log(
+            (1 - p_high) / (1 - p_low)
+        )
+
+        if llr >= math.log((1 - self.beta) / self.alpha):
+            return True
+        if llr <= math.log(self.beta / (1 - self.alpha)):
+            return False
+        if games >= self.max_games:
+            return p1_wins_match(p1_wins, p2_wins)
+        return None
+
+
+DEFAULT_RULE = StoppingRule()
+
+
+def p1_wins_match(p1_score: float, p2_score: float) -> bool:
+    """Whether p1 takes a match from both players' wins or win rates, ties go to p1
+
+    The stopping rule, swiss results and cross evaluation rankings all decide this way"""
+    return p1_score >= p2_score
+
+
+class MatchStats:
+    """How many games each match needed"""
+
+    def __init__(self):
+        self.games: Dict[Tuple[str, str], int] = {}
+
+    def record(self, p1: str, p2: str, games: int):
+        self.games[(p1, p2)] = self.games.get((p1, p2), 0) + games
+
+    def merge(self, other: "MatchStats"):
+        for (p1, p2), games in other.games.items():
+            self.record(p1, p2, games)
+
+    @property
+    def total_games(self) -> int:
+        return sum(self.games.values())
+
+    def summary(self) -> str:
+        if not self.games:
+            return "No matches played"
+        return (
+            f"{self.total_games} games over {len(self.games)} matches "
+            f"({self.total_games / len(self.games):.2f} per match)"
+        )
+
+
+async def play_match(
+    p1: Player,
+    p2: Player,
+    n_challenges: Optional[int] = None,
+    rule: StoppingRule = DEFAULT_RULE,
+    stats: Optional[MatchStats] = None,
+    on_game: Optional[GameCallback] = None,
+    save_replays: Union[bool, str] = False,
+    spill: Optional[BattleSink] = None,
+) -> CrossEvaluation:
+    """Plays p1 against p2 and returns a poke_env style cross evaluation of the pair.
+
+    A fixed n_challenges plays exactly that many games, otherwise games are played
+    in batches until the stopping rule settles the match. on_game hears every game
+    as soon as its batch is over.
+
+    save_replays works like poke_env's option of the same name, but for p1's games of
+    this match only, so concurrent matches never share a player's replay folder.
+    The replays go to the replay store in the background.
+
+    Only the match's win counts outlive a batch: its battles are then dropped from
+    both players, after being handed to spill if one is given."""
+    p1_wins = p2_wins = played = 0
+
+    def retire_battles():
+        nonlocal p1_wins, p2_wins, played
+        for battle in p1.battles.values():
+            played += 1
+            if battle.won:
+                p1_wins += 1
+            elif battle.lost:
+                p2_wins += 1
+            if save_replays:
+                REPLAYS.submit(battle, save_replays)
+            if spill is not None:
+                spill(battle)
+            if on_game is not None:
+                score = 0.5 if battle.won is None else float(battle.won)
+                on_game(p1.username, p2.username, score)
+        # the same agents play every round, their battles must not pile up
+        p1.reset_battles()
+        p2.reset_battles()
+
+    if n_challenges is not None:
+        await p1.battle_against(p2, n_battles=n_challenges)
+        retire_battles()
+    else:
+        while True:
+            remaining = rule.max_games - played
+            await p1.battle_against(p2, n_battles=min(rule.batch_size, remaining))
+            retire_battles()
+            if rule.decide(p1_wins, p2_wins, played) is not None:
+                break
+
+    results: CrossEvaluation = {
+        p1.username: {p1.username: None, p2.username: p1_wins / played},
+        p2.username: {p1.username: p2_wins / played, p2.username: None},
+    }
+
+    if stats is not None:
+        stats.record(p1.username, p2.username, played)
+
+    return results
+
+
+async def cross_evaluate(
+    players: List[Player],
+    n_challenges: Optional[int] = None,
+    rule: StoppingRule = DEFAULT_RULE,
+    stats: Optional[MatchStats] = None,
+    on_game: Optional[GameCallback] = None,
+    spill: Optional[BattleSink] = None,
+) -> CrossEvaluation:
+    """Drop in for poke_env.cross_evaluate using play_match for every pairing"""
+    results: CrossEvaluation = {
+        p1.username: {p2.username: None for p2 in players} for p1 in players
+    }
+    for i, p1 in enumerate(players):
+        for p2 in players[i + 1 :]:
+            pair_results = await play_match(
+                p1, p2, n_challenges, rule, stats, on_game, spill=spill
+            )
+            results[p1.username][p2.username] = pair_results[p1.username][p2.username]
+            results[p2.username][p1.username] = pair_results[p2.username][p1.username]
+    return results
@@ -0,0 +1,469 @@
+# Pairs a whole swiss round at once: at most one bye, then a minimum cost perfect matching
+# over every other player. A rematch costs more than any pairing without one, so there is
+# a rematch only when the round can't be paired without it. Otherwise players meet as
+# close to their own score group as possible, and within a group top half meets bottom half
+
+
+import random
+from typing import Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+from ratings import RatingStore
+
+GroupKey = Tuple[int, int]
+
+# any competitor with id, username, wins, losses, history and received_bye
+P = TypeVar("P")
+
+# (group, p1, p2, rematch), p2 is None for the bye
+Pairing = Tuple[GroupKey, P, Optional[P], bool]
+
+
+def group_key(player) -> GroupKey:
+    return (player.wins, player.losses)
+
+
+def _group_order(key: GroupKey) -> Tuple[int, int]:
+    # best record first, by net wins then wins
+    wins, losses = key
+    return (losses - wins, -wins)
+
+
+def _can_play(p1, p2) -> bool:
+    return p2.id not in p1.history
+
+
+def _max_weight_matching(edges: List[Tuple[int, int, int]]) -> List[int]:
+    """Mate of every vertex, -1 if unmatched, in a maximum weight matching of all the
+    maximum cardinality ones
+
+    Edmonds' blossom algorithm in the O(n^3) primal-dual form of Galil's "Efficient
+    algorithms for finding maximum matching in graphs". Weights are ints, so the duals,
+    kept doubled, stay ints too"""
+    n = 1 + max((max(i, j) for i, j, _ in edges), default=-1)
+    if n == 0:
+        return []
+    max_weight = max(0, max(w for _, _, w in edges))
+
+    # endpoint p of edge p // 2 is its vertex p % 2, p ^ 1 is the other end
+    endpoint = [edges[p // 2][p % 2] for p in range(2 * len(edges))]
+    neighbours: List[List[int]] = [[] for _ in range(n)]
+    for k, (i, j, _) in enumerate(edges):
+        neighbours[i].append(2 * k + 1)
+        neighbours[j].append(2 * k)
+
+    # per vertex, the endpoint it is matched through
+    mate = [-1] * n
+    # per vertex or top level blossom: 0 free, 1 S (outer), 2 T (inner)
+    label = [0] * (2 * n)
+    # the endpoint a label was reached through
+    label_end = [-1] * (2 * n)
+    in_blossom = list(range(n))
+    blossom_parent = [-1] * (2 * n)
+    blossom_children: List[Optional[List[int]]] = [None] * (2 * n)
+    blossom_base = list(range(n)) + [-1] * n
+    # endpoints joining each child of a blossom to the next
+    blossom_endpoints: List[Optional[List[int]]] = [None] * (2 * n)
+    # least slack edge to a different S blossom, or for free vertices to any S vertex
+    best_edge = [-1] * (2 * n)
+    blossom_best_edges: List[Optional[List[int]]] = [None] * (2 * n)
+    unused_blossoms = list(range(n, 2 * n))
+    dual = [max_weight] * n + [0] * n
+    allowed = [False] * len(edges)
+    queue: List[int] = []
+
+    def slack(k: int) -> int:
+        i, j, w = edges[k]
+        return dual[i] + dual[j] - 2 * w
+
+    def leaves(b: int) -> Iterator[int]:
+        if b < n:
+            yield b
+        else:
+            for child in blossom_children[b]:
+                yield from leaves(child)
+
+    def assign_label(w: int, t: int, p: int) -> None:
+        b = in_blossom[w]
+        label[w] = label[b] = t
+        label_end[w] = label_end[b] = p
+        best_edge[w] = best_edge[b] = -1
+        if t == 1:
+            queue.extend(leaves(b))
+        else:
+            # the base of a T blossom is matched, its mate becomes S
+            base = blossom_base[b]
+            assign_label(endpoint[mate[base]], 1, mate[base] ^ 1)
+
+    def scan_blossom(v: int, w: int) -> int:
+        # walks up from v and w in turns, the first blossom met twice is the new base
+        path = []
+        base = -1
+        while v != -1 or w != -1:
+            b = in_blossom[v]
+            if label[b] & 4:
+                base = blossom_base[b]
+                break
+            path.append(b)
+            label[b] = 5
+            if label_end[b] == -1:
+                v = -1
+            else:
+                v = endpoint[label_end[b]]
+                b = in_blossom[v]
+                v = endpoint[label_end[b]]
+            if w != -1:
+                v, w = w, v
+        for b in path:
+            label[b] = 1
+        return base
+
+    def add_blossom(base: int, k: int) -> None:
+        v, w, _ = edges[k]
+        bb, bv, bw = in_blossom[base], in_blossom[v], in_blossom[w]
+        b = unused_blossoms.pop()
+        blossom_base[b] = base
+        blossom_parent[b] = -1
+        blossom_parent[bb] = b
+        blossom_children[b] = path = []
+        blossom_endpoints[b] = endpoints = []
+        while bv != bb:
+            blossom_parent[bv] = b
+            path.append(bv)
+            endpoints.append(label_end[bv])
+            v = endpoint[label_end[bv]]
+            bv = in_blossom[v]
+        path.append(bb)
+        path.reverse()
+        endpoints.reverse()
+        endpoints.append(2 * k)
+        while bw != bb:
+            blossom_parent[bw] = b
+            path.append(bw)
+            endpoints.append(label_end[bw] ^ 1)
+            w = endpoint[label_end[bw]]
+            bw = in_blossom[w]
+        label[b] = 1
+        label_end[b] = label_end[bb]
+        dual[b] = 0
+        for v in leaves(b):
+            if label[in_blossom[v]] == 2:
+                # former T vertices are S now
+                queue.append(v)
+            in_blossom[v] = b
+
+        best_edge_to = [-1] * (2 * n)
+        for bv in path:
+            if blossom_best_edges[bv] is None:
+                edge_lists = [[p // 2 for p in neighbours[v]] for v in leaves(bv)]
+            else:
+                edge_lists = [blossom_best_edges[bv]]
+            for edge_list in edge_lists:
+                for k in edge_list:
+                    i, j, _ = edges[k]
+                    if in_blossom[j] == b:
+                        i, j = j, i
+                    bj = in_blossom[j]
+                    if (
+                        bj != b
+                        and label[bj] == 1
+                        and (
+                            best_edge_to[bj] == -1 or slack(k) < slack(best_edge_to[bj])
+                        )
+                    ):
+                        best_edge_to[bj] = k
+            blossom_best_edges[bv] = None
+            best_edge[bv] = -1
+        blossom_best_edges[b] = [k for k in best_edge_to if k != -1]
+        best_edge[b] = -1
+        for k in blossom_best_edges[b]:
+            if best_edge[b] == -1 or slack(k) < slack(best_edge[b]):
+                best_edge[b] = k
+
+    def expand_blossom(b: int, end_stage: bool) -> None:
+        for s in blossom_children[b]:
+            blossom_parent[s] = -1
+            if s < n:
+                in_blossom[s] = s
+            elif end_stage and dual[s] == 0:
+                expand_blossom(s, end_stage)
+            else:
+                for v in leaves(s):
+                    in_blossom[v] = s
+
+        if not end_stage and label[b] == 2:
+            # relabel the even length path from the entry child to the base
+            entry_child = in_blossom[endpoint[label_end[b] ^ 1]]
+            j = blossom_children[b].index(entry_child)
+            if j & 1:
+                j -= len(blossom_children[b])
+                step, trick = 1, 0
+            else:
+                step, trick = -1, 1
+            p = label_end[b]
+            while j != 0:
+                label[endpoint[p ^ 1]] = 0
+                label[endpoint[blossom_endpoints[b][j - trick] ^ trick ^ 1]] = 0
+                assign_label(endpoint[p ^ 1], 2, p)
+                allowed[blossom_endpoints[b][j - trick] // 2] = True
+                j += step
+                p = blossom_endpoints[b][j - trick] ^ trick
+                allowed[p // 2] = True
+                j += step
+            bv = blossom_children[b][j]
+            label[endpoint[p ^ 1]] = label[bv] = 2
+            label_end[endpoint[p ^ 1]] = label_end[bv] = p
+            best_edge[bv] = -1
+            j += step
+            # children off that path keep a T label only if reached from outside
+            while blossom_children[b][j] != entry_child:
+                bv = blossom_children[b][j]
+                if label[bv] == 1:
+                    j += step
+                    continue
+                reached = next((v for v in leaves(bv) if label[v] != 0), None)
+                if reached is not None:
+                    label[reached] = 0
+                    label[endpoint[mate[blossom_base[bv]]]] = 0
+                    assign_label(reached, 2, label_end[reached])
+                j += step
+
+        label[b] = label_end[b] = -1
+        blossom_children[b] = blossom_endpoints[b] = None
+        blossom_base[b] = -1
+        blossom_best_edges[b] = None
+        best_edge[b] = -1
+        unused_blossoms.append(b)
+
+    def augment_blossom(b: int, v: int) -> None:
+        # swaps matched and unmatched edges from v to the base, v becomes the base
+        t = v
+        while blossom_parent[t] != b:
+            t = blossom_parent[t]
+        if t >= n:
+            augment_blossom(t, v)
+        i = j = blossom_children[b].index(t)
+        if i & 1:
+            j -= len(blossom_children[b])
+            step, trick = 1, 0
+        else:
+            step, trick = -1, 1
+        while j != 0:
+            j += step
+            t = blossom_children[b][j]
+            p = blossom_endpoints[b][j - trick] ^ trick
+            if t >= n:
+                augment_blossom(t, endpoint[p])
+            j += step
+            t = blossom_children[b][j]
+            if t >= n:
+                augment_blossom(t, endpoint[p ^ 1])
+            mate[endpoint[p]] = p ^ 1
+            mate[endpoint[p ^ 1]] = p
+        blossom_children[b] = blossom_children[b][i:] + blossom_children[b][:i]
+        blossom_endpoints[b] = blossom_endpoints[b][i:] + blossom_endpoints[b][:i]
+        blossom_base[b] = blossom_base[blossom_children[b][0]]
+
+    def augment_matching(k: int) -> None:
+        # flips the augmenting path through edge k, from both ends back to their roots
+        v, w, _ = edges[k]
+        for s, p in ((v, 2 * k + 1), (w, 2 * k)):
+            while True:
+                bs = in_blossom[s]
+                if bs >= n:
+                    augment_blossom(bs, s)
+                mate[s] = p
+                if label_end[bs] == -1:
+                    break
+                t = endpoint[label_end[bs]]
+                bt = in_blossom[t]
+                s = endpoint[label_end[bt]]
+                j = endpoint[label_end[bt] ^ 1]
+                if bt >= n:
+                    augment_blossom(bt, j)
+                mate[j] = label_end[bt]
+                p = label_end[bt] ^ 1
+
+    # each stage grows the matching by one edge or proves it is of maximum cardinality
+    for _ in range(n):
+        label[:] = [0] * (2 * n)
+        best_edge[:] = [-1] * (2 * n)
+        blossom_best_edges[n:] = [None] * n
+        allowed[:] = [False] * len(edges)
+        queue[:] = []
+        for v in range(n):
+            if mate[v] == -1 and label[in_blossom[v]] == 0:
+                assign_label(v, 1, -1)
+
+        augmented = False
+        while True:
+            while queue and not augmented:
+                v = queue.pop()
+                for p in neighbours[v]:
+                    k = p // 2
+                    w = endpoint[p]
+                    if in_blossom[v] == in_blossom[w]:
+                        continue
+                    if not allowed[k]:
+                        k_slack = slack(k)
+                        if k_slack <= 0:
+                            allowed[k] = True
+                    if allowed[k]:
+                        if label[in_blossom[w]] == 0:
+                            assign_label(w, 2, p ^ 1)
+                        elif label[in_blossom[w]] == 1:
+                            base = scan_blossom(v, w)
+                            if base >= 0:
+                                add_blossom(base, k)
+                            else:
+                                augment_matching(k)
+                                augmented = True
+                                break
+                        elif label[w] == 0:
+                            # w is inside a T blossom but not reached from outside yet
+                            label[w] = 2
+                            label_end[w] = p ^ 1
+                    elif label[in_blossom[w]] == 1:
+                        b = in_blossom[v]
+                        if best_edge[b] == -1 or k_slack < slack(best_edge[b]):
+                            best_edge[b] = k
+                    elif label[w] == 0:
+                        if best_edge[w] == -1 or k_slack < slack(best_edge[w]):
+                            best_edge[w] = k
+            if augmented:
+                break
+
+            # no tight edge left, move the duals by the largest step that keeps them feasible
+            delta_type, delta, delta_edge, delta_blossom = -1, 0, -1, -1
+            for v in range(n):
+                if label[in_blossom[v]] == 0 and best_edge[v] != -1:
+                    d = slack(best_edge[v])
+                    if delta_type == -1 or d < delta:
+                        delta_type, delta, delta_edge = 2, d, best_edge[v]
+            for b in range(2 * n):
+                if blossom_parent[b] == -1 and label[b] == 1 and best_edge[b] != -1:
+                    d = slack(best_edge[b]) // 2
+                    if delta_type == -1 or d < delta:
+                        delta_type, delta, delta_edge = 3, d, best_edge[b]
+            for b in range(n, 2 * n):
+                if (
+                    blossom_base[b] >= 0
+                    and blossom_parent[b] == -1
+                    and label[b] == 2
+                    and (delta_type == -1 or dual[b] < delta)
+                ):
+                    delta_type, delta, delta_blossom = 4, dual[b], b
+            if delta_type == -1:
+                # nothing left to grow, the matching has maximum cardinality
+                delta_type, delta = 1, max(0, min(dual[:n]))
+
+            for v in range(n):
+                if label[in_blossom[v]] == 1:
+                    dual[v] -= delta
+                elif label[in_blossom[v]] == 2:
+                    dual[v] += delta
+            for b in range(n, 2 * n):
+                if blossom_base[b] >= 0 and blossom_parent[b] == -1:
+                    if label[b] == 1:
+                        dual[b] += delta
+                    elif label[b] == 2:
+                        dual[b] -= delta
+
+            if delta_type == 1:
+                break
+            elif delta_type == 2:
+                allowed[delta_edge] = True
+                i, j, _ = edges[delta_edge]
+                queue.append(i if label[in_blossom[i]] == 1 else j)
+            elif delta_type == 3:
+                allowed[delta_edge] = True
+                queue.append(edges[delta_edge][0])
+            else:
+                expand_blossom(delta_blossom, False)
+
+        if not augmented:
+            break
+        # S blossoms whose dual dropped to zero dissolve before the next stage
+        for b in range(n, 2 * n):
+            if (
+                blossom_parent[b] == -1
+                and blossom_base[b] >= 0
+                and label[b] == 1
+                and dual[b] == 0
+            ):
+                expand_blossom(b, True)
+
+    return [endpoint[p] if p >= 0 else -1 for p in mate]
+
+
+def _seat_costs(ranked: Sequence[P]) -> List[List[int]]:
+    """Cost of every pair of the ranked players: a rematch outweighs any number of
+    pairs across score groups, which outweigh any number of pairs off the ideal seat"""
+    n = len(ranked)
+    keys = sorted({group_key(player) for player in ranked}, key=_group_order)
+    group = [keys.index(group_key(player)) for player in ranked]
+    size = [group.count(g) for g in range(len(keys))]
+    seat = [i - group.index(group[i]) for i in range(n)]
+
+    seat_step = 2 * n * (n // 2) + 1
+    rematch_step = seat_step * len(keys) * n
+    costs = [[0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            if group[i] == group[j]:
+                # top half seat i against bottom half seat i + half
+                off_seat = abs(seat[j] - seat[i] - size[group[i]] // 2)
+            else:
+                # the lowest of the higher group floats down onto the top of the lower one
+                off_seat = (size[group[i]] - 1 - seat[i]) + seat[j]
+            cost = (group[j] - group[i]) * seat_step + off_seat
+            if not _can_play(ranked[i], ranked[j]):
+                cost += rematch_step
+            costs[i][j] = costs[j][i] = cost
+    return costs
+
+
+def pair_swiss_round(
+    active_players: Sequence[P],
+    ratings: Optional[RatingStore] = None,
+) -> List[Pairing]:
+    """Returns (group, p1, p2, rematch) for every match of the round, p2 is None for a bye
+
+    Players are ranked by record, then rating when given, equal ones in random order"""
+    ranked = list(active_players)
+    random.shuffle(ranked)
+    if ratings is not None:
+        by_name = {player.username: player for player in ranked}
+        ranked = [by_name[name] for name in ratings.seed(by_name)]
+    ranked.sort(key=lambda player: _group_order(group_key(player)))
+
+    pairings: List[Pairing] = []
+
+    # the lowest ranked player without a bye yet sits out an odd round
+    bye = None
+    if len(ranked) % 2:
+        bye = next(
+            (player for player in reversed(ranked) if not player.received_bye),
+            ranked[-1],
+        )
+        ranked.remove(bye)
+
+    # every pair is allowed, the seat order only decides what each one costs
+    costs = _seat_costs(ranked)
+    top = 1 + max((max(row) for row in costs), default=0)
+    mate = _max_weight_matching(
+        [
+            (i, j, top - costs[i][j])
+            for i in range(len(ranked))
+            for j in range(i + 1, len(ranked))
+        ]
+    )
+
+    for i, j in enumerate(mate):
+        if i < j:
+            p1, p2 = ranked[i], ranked[j]
+            pairings.append((group_key(p1), p1, p2, not _can_play(p1, p2)))
+
+    if bye is not None:
+        pairings.append((group_key(bye), bye, None, False))
+
+    return pairings
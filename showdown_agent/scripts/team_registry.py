@@ -0,0 +1,107 @@
+# Teams are parsed and validated once per distinct text, every player using the
+# same team shares one teambuilder, and the packed teams are kept between runs
+
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+
+from poke_env.data import GenData
+from poke_env.data.normalize import to_id_str
+from poke_env.teambuilder import ConstantTeambuilder, TeambuilderPokemon
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), "results", "team_cache.json")
+
+TEAMS_FOLDER = os.path.join(os.path.dirname(__file__), "bots", "teams")
+
+
+def content_hash(team: str) -> str:
+    return hashlib.sha256(team.encode("utf-8")).hexdigest()
+
+
+def validate_team(mons: List[TeambuilderPokemon], gen: int = 9) -> List[str]:
+    """Problems with a parsed team, empty if it is fine"""
+    data = GenData.from_gen(gen)
+    problems = []
+    if not 1 <= len(mons) <= 6:
+        problems.append(f"{len(mons)} pokemon, expected 1 to 6")
+    for mon in mons:
+        species = to_id_str(mon.species or mon.nickname or "")
+        if species not in data.pokedex:
+            problems.append(f"unknown species {mon.species or mon.nickname!r}")
+        if not 1 <= len(mon.moves) <= 4:
+            problems.append(f"{species}: {len(mon.moves)} moves, expected 1 to 4")
+        for move in mon.moves:
+            if to_id_str(move) not in data.moves:
+                problems.append(f"{species}: unknown move {move!r}")
+    return problems
+
+
+class TeamRegistry:
+    """Teambuilders keyed by the sha256 of the team text, packed teams persisted in cache_file"""
+
+    def __init__(self, cache_file: Optional[str] = CACHE_FILE):
+        self.cache_file = cache_file
+        # content hash -> packed team, only teams that validated
+        self._packed: Dict[str, str] = {}
+        self._builders: Dict[str, ConstantTeambuilder] = {}
+        self._dirty = False
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as file:
+                    self._packed = json.load(file)
+            except (OSError, ValueError):
+                self._packed = {}
+
+    def teambuilder(self, team: str) -> ConstantTeambuilder:
+        """The shared teambuilder for team, showdown or packed format"""
+        key = content_hash(team)
+        builder = self._builders.get(key)
+        if builder is not None:
+            return builder
+
+        packed = self._packed.get(key)
+        if packed is not None:
+            builder = ConstantTeambuilder(packed)
+        else:
+            builder = ConstantTeambuilder(team)
+            problems = validate_team(builder.team)
+            if problems:
+                raise ValueError(f"Invalid team: {'; '.join(problems)}")
+            self._packed[key] = builder.yield_team()
+            self._dirty = True
+
+        self._builders[key] = builder
+        return builder
+
+    def load_folder(self, folder: str = TEAMS_FOLDER) -> Dict[str, ConstantTeambuilder]:
+        """Teambuilder per .txt file in folder, by file name without the extension"""
+        teams = {}
+        for team_file in sorted(os.listdir(folder)):
+            if team_file.endswith(".txt"):
+                with open(
+                    os.path.join(folder, team_file), "r", encoding="utf-8"
+                ) as file:
+                    text = file.read()
+                try:
+                    teams[team_file[:-4]] = self.teambuilder(text)
+                except ValueError as error:
+                    raise ValueError(f"{team_file}: {error}") from error
+        self.save()
+        return teams
+
+    def save(self):
+        if not self.cache_file or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(self._packed, file, indent=1, sort_keys=True)
+        os.replace(tmp_file, self.cache_file)
+        self._dirty = False
+
+
+# one registry per process
+TEAMS = TeamRegistry()
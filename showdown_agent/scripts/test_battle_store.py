@@ -0,0 +1,120 @@
+# python -m pytest test_battle_store.py, on stand-in battles
+
+
+import asyncio
+import os
+from types import SimpleNamespace
+
+from battle_store import BattleStore, battle_record, load_battles
+from sequential_match import StoppingRule, play_match
+
+
+def _battle(tag, player, opponent, won):
+    events = [["", "player", "p1", player], ["", "turn", "1"], ["", "win", player]]
+    return SimpleNamespace(
+        battle_tag=tag,
+        player_username=player,
+        opponent_username=opponent,
+        won=won,
+        lost=not won,
+        finished=True,
+        turn=1,
+        observations={
+            0: SimpleNamespace(events=events[:1]),
+            1: SimpleNamespace(events=events[1:]),
+        },
+    )
+
+
+class _Player:
+    """Plays a batch of battles at once in battle_against, results in the given order"""
+
+    def __init__(self, username, spilled, results=()):
+        self.username = username
+        self.battles = {}
+        # (battles, tags spilled so far) at every reset
+        self.resets = []
+        self._spilled = spilled
+        self._results = iter(results)
+
+    async def battle_against(self, opponent, n_battles):
+        batch = []
+        for _ in range(n_battles):
+            won = next(self._results)
+            tag = f"battle-{len(self.resets)}-{len(self.battles)}"
+            batch.append(_battle(tag, self.username, opponent.username, won))
+            batch.append(_battle(tag, opponent.username, self.username, not won))
+            self.battles[tag], opponent.battles[tag] = batch[-2:]
+        for battle in batch:
+            battle.finished = False
+        for battle in batch:
+            await asyncio.sleep(0)
+            battle.finished = True
+
+    def reset_battles(self):
+        self.resets.append((dict(self.battles), list(self._spilled)))
+        self.battles = {}
+
+
+def test_spilled_battles_reload_as_recorded(tmp_path):
+    store = BattleStore(str(tmp_path))
+    battles = [_battle(f"battle-{i}", "p1", "p2", i % 2 == 0) for i in range(3)]
+    for battle in battles:
+        store(battle)
+    store.close()
+
+    records = list(load_battles(str(tmp_path)))
+    assert records == [battle_record(battle) for battle in battles]
+    assert records[0]["log"] == ["|player|p1|p1", "|turn|1", "|win|p1"]
+
+
+def test_battles_before_a_crash_still_reload(tmp_path):
+    store = BattleStore(str(tmp_path))
+    battles = [_battle(f"battle-{i}", "p1", "p2", True) for i in range(2)]
+    for battle in battles:
+        store(battle)
+    # what a process that dies here leaves, a gzip stream that never got closed
+    with open(store.battles_file, "rb") as file:
+        written = file.read()
+    store.close()
+    os.mkdir(tmp_path / "crashed")
+    with open(tmp_path / "crashed" / "battles-1.jsonl.gz", "wb") as file:
+        file.write(written)
+
+    records = list(load_battles(str(tmp_path / "crashed")))
+    assert records == [battle_record(battle) for battle in battles]
+
+
+def test_battles_are_spilled_before_the_players_reset(tmp_path):
+    store = BattleStore(str(tmp_path))
+    spilled = []
+
+    def spill(battle):
+        spilled.append(battle.battle_tag)
+        store(battle)
+
+    p1 = _Player("p1", spilled, [True, True, False, True, True, True])
+    p2 = _Player("p2", spilled)
+    games = []
+
+    results = asyncio.run(
+        play_match(
+            p1,
+            p2,
+            rule=StoppingRule(max_games=6, batch_size=3),
+            on_game=lambda *game: games.append(game),
+            spill=spill,
+        )
+    )
+    store.close()
+
+    assert results["p1"]["p2"] == 5 / 6
+    assert len(games) == 6
+    # one reset per batch, each once the whole batch had finished and been spilled
+    for player in (p1, p2):
+        assert [len(battles) for battles, _ in player.resets] == [3, 3]
+        for battles, spilled_then in player.resets:
+            assert all(battle.finished for battle in battles.values())
+            assert set(battles) <= set(spilled_then)
+    reloaded = [record["battle_tag"] for record in load_battles(str(tmp_path))]
+    assert reloaded == spilled == [tag for battles, _ in p1.resets for tag in battles]
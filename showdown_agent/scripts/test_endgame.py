@@ -0,0 +1,42 @@
+# python -m pytest test_endgame.py, on the benchmark's synthetic battles
+
+
+import sys
+
+import numpy as np
+from poke_env.battle.status import Status
+
+import benchmark
+
+
+def _agent_module(player):
+    return sys.modules[type(player).__module__]
+
+
+def test_matrix_game_plays_the_dominant_row():
+    player = benchmark.load_players()[0]
+    # row 1 is at least as good as the others whatever the column
+    payoff = np.array([[1.0, -2.0, 0.0], [3.0, 1.0, 2.0], [2.0, 0.0, -1.0]])
+    value, strategy = _agent_module(player)._solve_matrix_game(payoff)
+    assert value == 1.0
+    assert strategy.tolist() == [0.0, 1.0, 0.0]
+
+
+def test_endgame_finishes_a_one_hp_opponent():
+    player = benchmark.load_players()[0]
+    player._endgame_budget = 2.0
+    for battle in benchmark.build_battles(player, 12, 5):
+        # one pokemon each, ours at full hp against theirs on its last hit point
+        active = battle.active_pokemon
+        opponent = battle.opponent_active_pokemon
+        for mon in [*battle.team.values(), *battle.opponent_team.values()]:
+            if mon not in (active, opponent):
+                mon._current_hp = 0
+                mon._status = Status.FNT
+        active._current_hp = active.max_hp
+        opponent._current_hp = 1
+        battle._available_switches = []
+
+        order = player._endgame_action(battle)
+        assert order in battle.available_moves
+        assert order.base_power > 0, (active.species, opponent.species, order.id)
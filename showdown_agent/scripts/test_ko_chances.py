@@ -0,0 +1,60 @@
+# python -m pytest test_ko_chances.py, on the benchmark's synthetic battles
+
+
+import sys
+
+import numpy as np
+
+import benchmark
+
+
+def _agent_module(player):
+    return sys.modules[type(player).__module__]
+
+
+def _triple(battle, attacker, move, defender):
+    attacker = next(m for m in battle.team.values() if m.species == attacker)
+    defender = next(m for m in battle.opponent_team.values() if m.species == defender)
+    # poke_env only knows the opponent's hp in percent, set it before the turn's cache
+    defender._current_hp = 100
+    return attacker.moves[move], attacker, defender
+
+
+def test_ko_chances_count_rolls_and_pairs_of_rolls():
+    player = benchmark.load_players()[0]
+    ko_chances = _agent_module(player)._ko_chances
+    rolls = np.array([[85, 90, 95, 100], [40, 40, 40, 40], [10, 20, 30, 40]])
+    one_hit, two_hits = ko_chances(rolls, np.array([85.0, 100.0, 100.0]))
+    assert one_hit.tolist() == [1.0, 0.0, 0.0]
+    assert two_hits.tolist() == [1.0, 0.0, 0.0]
+    one_hit, two_hits = ko_chances(rolls, np.array([95.0, 40.0, 60.0]))
+    assert one_hit.tolist() == [0.5, 1.0, 0.0]
+    assert two_hits.tolist() == [1.0, 1.0, 6 / 16]
+
+
+def test_lowest_roll_over_full_hp_is_a_sure_ko():
+    player = benchmark.load_players()[0]
+    battles = benchmark.build_battles(player, 5, 1)
+    for battle, triple in [
+        (battles[0], ("rayquaza", "dragonascent", "zapdosgalar")),
+        (battles[3], ("koraidon", "closecombat", "kingambit")),
+    ]:
+        move, attacker, defender = _triple(battle, *triple)
+        damage = player._calculate_damage(move, attacker, defender, battle, False)
+        assert damage * 0.85 >= player._absolute_hp(defender, battle), triple
+        ko = player._cached_ko_chances(move, attacker, defender, battle)
+        assert ko == (1.0, 1.0), triple
+
+
+def test_immune_defender_is_never_koed():
+    player = benchmark.load_players()[0]
+    battles = benchmark.build_battles(player, 5, 1)
+    for battle, triple in [
+        (battles[0], ("rayquaza", "earthquake", "zapdosgalar")),
+        (battles[1], ("rayquaza", "earthquake", "dragonite")),
+        (battles[3], ("eternatus", "dynamaxcannon", "arceusfairy")),
+    ]:
+        move, attacker, defender = _triple(battle, *triple)
+        assert player._calculate_damage(move, attacker, defender, battle) == 0, triple
+        ko = player._cached_ko_chances(move, attacker, defender, battle)
+        assert ko == (0.0, 0.0), triple
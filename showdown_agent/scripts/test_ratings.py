@@ -0,0 +1,42 @@
+# python -m pytest test_ratings.py
+
+
+import math
+
+from ratings import _SCALE, RatingStore
+
+
+def _set(ratings, name, rating, deviation, volatility=0.06):
+    ratings.set_row(
+        name, [(rating - 1500) / _SCALE, deviation / _SCALE, volatility, 0, 0]
+    )
+
+
+def _assert_row(ratings, name, rating, deviation, volatility):
+    assert math.isclose(ratings.rating(name), rating, abs_tol=0.01)
+    assert math.isclose(ratings.deviation(name), deviation, abs_tol=0.01)
+    assert math.isclose(ratings.row(name)[2], volatility, abs_tol=1e-5)
+
+
+def test_rating_period_matches_glickmans_example():
+    # the worked example of Glickman's glicko-2 paper
+    ratings = RatingStore(tau=0.5)
+    _set(ratings, "player", 1500, 200)
+    _set(ratings, "a", 1400, 30)
+    _set(ratings, "b", 1550, 100)
+    _set(ratings, "c", 1700, 300)
+    ratings.record_period(
+        [("player", "a", 1.0), ("b", "player", 1.0), ("player", "c", 0.0)]
+    )
+    _assert_row(ratings, "player", 1464.06, 151.52, 0.05999)
+    assert ratings.row("player")[3:] == [3, 1.0]
+
+
+def test_rating_period_of_one_game_is_one_recorded_game():
+    by_game, by_period = RatingStore(), RatingStore()
+    for ratings in (by_game, by_period):
+        _set(ratings, "p1", 1600, 80)
+        _set(ratings, "p2", 1450, 150)
+    by_game.record_game("p1", "p2", 0.0)
+    by_period.record_period([("p1", "p2", 0.0)])
+    assert by_game.snapshot() == by_period.snapshot()
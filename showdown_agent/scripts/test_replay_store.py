@@ -0,0 +1,86 @@
+# python -m pytest test_replay_store.py, on stand-in battles
+
+
+import os
+from types import SimpleNamespace
+
+from poke_env.data import REPLAY_TEMPLATE
+
+from replay_store import ReplayArchive, ReplayWriter, replay_html, replay_log
+
+
+def _battle(i, log_turns=3):
+    turns = {
+        turn: SimpleNamespace(
+            events=[["", "turn", str(turn)], ["", "move", f"p1a: {i}"]]
+        )
+        for turn in range(log_turns)
+    }
+    return SimpleNamespace(
+        battle_tag=f"battle-gen9ubers-{i}",
+        player_username="p1",
+        opponent_username="p2",
+        observations=turns,
+    )
+
+
+def _expected_html(battle):
+    # what poke_env's save_replays would have written
+    return replay_html(
+        REPLAY_TEMPLATE,
+        battle.battle_tag,
+        battle.player_username,
+        battle.opponent_username,
+        replay_log(battle),
+    )
+
+
+def _assert_stored(store, folder, battles):
+    archive = ReplayArchive(str(store))
+    assert len(archive) == len(battles)
+    for battle in battles:
+        path = os.path.join(folder, f"p1 - {battle.battle_tag}.html")
+        assert archive.html(path) == _expected_html(battle)
+
+
+def test_flushed_replays_read_back_as_html(tmp_path):
+    writer = ReplayWriter(str(tmp_path / "store"), batch_size=4)
+    battles = [_battle(i) for i in range(10)]
+    for battle in battles:
+        writer.submit(battle, str(tmp_path))
+    writer.flush()
+
+    _assert_stored(tmp_path / "store", str(tmp_path), battles)
+    # 3 batches in one segment next to the index, the template stored once
+    assert len(os.listdir(tmp_path / "store")) == 2
+    archive = ReplayArchive(str(tmp_path / "store"))
+    assert len(archive.blobs) == len(battles) + 1
+    writer.close()
+
+
+def test_close_writes_the_queued_replays(tmp_path):
+    # fewer than a batch and no flush, as at exit
+    writer = ReplayWriter(str(tmp_path / "store"))
+    battles = [_battle(i) for i in range(5)]
+    for battle in battles:
+        writer.submit(battle, str(tmp_path))
+    writer.close()
+
+    _assert_stored(tmp_path / "store", str(tmp_path), battles)
+
+
+def test_writers_share_a_store_without_storing_content_twice(tmp_path):
+    store = str(tmp_path / "store")
+    first, second = ReplayWriter(store), ReplayWriter(store)
+    battles = [_battle(i) for i in range(4)]
+    for battle in battles[:3]:
+        first.submit(battle, str(tmp_path))
+    first.close()
+    # the same battle again and a new one
+    for battle in battles[2:]:
+        second.submit(battle, str(tmp_path))
+    second.close()
+
+    _assert_stored(store, str(tmp_path), battles)
+    archive = ReplayArchive(store)
+    assert len(archive.blobs) == len(battles) + 1
@@ -0,0 +1,22 @@
+# python -m pytest test_search.py, on the benchmark's synthetic battles
+
+
+import sys
+
+import benchmark
+
+
+def test_depth_one_search_agrees_with_greedy_scoring(monkeypatch):
+    player = benchmark.load_players()[0]
+    monkeypatch.setattr(sys.modules[type(player).__module__], "_MAX_SEARCH_DEPTH", 1)
+    player._search_budget = 5.0
+    for battle in benchmark.build_battles(player, 60, 11):
+        scored = [
+            (move, player._score_move(move, battle)) for move in battle.available_moves
+        ]
+        scored += [
+            (switch, player._score_switch(switch, battle))
+            for switch in battle.available_switches
+        ]
+        greedy = max(scored, key=lambda item: item[1])[0]
+        assert player._search_action(battle, scored) is greedy, battle.battle_tag
@@ -0,0 +1,85 @@
+# python -m pytest test_swiss_pairing.py
+
+
+from types import SimpleNamespace
+
+from swiss_pairing import pair_swiss_round
+
+
+def _competitor(id, wins, losses, history=(), received_bye=False):
+    return SimpleNamespace(
+        id=id,
+        username=f"p{id}",
+        wins=wins,
+        losses=losses,
+        history=set(history),
+        received_bye=received_bye,
+    )
+
+
+def _pairs(pairings):
+    return {frozenset((p1.id, p2.id)) for _, p1, p2, _ in pairings if p2 is not None}
+
+
+def test_no_rematch_when_the_round_can_avoid_one():
+    # greedy per group pairing forces 1 v 3, yet 0 v 5, 2 v 3 and 1 v 4 are all new
+    competitors = [
+        _competitor(0, 2, 0, {1, 3, 4}),
+        _competitor(1, 1, 1, {0, 2, 3, 5}),
+        _competitor(2, 2, 0, {1, 4}),
+        _competitor(3, 0, 2, {0, 1, 5}),
+        _competitor(4, 1, 2, {0, 2}),
+        _competitor(5, 2, 1, {1, 3}),
+    ]
+    for _ in range(20):
+        pairings = pair_swiss_round(competitors)
+        assert not any(rematch for *_, rematch in pairings)
+        assert _pairs(pairings) == {
+            frozenset((0, 5)),
+            frozenset((2, 3)),
+            frozenset((1, 4)),
+        }
+
+
+def test_rematch_only_when_every_pairing_has_one():
+    competitors = [_competitor(0, 1, 0, {1}), _competitor(1, 0, 1, {0})]
+    assert [rematch for *_, rematch in pair_swiss_round(competitors)] == [True]
+
+
+def test_bye_goes_to_the_lowest_player_without_one():
+    competitors = [
+        _competitor(0, 2, 0),
+        _competitor(1, 1, 0),
+        _competitor(2, 1, 0),
+        _competitor(3, 0, 1),
+        _competitor(4, 0, 2, received_bye=True),
+    ]
+    for _ in range(20):
+        pairings = pair_swiss_round(competitors)
+        byes = [p1.id for _, p1, p2, _ in pairings if p2 is None]
+        assert byes == [3]
+        assert set().union(*_pairs(pairings)) == {0, 1, 2, 4}
+
+
+def test_odd_group_floats_one_player_down():
+    competitors = [_competitor(i, 1, 0) for i in range(3)] + [
+        _competitor(i, 0, 1) for i in range(3, 6)
+    ]
+    for _ in range(20):
+        pairings = pair_swiss_round(competitors)
+        crossing = [(p1, p2) for _, p1, p2, _ in pairings if p1.wins != p2.wins]
+        assert len(crossing) == 1
+        p1, p2 = crossing[0]
+        assert (p1.wins, p2.wins) == (1, 0)
+
+
+def test_players_float_down_rather_than_rematch():
+    competitors = [
+        _competitor(0, 1, 0, {1}),
+        _competitor(1, 1, 0, {0}),
+        _competitor(2, 0, 1),
+        _competitor(3, 0, 1),
+    ]
+    pairings = pair_swiss_round(competitors)
+    assert not any(rematch for *_, rematch in pairings)
+    assert all(p1.wins == 1 and p2.wins == 0 for _, p1, p2, _ in pairings)
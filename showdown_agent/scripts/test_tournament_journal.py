@@ -0,0 +1,95 @@
+# python -m pytest test_tournament_journal.py, swiss rounds of stand-in matches
+
+
+import random
+
+import expert_competition
+from expert_competition import Competitor, restore_checkpoint, run_swiss_round
+from ratings import RatingStore
+from tournament_journal import TournamentJournal
+
+
+class Crash(Exception):
+    pass
+
+
+def _competitors():
+    return [Competitor(i + 1, f"player{i + 1}", None) for i in range(8)]
+
+
+def _play_swiss(monkeypatch, folder, played, crash_at=None, resume=False):
+    """Standings, competitor states and ratings after a swiss tournament of 8"""
+    ratings = RatingStore()
+    monkeypatch.setattr(expert_competition, "RATINGS", ratings)
+
+    calls = []
+
+    async def run_battle(p1, p2, save_replays=False):
+        # stand in for a match, with a fixed result per pairing
+        calls.append((p1.username, p2.username))
+        if len(calls) == crash_at:
+            raise Crash()
+        played.append((p1.username, p2.username))
+        p1_score = 1.0 if (p1.id * 5 + p2.id) % 7 > 2 else 0.0
+        ratings.record_game(p1.username, p2.username, p1_score)
+        return expert_competition.record_battle(
+            p1,
+            p2,
+            {
+                p1.username: {p2.username: p1_score},
+                p2.username: {p1.username: 1.0 - p1_score},
+            },
+        )
+
+    monkeypatch.setattr(expert_competition, "run_battle", run_battle)
+
+    folder.mkdir(exist_ok=True)
+    competitors = _competitors()
+    journal = TournamentJournal(str(folder))
+    checkpoint = None
+    if resume:
+        checkpoint = journal.load()
+        restore_checkpoint(competitors, checkpoint[0], ratings)
+    else:
+        random.seed(7)
+
+    # every match of a round at once, so a crash leaves the others journaled
+    qualified = run_swiss_round(
+        competitors,
+        str(folder / "results.txt"),
+        str(folder / "summary.txt"),
+        max_concurrent_matches=0,
+        journal=journal,
+        checkpoint=checkpoint,
+    )
+    return (
+        [competitor.username for competitor in qualified],
+        expert_competition.competitor_states(competitors),
+        ratings.snapshot(),
+    )
+
+
+def test_resumed_round_matches_an_uninterrupted_one(monkeypatch, tmp_path):
+    played = []
+    expected = _play_swiss(monkeypatch, tmp_path / "straight", played)
+    assert len(played) > 6
+
+    # the second match of round 2 crashes, the round's other 3 are journaled
+    crashed = []
+    try:
+        _play_swiss(monkeypatch, tmp_path / "crashed", crashed, crash_at=6)
+    except Crash:
+        pass
+    else:
+        raise AssertionError("the stand-in match didn't crash")
+    snapshot, entries = TournamentJournal(str(tmp_path / "crashed")).load()
+    assert snapshot["round"] == 2
+    assert len(entries) == 3
+
+    resumed = []
+    assert (
+        _play_swiss(monkeypatch, tmp_path / "crashed", resumed, resume=True) == expected
+    )
+    # only the crashed match and the rounds after it are played
+    assert crashed == played[:5] + played[6:8]
+    assert resumed == played[5:6] + played[8:]
@@ -0,0 +1,75 @@
+# Crash safety for long tournaments: finished matches are appended to a journal as
+# they come in, and the whole tournament is snapshotted at the start of every round.
+# The snapshot plus the journal entries after it give back the exact position.
+
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+CHECKPOINT_FOLDER = os.path.join(os.path.dirname(__file__), "results", "checkpoint")
+
+Snapshot = Dict[str, Any]
+Entry = Dict[str, Any]
+
+
+class TournamentJournal:
+    """Append only journal of finished matches next to the latest tournament snapshot"""
+
+    def __init__(self, folder: str = CHECKPOINT_FOLDER):
+        self.folder = folder
+        self.journal_file = os.path.join(folder, "journal.jsonl")
+        self.snapshot_file = os.path.join(folder, "snapshot.json")
+        # entries in the journal so far, a snapshot covers the ones before it
+        self.entries = 0
+
+    def clear(self):
+        """Starts a new tournament"""
+        for path in (self.journal_file, self.snapshot_file):
+            if os.path.exists(path):
+                os.remove(path)
+        self.entries = 0
+
+    def load(self) -> Optional[Tuple[Snapshot, List[Entry]]]:
+        """Latest snapshot and the entries journaled after it, None if there is none"""
+        if not os.path.exists(self.snapshot_file):
+            return None
+        with open(self.snapshot_file, "r", encoding="utf-8") as file:
+            snapshot = json.load(file)
+
+        entries: List[Entry] = []
+        if os.path.exists(self.journal_file):
+            valid_bytes = 0
+            with open(self.journal_file, "rb") as file:
+                for line in file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # torn write from the crash, everything before it is good
+                        break
+                    valid_bytes += len(line)
+            if valid_bytes != os.path.getsize(self.journal_file):
+                os.truncate(self.journal_file, valid_bytes)
+        self.entries = len(entries)
+
+        return snapshot, entries[snapshot["journal_entries"] :]
+
+    def record(self, entry: Entry):
+        """Appends one finished match, on disk before this returns"""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.journal_file, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.entries += 1
+
+    def snapshot(self, state: Snapshot):
+        """Replaces the snapshot atomically, journal entries so far count as included"""
+        os.makedirs(self.folder, exist_ok=True)
+        state = dict(state, journal_entries=self.entries)
+        tmp_file = f"{self.snapshot_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(state, file, separators=(",", ":"))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.snapshot_file)
@@ -0,0 +1,232 @@
+# One local server per shard, e.g. for ports 8000-8003:
+# node pokemon-showdown start --no-security 8000
+
+
+import asyncio
+import inspect
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from poke_env import AccountConfiguration, ServerConfiguration
+from poke_env.player.player import Player
+
+from battle_store import BattleStore
+from latency import LatencyRecorder
+from player_modules import load_player_module
+from players.rtal831 import ROLLOUT_WORKERS_ENV
+from ratings import Game, RatingStore
+from replay_store import replay_folder, store_replays
+from sequential_match import CrossEvaluation, GameCallback, MatchStats, play_match
+from team_registry import TEAMS
+
+
+class AgentSpec(NamedTuple):
+    """Everything a worker process needs to rebuild an agent on its own server"""
+
+    module_path: str
+    class_name: str
+    username: str
+    battle_format: str
+    team: Optional[str]
+    save_replays: Union[bool, str]
+
+
+def agent_spec(agent: Player) -> AgentSpec:
+    agent_class = type(agent)
+
+    # bots take their team as an argument, players hardcode theirs
+    team = None
+    if "team" in inspect.signature(agent_class.__init__).parameters:
+        team = agent._team.yield_team() if agent._team is not None else None
+
+    return AgentSpec(
+        module_path=os.path.abspath(inspect.getfile(agent_class)),
+        class_name=agent_class.__name__,
+        username=agent.username,
+        battle_format=agent.format,
+        team=team,
+        save_replays=replay_folder(agent),
+    )
+
+
+def local_server(port: int) -> ServerConfiguration:
+    return ServerConfiguration(
+        f"ws://localhost:{port}/showdown/websocket",
+        "https://play.pokemonshowdown.com/action.php?",
+    )
+
+
+# per worker process state
+_worker_server: Optional[ServerConfiguration] = None
+_worker_agents: Dict[AgentSpec, Player] = {}
+_worker_latency = LatencyRecorder()
+_worker_battles: Optional[BattleStore] = None
+
+
+def _init_worker(server_queue, battles_folder: Optional[str], agent_workers: int):
+    global _worker_server, _worker_battles
+    # shards split the cpus, rollout pools sized to all of them would oversubscribe
+    os.environ.setdefault(ROLLOUT_WORKERS_ENV, str(agent_workers))
+    # each worker claims one server for its whole lifetime
+    _worker_server = local_server(server_queue.get())
+    if battles_folder is not None:
+        _worker_battles = BattleStore(battles_folder)
+
+
+def _load_agent(spec: AgentSpec) -> Player:
+    if spec in _worker_agents:
+        return _worker_agents[spec]
+
+    module = load_player_module(spec.module_path)
+    agent_class = getattr(module, spec.class_name)
+    kwargs = {}
+    if spec.team is not None:
+        # agents of this worker playing the same team share its teambuilder
+        kwargs["team"] = TEAMS.teambuilder(spec.team)
+
+    agent = agent_class(
+        account_configuration=AccountConfiguration(spec.username, None),
+        battle_format=spec.battle_format,
+        server_configuration=_worker_server,
+        **kwargs,
+    )
+    if spec.save_replays:
+        # through this worker's replay store, not poke_env's html files
+        store_replays(agent, spec.save_replays)
+    _worker_agents[spec] = _worker_latency.instrument(agent)
+    return agent
+
+
+def _play_pair(
+    p1: AgentSpec,
+    p2: AgentSpec,
+    n_challenges: Optional[int],
+    save_replays: Optional[Union[bool, str]] = None,
+) -> Tuple[CrossEvaluation, MatchStats, LatencyRecorder, List[Game]]:
+    agents = [_load_agent(p1), _load_agent(p2)]
+    stats = MatchStats()
+    # games go back in order, the coordinator owns the ratings
+    games: List[Game] = []
+    results = asyncio.run(
+        play_match(
+            agents[0],
+            agents[1],
+            n_challenges,
+            stats=stats,
+            on_game=lambda *game: games.append(game),
+            # per match replay folder, the agents' own setting is left alone
+            save_replays=save_replays or False,
+            spill=_worker_battles,
+        )
+    )
+    return results, stats, _worker_latency.take(), games
+
+
+class ShardedMatchRunner:
+    """Coordinator side of a process pool with one worker per local showdown server.
+
+    Agents are shipped to the workers as AgentSpecs and rebuilt there, so the
+    coordinator's own Player objects never need to be connected."""
+
+    def __init__(
+        self,
+        server_ports: Sequence[int],
+        n_challenges: Optional[int] = None,
+        battles_folder: Optional[str] = None,
+    ):
+        if not server_ports:
+            raise ValueError("At least one server port is required")
+
+        # None plays adaptive length matches, see sequential_match
+        self.n_challenges = n_challenges
+        self.stats = MatchStats()
+        self.latency = LatencyRecorder()
+        self.ratings = RatingStore()
+
+        # spawn: poke_env runs its event loop in a thread that must not be forked
+        context = multiprocessing.get_context("spawn")
+        server_queue = context.Queue()
+        for port in server_ports:
+            server_queue.put(port)
+
+        self._pool = ProcessPoolExecutor(
+            max_workers=len(server_ports),
+            mp_context=context,
+            initializer=_init_worker,
+            # finished battles are kept in battles_folder if given, else dropped
+            initargs=(
+                server_queue,
+                battles_folder,
+                max(1, (os.cpu_count() or 1) // len(server_ports)),
+            ),
+        )
+        self._specs: Dict[int, AgentSpec] = {}
+
+    def _spec(self, agent: Player) -> AgentSpec:
+        if id(agent) not in self._specs:
+            self._specs[id(agent)] = agent_spec(agent)
+        return self._specs[id(agent)]
+
+    def play(
+        self,
+        pairs: Sequence[Tuple[Player, Player]],
+        save_replays: Optional[Sequence[Union[bool, str]]] = None,
+        on_result: Optional[Callable[[int, CrossEvaluation], None]] = None,
+        on_game: Optional[GameCallback] = None,
+    ) -> List[CrossEvaluation]:
+        """Plays every pair on the pool, returns one cross evaluation per pair in order
+
+        on_result is called with each pair's index and results as soon as that pair
+        finishes, so a slow pair never holds back journaling the ones done after it.
+        on_game hears that pair's games once they are in the ratings"""
+        futures = {
+            self._pool.submit(
+                _play_pair,
+                self._spec(p1),
+                self._spec(p2),
+                self.n_challenges,
+                save_replays[i] if save_replays else None,
+            ): i
+            for i, (p1, p2) in enumerate(pairs)
+        }
+        results: List[Optional[CrossEvaluation]] = [None] * len(pairs)
+        for future in as_completed(futures):
+            i = futures[future]
+            pair_results, stats, latency, games = future.result()
+            self.stats.merge(stats)
+            self.latency.merge(latency)
+            self.ratings.record_games(games)
+            if on_game is not None:
+                for game in games:
+                    on_game(*game)
+            if on_result is not None:
+                on_result(i, pair_results)
+            results[i] = pair_results
+        return results
+
+    def cross_evaluate(self, agents: List[Player]) -> CrossEvaluation:
+        """Same result layout as poke_env.cross_evaluate, pairings spread over the shards"""
+        results: CrossEvaluation = {
+            p1.username: {p2.username: None for p2 in agents} for p1 in agents
+        }
+        pairs = [
+            (p1, p2)
+            for i, p1 in enumerate(agents)
+            for j, p2 in enumerate(agents)
+            if j > i
+        ]
+        for (p1, p2), pair_results in zip(pairs, self.play(pairs)):
+            results[p1.username][p2.username] = pair_results[p1.username][p2.username]
+            results[p2.username][p1.username] = pair_results[p2.username][p1.username]
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> "ShardedMatchRunner":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()